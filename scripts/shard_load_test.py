@@ -0,0 +1,105 @@
+"""Measure how the turns per second scale with the number of worker processes.
+
+Every chat plays a /test game where each turn discards the first card. Telegram
+is replaced by a bot that answers immediately, so the time is spent in the game
+logic and in rendering the boards.
+
+    python scripts/shard_load_test.py --chats 40 --turns 10 --workers 1 2 4
+"""
+
+import argparse
+import itertools
+import os
+import time
+
+from hanagram import play_telegram
+from hanagram.outbox import Message, Outbox
+from hanagram.sharding import ShardRouter, UpdateQueue
+
+
+class InstantBot:
+    def __init__(self) -> None:
+        self.message_ids = itertools.count(1)
+
+    def sendMessage(self, chat_id: int, _text: str, **_kwargs: object) -> Message:
+        return Message({"message_id": next(self.message_ids), "chat": {"id": chat_id}})
+
+    def sendPhoto(self, chat_id: int, _photo: object, **_kwargs: object) -> Message:
+        return self.sendMessage(chat_id, "")
+
+    def editMessageText(self, *_args: object, **_kwargs: object) -> Message:
+        return Message({})
+
+    def deleteMessage(self, *_args: object) -> bool:
+        return True
+
+
+def load_worker(_shard: int, updates: UpdateQueue) -> None:
+    server = play_telegram.BotServer("0:loadtest")
+    server.outbox = Outbox(
+        InstantBot(), private_chat_rate=1e6, group_chat_rate=1e6, global_rate=1e6
+    )
+    play_telegram.server = server
+    play_telegram.serve_updates(updates)
+
+
+def game_updates(chat_index: int, turns: int) -> list[Message]:
+    user_id = 1000 + chat_index
+    chat_id = -user_id
+    start = {
+        "message_id": 1,
+        "date": 0,
+        "from": {"id": user_id, "first_name": "Load"},
+        "chat": {"id": chat_id, "type": "group"},
+        "text": "/test 2",
+    }
+    updates = [Message({"update_id": 0, "message": start})]
+    for _ in range(turns):
+        for data in ["discard", "1"]:
+            query = {
+                "id": "0",
+                "chat_instance": "0",
+                "from": {"id": user_id, "first_name": "Load"},
+                "message": {"message_id": 1, "chat": {"id": user_id}},
+                "data": f"{data}|{chat_id}",
+            }
+            updates.append(Message({"update_id": 0, "callback_query": query}))
+    return updates
+
+
+def run(workers: int, chats: int, turns: int) -> float:
+    # the workers read the bot settings from the environment
+    os.environ.setdefault("TELEGRAM_USERNAME", "loadtest")
+    os.environ.setdefault("TELEGRAM_API_KEY", "0:loadtest")
+    router = ShardRouter(load_worker, play_telegram.update_chat_id, workers)
+    router.start()
+    games = [game_updates(i, turns) for i in range(chats)]
+    start = time.perf_counter()
+    # interleave the chats, like concurrent groups
+    for updates in itertools.zip_longest(*games):
+        for update in updates:
+            if update is not None:
+                router.submit(update)
+    router.close()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cpus, {args.chats} chats, {args.turns} turns each")
+    print("workers  seconds  turns/sec  speedup")
+    base_rate = None
+    for workers in args.workers:
+        seconds = run(workers, args.chats, args.turns)
+        rate = args.chats * args.turns / seconds
+        base_rate = base_rate or rate
+        print(f"{workers:7d}  {seconds:7.2f}  {rate:9.1f}  {rate / base_rate:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
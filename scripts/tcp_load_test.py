@@ -0,0 +1,91 @@
+"""Measure the TCP game server with many simulated connections in one event loop.
+
+Every client joins a table with `play <players>`, and on its turn chooses a random
+action. A turn is timed from sending the action until the next board arrives.
+
+    python scripts/tcp_load_test.py --connections 2000 --players 4 --games 2
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from hanagram import play_tcp
+
+ACTIONS = ["discard 1", "discard 2", "play 1", "hint {other} 1", "hint {other} red"]
+
+
+async def client(
+    port: int, index: int, players: int, games: int, latencies: list[float], seed: int
+) -> None:
+    rng = random.Random(seed + index)
+    reader, writer = await asyncio.open_connection(play_tcp.DEFAULT_HOST, port)
+    writer.write(f"client{index}\nplay {players}\n".encode())
+    others: list[str] = []
+    sent = 0.0
+    while games:
+        line = (await reader.readline()).decode()
+        if not line:
+            raise ConnectionError(f"client{index} was disconnected")
+        line = line.rstrip("\n")
+        if line.startswith("The game starts: "):
+            names = line.removeprefix("The game starts: ").split(", ")
+            others = [name for name in names if name != f"client{index}"]
+        elif line.endswith("'s hand:") and sent:
+            latencies.append(time.perf_counter() - sent)
+            sent = 0.0
+        elif line == play_tcp.TURN_PROMPT:
+            action = rng.choice(ACTIONS).format(other=rng.choice(others))
+            writer.write(f"{action}\n".encode())
+            sent = time.perf_counter()
+        elif line.startswith("*** You"):
+            games -= 1
+            if games:
+                writer.write(f"play {players}\n".encode())
+        elif line.startswith("Usage:"):
+            # an invalid hint, that touches no card
+            writer.write(b"discard 1\n")
+    writer.write(b"quit\n")
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(connections: int, players: int, games: int) -> None:
+    server, tcp = await play_tcp.start_server(port=0)
+    port = tcp.sockets[0].getsockname()[1]
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client(port, i, players, games, latencies, 0) for i in range(connections))
+    )
+    elapsed = time.perf_counter() - start
+    tcp.close()
+    await tcp.wait_closed()
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"{connections} connections, {server.games_finished} games in {elapsed:.1f}s")
+    print(
+        f"{server.games_finished / elapsed:.1f} games/s,"
+        f" {len(latencies) / elapsed:.0f} turns/s"
+    )
+    print(
+        "turn latency:"
+        + "".join(f" p{q} {percentiles[q - 1] * 1000:.1f}ms" for q in [50, 90, 99])
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--games", type=int, default=1, help="for each connection")
+    args = parser.parse_args()
+    if args.connections % args.players:
+        parser.error("the connections must fill the tables")
+    asyncio.run(run(args.connections, args.players, args.games))
+
+
+if __name__ == "__main__":
+    main()
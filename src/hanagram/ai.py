@@ -0,0 +1,100 @@
+from collections.abc import Callable
+
+from . import hanabi
+from .hints import dead_cards, playable_cards, possible_cards, suggest_hints
+
+# chooses an action of the player, for `perform_action`
+Strategy = Callable[[hanabi.Game, hanabi.Player], str]
+
+
+def play_known_card(game: hanabi.Game, player: hanabi.Player) -> str | None:
+    playable = playable_cards(game)
+    for index, card in enumerate(game.hands[player]):
+        if possible_cards(card) & ~playable == 0:
+            return f"play {index + 1}"
+    return None
+
+
+def discard_dead_card(game: hanabi.Game, player: hanabi.Player) -> str | None:
+    dead = dead_cards(game)
+    for index, card in enumerate(game.hands[player]):
+        if possible_cards(card) & ~dead == 0:
+            return f"discard {index + 1}"
+    return None
+
+
+def discard_oldest_card(game: hanabi.Game, player: hanabi.Player) -> str:
+    # the oldest card that was never hinted. the newest card is first
+    hand = game.hands[player]
+    for index in reversed(range(len(hand))):
+        if not hand[index].is_color_known and not hand[index].is_value_known:
+            return f"discard {index + 1}"
+    return f"discard {len(hand)}"
+
+
+def choose_action(game: hanabi.Game, player: hanabi.Player) -> str:
+    """Choose an action of a simple convention player, for `perform_action`.
+
+    Play a card that is known to be playable, or give a hint that makes another
+    player's card known to be playable or saves a critical card, or discard a card
+    that is known to be dead, or the oldest card that was never hinted. Use a hint
+    that tells the most when discarding would waste a hint token.
+    """
+    action = play_known_card(game, player)
+    if action is not None:
+        return action
+
+    suggestions = suggest_hints(game, player)
+    best = suggestions[0] if suggestions else None
+    if best is not None and (best.playable or best.critical):
+        return best.action
+
+    action = discard_dead_card(game, player)
+    if action is not None:
+        return action
+    if best is not None and game.hints == hanabi.INITIAL_HINTS:
+        return best.action
+    return discard_oldest_card(game, player)
+
+
+def choose_hint_first(game: hanabi.Game, player: hanabi.Player) -> str:
+    # give the best hint whenever there is a hint token, and discard only without
+    action = play_known_card(game, player)
+    if action is not None:
+        return action
+    suggestions = suggest_hints(game, player)
+    if suggestions:
+        return suggestions[0].action
+    return discard_dead_card(game, player) or discard_oldest_card(game, player)
+
+
+def choose_risky_play(game: hanabi.Game, player: hanabi.Player) -> str:
+    # also play a card that is more likely playable than not, while it can't end
+    # the game. the chance counts the cards it may be, not their copies
+    if game.errors < hanabi.ALLOWED_ERRORS - 1:
+        playable = playable_cards(game)
+        for index, card in enumerate(game.hands[player]):
+            possible = possible_cards(card)
+            if 2 * (possible & playable).bit_count() > possible.bit_count():
+                return f"play {index + 1}"
+    return choose_action(game, player)
+
+
+STRATEGIES: dict[str, Strategy] = {
+    "convention": choose_action,
+    "hint-first": choose_hint_first,
+    "risky": choose_risky_play,
+}
+
+
+def play_turn(game: hanabi.Game, strategy: Strategy = choose_action) -> str:
+    player = hanabi.get_active_player_name(game)
+    action = strategy(game, player)
+    assert hanabi.perform_action(game, player, action)
+    return action
+
+
+def play_game(game: hanabi.Game, strategy: Strategy = choose_action) -> int:
+    while hanabi.check_state(game) is hanabi.GameState.RUNNING:
+        play_turn(game, strategy)
+    return hanabi.get_score(game)
@@ -0,0 +1,234 @@
+"""Report game balance and turn time statistics from the saved game logs."""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import time
+from array import array
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import hanabi
+
+CHUNK_CHATS = 10_000  # chats in each query
+MAX_PLAYERS = max(hanabi.HAND_SIZE)
+MAX_SCORE = hanabi.MAX_VALUE * len(hanabi.COLORS)
+# turn times are counted in tenths of a second, the last bucket counts longer turns
+MAX_TURN_TENTHS = 36_000
+PERCENTILES = [50, 90, 99]
+SCORE_BANDS = [0, 5, 10, 15, 20, 25]
+
+# the finished games of the chats in a range, counted by players, score and bombs.
+# the last game of a chat that is still saved as active may be still running
+GAMES_QUERY = """
+WITH live AS (
+    SELECT chat_id, max(game) FROM deals
+    WHERE chat_id IN (
+        SELECT chat_id FROM games WHERE active AND chat_id BETWEEN :low AND :high
+    )
+    GROUP BY chat_id
+), finished AS (
+    SELECT
+        json_array_length(CAST(deals.snapshot AS TEXT), '$.players') AS players,
+        min(
+            sum(action LIKE 'p%' AND description NOT LIKE 'BOOM! %'), :max_score
+        ) AS score,
+        min(sum(description LIKE 'BOOM! %'), :max_bombs) AS bombs,
+        sum(action LIKE 'd%' AND instr(description, ' discarded a critical ') > 0)
+            AS critical
+    FROM deals JOIN actions USING (chat_id, game)
+    WHERE deals.chat_id BETWEEN :low AND :high
+        AND (deals.chat_id, deals.game) NOT IN live
+    GROUP BY deals.chat_id, deals.game
+)
+SELECT players, score, bombs, count(*), sum(critical) FROM finished
+GROUP BY players, score, bombs
+"""
+
+# the time of each turn, from the action before it, or from the deal for the first
+TURNS_QUERY = """
+SELECT max(0, min(:max_tenths, CAST(10 * seconds AS INTEGER))) AS tenths, count(*)
+FROM (
+    SELECT time - lag(time) OVER turns AS seconds FROM actions
+    WHERE chat_id BETWEEN :low AND :high
+    WINDOW turns AS (PARTITION BY chat_id, game ORDER BY turn)
+    UNION ALL
+    SELECT (
+        SELECT time FROM actions
+        WHERE actions.chat_id = deals.chat_id AND actions.game = deals.game
+        ORDER BY turn LIMIT 1
+    ) - time FROM deals
+    WHERE chat_id BETWEEN :low AND :high
+)
+WHERE seconds IS NOT NULL
+GROUP BY tenths
+"""
+
+
+def counts(size: int) -> "array[int]":
+    return array("Q", bytes(8 * size))
+
+
+@dataclass(slots=True)
+class Totals:
+    """Counts that have a fixed size, however many games are added."""
+
+    # by players and score
+    scores: list["array[int]"] = field(
+        default_factory=lambda: [counts(MAX_SCORE + 1) for _ in range(MAX_PLAYERS + 1)]
+    )
+    # by players and the number of bombs
+    bombs: list["array[int]"] = field(
+        default_factory=lambda: [
+            counts(hanabi.ALLOWED_ERRORS + 1) for _ in range(MAX_PLAYERS + 1)
+        ]
+    )
+    critical_discards: "array[int]" = field(
+        default_factory=lambda: counts(MAX_PLAYERS + 1)
+    )
+    turn_tenths: "array[int]" = field(
+        default_factory=lambda: counts(MAX_TURN_TENTHS + 1)
+    )
+
+    def add(self, other: "Totals") -> None:
+        for players in range(MAX_PLAYERS + 1):
+            for mine, theirs in [
+                (self.scores[players], other.scores[players]),
+                (self.bombs[players], other.bombs[players]),
+            ]:
+                for i, count in enumerate(theirs):
+                    mine[i] += count
+            self.critical_discards[players] += other.critical_discards[players]
+        for i, count in enumerate(other.turn_tenths):
+            if count:
+                self.turn_tenths[i] += count
+
+
+def connect_read_only(path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(f"{path.absolute().as_uri()}?mode=ro", uri=True)
+
+
+def chat_ranges(path: Path, size: int = CHUNK_CHATS) -> Iterator[tuple[int, int]]:
+    # ranges of chat ids, each with the games of `size` chats
+    connection = connect_read_only(path)
+    try:
+        chat_ids = connection.execute(
+            "SELECT DISTINCT chat_id FROM deals ORDER BY chat_id"
+        )
+        while chunk := chat_ids.fetchmany(size):
+            yield chunk[0][0], chunk[-1][0]
+    finally:
+        connection.close()
+
+
+def analyze_range(path: Path, low: int, high: int) -> Totals:
+    totals = Totals()
+    connection = connect_read_only(path)
+    try:
+        parameters = {
+            "low": low,
+            "high": high,
+            "max_score": MAX_SCORE,
+            "max_bombs": hanabi.ALLOWED_ERRORS,
+            "max_tenths": MAX_TURN_TENTHS,
+        }
+        for players, score, bombs, games, critical in connection.execute(
+            GAMES_QUERY, parameters
+        ):
+            if not 0 < players <= MAX_PLAYERS:
+                print("[ERROR]", f"skipped {games} games of {players} players")
+                continue
+            totals.scores[players][score] += games
+            totals.bombs[players][bombs] += games
+            totals.critical_discards[players] += critical
+        for tenths, turns in connection.execute(TURNS_QUERY, parameters):
+            totals.turn_tenths[tenths] += turns
+    finally:
+        connection.close()
+    return totals
+
+
+def analyze_chunk(chunk: tuple[Path, int, int]) -> Totals:
+    return analyze_range(*chunk)
+
+
+def percentile(histogram: "array[int]", q: float) -> int:
+    # the bucket where the q-th percentile is
+    target = sum(histogram) * q / 100
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if count and seen >= target:
+            return bucket
+    return 0
+
+
+def report(totals: Totals) -> list[str]:
+    bands = [f"{low}-{high - 1}" for low, high in zip(SCORE_BANDS, SCORE_BANDS[1:])] + [
+        str(MAX_SCORE)
+    ]
+    lines = [
+        "players     games  score  bombed  lost  critical  "
+        + "  ".join(f"{band:>5}" for band in bands)
+    ]
+    for players in range(MAX_PLAYERS + 1):
+        scores = totals.scores[players]
+        games = sum(scores)
+        if not games:
+            continue
+        mean = sum(score * count for score, count in enumerate(scores)) / games
+        bombs = totals.bombs[players]
+        bombed = 100 * (games - bombs[0]) / games
+        lost = 100 * bombs[hanabi.ALLOWED_ERRORS] / games
+        critical = totals.critical_discards[players] / games
+        band_counts = [
+            sum(scores[low:high]) for low, high in zip(SCORE_BANDS, SCORE_BANDS[1:])
+        ] + [scores[MAX_SCORE]]
+        lines.append(
+            f"{players:7d} {games:9d} {mean:6.2f} {bombed:6.1f}% {lost:4.1f}%"
+            f" {critical:9.2f}  "
+            + "  ".join(f"{100 * count / games:4.1f}%" for count in band_counts)
+        )
+    turns = sum(totals.turn_tenths)
+    if turns:
+        times = ", ".join(
+            f"p{q} {percentile(totals.turn_tenths, q) / 10:.1f}s" for q in PERCENTILES
+        )
+        lines.append(f"{turns} turns: {times}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "database",
+        type=Path,
+        nargs="?",
+        default=os.environ.get("HANAGRAM_DB"),
+        help="the HANAGRAM_DB file",
+    )
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--chunk", type=int, default=CHUNK_CHATS, help="chats")
+    args = parser.parse_args()
+    if args.database is None or not args.database.exists():
+        parser.error("set the database, or HANAGRAM_DB")
+
+    totals = Totals()
+    start = time.perf_counter()
+    chunks = [
+        (args.database, low, high)
+        for low, high in chat_ranges(args.database, args.chunk)
+    ]
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers) as pool:
+        for i, chunk_totals in enumerate(pool.imap_unordered(analyze_chunk, chunks), 1):
+            totals.add(chunk_totals)
+            elapsed = time.perf_counter() - start
+            print(f"  {i}/{len(chunks)} chunks, {elapsed:.0f}s", flush=True)
+    print("\n".join(report(totals)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Find the maximum score of many deals, when all the cards are known."""
+
+import argparse
+import multiprocessing
+import random
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import hanabi
+
+# cards are numbered by color and value, 5 * color + value - 1
+COLORS = list(hanabi.COLORS)
+N_VALUES = len(hanabi.VALUES)
+COPIES = [hanabi.CARD_COUNT[value] for _ in COLORS for value in hanabi.VALUES]
+MAX_SCORE = len(COLORS) * N_VALUES
+# nodes of the quick search, and of the full search when the quick one can't decide
+QUICK_NODES = 2_000
+FULL_NODES = 200_000
+CHUNK_SIZE = 1000
+HEADER = "players,seed,bound,best,exact"
+
+
+@dataclass(frozen=True, slots=True)
+class Deal:
+    players: int
+    hands: tuple[tuple[int, ...], ...]
+    # the deck, in the order that the cards are drawn
+    draws: tuple[int, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class DealResult:
+    players: int
+    seed: int
+    # no play can score more than the bound, and some play scores best
+    bound: int
+    best: int
+
+    @property
+    def exact(self) -> bool:
+        return self.best == self.bound
+
+    def to_line(self) -> str:
+        return f"{self.players},{self.seed},{self.bound},{self.best},{self.exact:d}"
+
+
+def card_number(card: hanabi.Card | hanabi.HandCard) -> int:
+    return COLORS.index(card.color) * N_VALUES + card.value - 1
+
+
+def deal(seed: int, players: int) -> Deal:
+    names = [hanabi.Player(f"player{i}") for i in range(players)]
+    game = hanabi.Game(names, deck=hanabi.Deck.new(random.Random(seed)))
+    return Deal(
+        players,
+        tuple(tuple(sorted(map(card_number, game.hands[name]))) for name in names),
+        tuple(card_number(card) for card in reversed(game.deck)),
+    )
+
+
+def pace_bound(deal: Deal) -> int:
+    # after the k-th draw there are at most (draws - k + players) more actions, and
+    # each plays one card at most. a card can be played only after it and the lower
+    # cards of its color were drawn
+    drawn_at = [len(deal.draws) + 1] * len(COPIES)
+    for hand in deal.hands:
+        for card in hand:
+            drawn_at[card] = 0
+    for draw, card in enumerate(deal.draws, 1):
+        drawn_at[card] = min(drawn_at[card], draw)
+    available = []
+    for color in range(len(COLORS)):
+        latest = 0
+        for value in range(N_VALUES):
+            latest = max(latest, drawn_at[color * N_VALUES + value])
+            available.append(latest)
+    draws = len(deal.draws)
+    excess = max(
+        sum(a >= k for a in available) - (draws - k + deal.players)
+        for k in range(1, draws + 1)
+    )
+    return MAX_SCORE - max(0, excess)
+
+
+class OutOfNodesError(Exception):
+    pass
+
+
+class Search:
+    """Search the moves of a deal, to find the best score when all cards are known.
+
+    Misplays are never better than discards, and with all cards known every hint is
+    the same: a pass that costs a hint token. States are pruned by an upper bound of
+    their score, and a table keeps the upper bound found for each state.
+    """
+
+    def __init__(self, deal: Deal, max_nodes: int):
+        self.deal = deal
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.best = 0
+        self.upper_bounds: dict[
+            tuple[int, tuple[tuple[int, ...], ...], int, tuple[int, ...], int, int],
+            int,
+        ] = {}
+
+    def run(self, bound: int) -> int:
+        # returns an upper bound of the score, and sets the best score found
+        remaining = list(COPIES)
+        piles = (0,) * len(COLORS)
+        self.best = 0
+        try:
+            result = self._visit(
+                0, self.deal.hands, 0, piles, hanabi.INITIAL_HINTS, 0, remaining, bound
+            )
+        except OutOfNodesError:
+            return bound
+        return min(bound, result)
+
+    def _visit(
+        self,
+        active: int,
+        hands: tuple[tuple[int, ...], ...],
+        drawn: int,
+        piles: tuple[int, ...],
+        hints: int,
+        final_moves: int,
+        remaining: list[int],
+        bound: int,
+    ) -> int:
+        score = sum(piles)
+        self.best = max(self.best, score)
+        players = self.deal.players
+        if score == bound or final_moves == players:
+            return score
+        draws_left = len(self.deal.draws) - drawn
+        upper = min(
+            bound,
+            color_bound(piles, remaining),
+            score + draws_left + players - final_moves,
+        )
+        key = (active, hands, drawn, piles, hints, final_moves)
+        upper = min(upper, self.upper_bounds.get(key, upper))
+        if upper <= self.best:
+            return upper
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise OutOfNodesError
+
+        next_player = (active + 1) % players
+        # an action that starts with an empty deck is one of the final moves
+        next_final = final_moves + (draws_left == 0)
+        hand = hands[active]
+        result = score
+
+        def after(card: int) -> tuple[int, tuple[tuple[int, ...], ...], int]:
+            # the hands after the card left the active hand, and one was drawn
+            new_hand = list(hand)
+            new_hand.remove(card)
+            if draws_left:
+                new_hand.append(self.deal.draws[drawn])
+            new_hands = list(hands)
+            new_hands[active] = tuple(sorted(new_hand))
+            return next_player, tuple(new_hands), drawn + (draws_left > 0)
+
+        cards = sorted(set(hand))
+        playable = [c for c in cards if c % N_VALUES == piles[c // N_VALUES]]
+        dead = [c for c in cards if c % N_VALUES < piles[c // N_VALUES]]
+        others = [c for c in cards if c not in playable and c not in dead]
+        for card in playable:
+            new_piles = list(piles)
+            new_piles[card // N_VALUES] += 1
+            new_hints = hints
+            if card % N_VALUES == N_VALUES - 1:
+                new_hints = min(hints + 1, hanabi.INITIAL_HINTS)
+            remaining[card] -= 1
+            value = self._visit(
+                *after(card), tuple(new_piles), new_hints, next_final, remaining, bound
+            )
+            remaining[card] += 1
+            result = max(result, value)
+            if result >= upper:
+                break
+        discards = dead + others
+        if result < upper and hints:
+            value = self._visit(
+                next_player,
+                hands,
+                drawn,
+                piles,
+                hints - 1,
+                next_final,
+                remaining,
+                bound,
+            )
+            result = max(result, value)
+        for card in discards:
+            if result >= upper:
+                break
+            new_hints = min(hints + 1, hanabi.INITIAL_HINTS)
+            remaining[card] -= 1
+            value = self._visit(
+                *after(card), piles, new_hints, next_final, remaining, bound
+            )
+            remaining[card] += 1
+            result = max(result, value)
+        result = min(result, upper)
+        self.upper_bounds[key] = result
+        return result
+
+
+def color_bound(piles: tuple[int, ...], remaining: list[int]) -> int:
+    # each color stops below its first card that has no copies left
+    total = 0
+    for color, pile in enumerate(piles):
+        value = pile
+        while value < N_VALUES and remaining[color * N_VALUES + value]:
+            value += 1
+        total += value
+    return total
+
+
+def analyze_deal(seed: int, players: int, max_nodes: int = FULL_NODES) -> DealResult:
+    # the cheap bound first, then a quick search, and a full one only if needed
+    dealt = deal(seed, players)
+    bound = pace_bound(dealt)
+    best = 0
+    for nodes in [QUICK_NODES, max_nodes]:
+        search = Search(dealt, nodes)
+        bound = search.run(bound)
+        best = max(best, search.best)
+        if best == bound:
+            break
+    return DealResult(players, seed, bound, best)
+
+
+def analyze_chunk(chunk: tuple[int, int, int, int]) -> list[DealResult]:
+    players, start, stop, max_nodes = chunk
+    return [analyze_deal(seed, players, max_nodes) for seed in range(start, stop)]
+
+
+def read_checkpoint(path: Path) -> set[tuple[int, int]]:
+    # the deals that were analyzed, ignoring a line that was cut while written
+    done = set()
+    if path.exists():
+        for line in path.read_text().splitlines():
+            parts = line.split(",")
+            if len(parts) == len(HEADER.split(",")) and parts[0].isdigit():
+                done.add((int(parts[0]), int(parts[1])))
+    return done
+
+
+def chunks(
+    players: list[int],
+    start: int,
+    stop: int,
+    max_nodes: int,
+    done: set[tuple[int, int]],
+) -> Iterator[tuple[int, int, int, int]]:
+    for n in players:
+        for chunk_start in range(start, stop, CHUNK_SIZE):
+            chunk_stop = min(chunk_start + CHUNK_SIZE, stop)
+            seeds = range(chunk_start, chunk_stop)
+            if not all((n, seed) in done for seed in seeds):
+                yield n, chunk_start, chunk_stop, max_nodes
+
+
+def summarize(path: Path) -> None:
+    counts: defaultdict[int, Counter[str]] = defaultdict(Counter)
+    for line in path.read_text().splitlines()[1:]:
+        parts = line.split(",")
+        if len(parts) != len(HEADER.split(",")):
+            continue
+        players, _seed, bound, best, _exact = map(int, parts)
+        if best == MAX_SCORE:
+            counts[players]["winnable"] += 1
+        elif bound < MAX_SCORE:
+            counts[players]["not winnable"] += 1
+        else:
+            counts[players]["unknown"] += 1
+    print("players     deals  winnable  not winnable  unknown")
+    for players, count in sorted(counts.items()):
+        total = count.total()
+        print(
+            f"{players:7d} {total:9d} {count['winnable']:9d}"
+            f" {count['not winnable']:13d} {count['unknown']:8d}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--players",
+        type=int,
+        nargs="+",
+        default=sorted(hanabi.HAND_SIZE),
+        choices=sorted(hanabi.HAND_SIZE),
+    )
+    parser.add_argument("--start", type=int, default=0, help="first seed")
+    parser.add_argument("--stop", type=int, default=10_000, help="last seed + 1")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--nodes", type=int, default=FULL_NODES, help="search size")
+    parser.add_argument(
+        "--output", type=Path, default=Path("deals.csv"), help="also a checkpoint"
+    )
+    args = parser.parse_args()
+
+    done = read_checkpoint(args.output)
+    if not args.output.exists():
+        args.output.write_text(HEADER + "\n")
+    todo = list(chunks(args.players, args.start, args.stop, args.nodes, done))
+    print(f"{len(done)} deals in {args.output}, {len(todo)} chunks to analyze")
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers) as pool, args.output.open("a") as output:
+        for i, results in enumerate(pool.imap_unordered(analyze_chunk, todo), 1):
+            lines = [
+                result.to_line()
+                for result in results
+                if (result.players, result.seed) not in done
+            ]
+            output.write("".join(f"{line}\n" for line in lines))
+            output.flush()
+            elapsed = time.perf_counter() - start
+            print(f"  {i}/{len(todo)} chunks, {elapsed:.0f}s", flush=True)
+    summarize(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import collections
+import threading
+import typing
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+T = typing.TypeVar("T")
+
+DEFAULT_WORKERS = 8
+# updates that wait in all the chats, including those being handled
+DEFAULT_MAX_PENDING = 1000
+
+
+class ChatDispatcher(typing.Generic[T]):
+    """Handle updates in worker threads, one at a time for each chat.
+
+    Each chat has its own queue of updates, so the updates of a game are handled
+    strictly in the order they arrived, while different chats are handled
+    concurrently. When too many updates wait, `submit` blocks until some are
+    handled, so the queue that feeds it fills up instead.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[T], None],
+        key: Callable[[T], int],
+        workers: int = DEFAULT_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        self.handle = handle
+        self.key = key
+        self.max_pending = max_pending
+        self.handled = 0
+        self.errors = 0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="chat")
+        self._lock = threading.Condition()
+        self._queues: dict[int, collections.deque[T]] = {}
+        self._pending = 0
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._pending
+
+    @property
+    def active_chats(self) -> int:
+        with self._lock:
+            return len(self._queues)
+
+    def submit(self, update: T) -> None:
+        key = self.key(update)
+        with self._lock:
+            self._lock.wait_for(lambda: self._pending < self.max_pending)
+            self._pending += 1
+            if key in self._queues:
+                # a worker is already handling this chat, it will get to this update
+                self._queues[key].append(update)
+                return
+            self._queues[key] = collections.deque([update])
+        self._executor.submit(self._handle_next, key)
+
+    def join(self, timeout: float | None = None) -> bool:
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._queues, timeout)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def _handle_next(self, key: int) -> None:
+        with self._lock:
+            update = self._queues[key][0]
+        try:
+            self.handle(update)
+        except Exception as ex:
+            print("[ERROR]", repr(ex), update)
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            self.handled += 1
+            self._pending -= 1
+            updates = self._queues[key]
+            updates.popleft()
+            # wake a blocked submit, or join when all the chats are done
+            self._lock.notify_all()
+            if not updates:
+                del self._queues[key]
+                return
+        # let other chats run before handling the next update of this chat
+        self._executor.submit(self._handle_next, key)
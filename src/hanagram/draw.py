@@ -1,3 +1,4 @@
+import functools
 import io
 from typing import TypedDict
 
@@ -33,10 +34,18 @@ def rounded_rectangle(
 
 
 size = 1
-card_font = ImageFont.truetype("assets/Avenir.ttc", 50 * size)
-text_font = ImageFont.truetype("assets/Avenir.ttc", 20 * size)
-text_font_discarded = ImageFont.truetype("assets/Avenir.ttc", 15 * size)
-text_font_small = ImageFont.truetype("assets/Avenir.ttc", 10 * size)
+FONT_PATH = "assets/Avenir.ttc"
+CARD_FONT_SIZE = 50 * size
+TEXT_FONT_SIZE = 20 * size
+DISCARDED_FONT_SIZE = 15 * size
+SMALL_FONT_SIZE = 10 * size
+
+
+@functools.cache
+def load_font(font_size: int) -> ImageFont.FreeTypeFont:
+    # loaded on first use, so importing this module is fast
+    return ImageFont.truetype(FONT_PATH, font_size)
+
 
 colors_rbg = {
     "red": (230, 20, 20),
@@ -56,7 +65,9 @@ def render_card(
         image, ((x, y), (x + width, y + width * 1.3)), width / 7, fill=colors_rbg[color]
     )
     text_fill = (0, 0, 0)
-    image.text((x + width / 4, y), value, font=card_font, fill=text_fill)
+    image.text(
+        (x + width / 4, y), value, font=load_font(CARD_FONT_SIZE), fill=text_fill
+    )
 
 
 def render_card_friend(
@@ -68,7 +79,12 @@ def render_card_friend(
         image, ((x, y), (x + width, y + height)), width / 10, fill=colors_rbg[color]
     )
     text_fill = (0, 0, 0)
-    image.text((x + width / 2.5, y + height / 8), value, font=text_font, fill=text_fill)
+    image.text(
+        (x + width / 2.5, y + height / 8),
+        value,
+        font=load_font(TEXT_FONT_SIZE),
+        fill=text_fill,
+    )
 
 
 def draw_board_state(
@@ -89,24 +105,27 @@ def draw_board_state(
     # counters
     x = 20 * size
     draw.text(
-        (x, 25 * size), "Hints: " + str(game.hints), font=text_font, fill=text_fill
+        (x, 25 * size),
+        "Hints: " + str(game.hints),
+        font=load_font(TEXT_FONT_SIZE),
+        fill=text_fill,
     )
     draw.text(
         (x + (100 - 15) * size, 25 * size),
         f"Errors: {game.errors}/{hanabi.ALLOWED_ERRORS}",
-        font=text_font,
+        font=load_font(TEXT_FONT_SIZE),
         fill=text_fill,
     )
     draw.text(
         (x + (200 - 5) * size, 25 * size),
         "Deck: " + str(len(game.deck)),
-        font=text_font,
+        font=load_font(TEXT_FONT_SIZE),
         fill=text_fill,
     )
     draw.text(
         (x + (300 - 10) * size, 25 * size),
         "Score: " + str(hanabi.get_score(game)),
-        font=text_font,
+        font=load_font(TEXT_FONT_SIZE),
         fill=text_fill,
     )
 
@@ -124,7 +143,7 @@ def draw_board_state(
             draw.text(
                 (xx, yy + 70 * size),
                 str(discarded),
-                font=text_font_discarded,
+                font=load_font(DISCARDED_FONT_SIZE),
                 fill=(255, 255, 255),
             )
             xx += 10 * size
@@ -137,7 +156,7 @@ def draw_board_state(
     for player in game.players:
         x = left_margin
         y += 110 * size
-        draw.text((x, y), player, font=text_font, fill=text_fill)
+        draw.text((x, y), player, font=load_font(TEXT_FONT_SIZE), fill=text_fill)
 
         # current player marker
         if player == game.players[game.active_player]:
@@ -193,7 +212,7 @@ def draw_board_state(
                         draw.text(
                             (xx + 5, yy),
                             str(not_value),
-                            font=text_font_small,
+                            font=load_font(SMALL_FONT_SIZE),
                             fill=text_fill,
                         )
                         xx += 15 * size
@@ -239,7 +258,7 @@ def draw_board_state(
                         draw.text(
                             (xx, yy),
                             str(not_value),
-                            font=text_font_small,
+                            font=load_font(SMALL_FONT_SIZE),
                             fill=text_fill,
                         )
                         xx += 15 * size
@@ -255,7 +274,12 @@ def draw_board_state(
         y -= 50 * size
     else:
         y -= 40 * size
-    draw.text((x, y), game.last_action_description, font=text_font, fill=text_fill)
+    draw.text(
+        (x, y),
+        game.last_action_description,
+        font=load_font(TEXT_FONT_SIZE),
+        fill=text_fill,
+    )
     # last player
     x = left_margin
     y -= 30 * size
@@ -263,7 +287,7 @@ def draw_board_state(
         "" if game.deck else f"{len(game.players) - game.final_moves} turns until end"
     )
     last = "Game ended" if last.startswith("0") else last
-    draw.text((x, y), last, font=text_font, fill=text_fill)
+    draw.text((x, y), last, font=load_font(TEXT_FONT_SIZE), fill=text_fill)
     return image
 
 
@@ -0,0 +1,202 @@
+import multiprocessing
+import random
+import statistics
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+
+from . import ai, hanabi, snapshot
+from .hints import card_bit, possible_cards
+
+DEFAULT_BUDGET = 0.5  # seconds
+MAX_SAMPLE_TRIES = 20
+# rollouts kept from earlier turns, while the game follows their moves
+MAX_KEPT_ROLLOUTS = 2000
+# where the estimated score range starts and ends
+LOW_PERCENTILE = 10
+HIGH_PERCENTILE = 90
+
+
+@dataclass(slots=True)
+class Rollout:
+    # the moves of the rollout that were not played in the real game yet, each an
+    # action and the card that it drew, or "" when it drew none
+    moves: list[tuple[str, str]]
+    score: int
+    # if the sample dealt the viewer their real cards, so the rollout differs from
+    # the real game only in the order of the deck
+    exact: bool = True
+
+
+@dataclass(frozen=True, slots=True)
+class Estimate:
+    turn: int
+    rollouts: int
+    mean: float
+    low: float
+    high: float
+
+
+def sample_game(
+    game: hanabi.Game, viewer: hanabi.Player, rng: random.Random
+) -> hanabi.Game:
+    # a copy of the game, where the cards that the viewer can't see are dealt again,
+    # consistent with the hints that the viewer got
+    sample = hanabi.clone_game(game)
+    hand = hanabi.own_hand(sample, viewer)
+    masks = [possible_cards(card) for card in hand]
+    hidden = [hanabi.Card(card.color, card.value) for card in hand] + sample.deck
+    # the cards with the fewest options first
+    order = sorted(range(len(hand)), key=lambda i: masks[i].bit_count())
+    for _ in range(MAX_SAMPLE_TRIES):
+        rng.shuffle(hidden)
+        remaining = list(hidden)
+        dealt: dict[int, hanabi.Card] = {}
+        for i in order:
+            index = next(
+                (
+                    j
+                    for j, card in enumerate(remaining)
+                    if masks[i] & card_bit(card.color, card.value)
+                ),
+                None,
+            )
+            if index is None:
+                break
+            dealt[i] = remaining.pop(index)
+        else:
+            for i, card in dealt.items():
+                hand[i].color, hand[i].value = card.color, card.value
+            sample.deck = hanabi.Deck(remaining)
+            return sample
+    # the real cards are always consistent, keep them and shuffle only the deck
+    rng.shuffle(hanabi.own_deck(sample))
+    return sample
+
+
+def hand_codes(game: hanabi.Game, player: hanabi.Player) -> list[str]:
+    return [snapshot.card_code(card.color, card.value) for card in game.hands[player]]
+
+
+def drawn_card(game: hanabi.Game, deck_size: int) -> str:
+    # the card that the last action drew, which the other players can see now
+    if len(game.deck) == deck_size:
+        return ""
+    player = game.players[(game.active_player - 1) % len(game.players)]
+    return hand_codes(game, player)[0]
+
+
+def rollout(game: hanabi.Game, exact: bool) -> Rollout:
+    moves = []
+    while hanabi.check_state(game) is hanabi.GameState.RUNNING:
+        deck_size = len(game.deck)
+        action = ai.play_turn(game)
+        moves.append((action, drawn_card(game, deck_size)))
+    return Rollout(moves, hanabi.get_score(game), exact)
+
+
+def run_rollouts(data: bytes, viewer: str, seed: int, budget: float) -> list[Rollout]:
+    # runs in a worker process, until the time budget ends
+    deadline = time.perf_counter() + budget
+    game = snapshot.game_from_bytes(data)
+    player = hanabi.Player(viewer)
+    hand = hand_codes(game, player)
+    rng = random.Random(seed)
+    rollouts: list[Rollout] = []
+    while not rollouts or time.perf_counter() < deadline:
+        sample = sample_game(game, player, rng)
+        rollouts.append(rollout(sample, hand_codes(sample, player) == hand))
+    return rollouts
+
+
+class Estimator:
+    """Estimate the final score of a game, by playing it out with computer players.
+
+    Each rollout deals again the cards that the current player can't see, and plays
+    the game to its end. Rollouts run in worker processes until the time budget
+    ends. Rollouts that dealt the player their real cards, and whose moves and
+    draws the real game follows, are kept for the next turns, so each turn adds to
+    the rollouts of the turns before it. The other rollouts were dealt cards that
+    the next players can see are wrong.
+
+    An estimator is not thread safe, call it from one thread at a time.
+    """
+
+    def __init__(self, pool: Executor | None = None, workers: int = 1, seed: int = 0):
+        self.pool = pool
+        self.workers = workers
+        self.rollouts: list[Rollout] = []
+        self.history: list[tuple[Estimate, str]] = []
+        self._turn: int | None = None
+        # the size of the deck at that turn, to tell if the next action drew a card
+        self._deck_size = 0
+        self._rng = random.Random(seed)
+
+    def observe(self, game: hanabi.Game, action: str) -> None:
+        # the action that was played, which the kept rollouts must have played too
+        if self._turn != game.turn - 1:
+            self.rollouts = []
+        move = (action, drawn_card(game, self._deck_size))
+        self.rollouts = [
+            Rollout(r.moves[1:], r.score)
+            for r in self.rollouts
+            if r.exact and r.moves and r.moves[0] == move
+        ]
+        self._turn = game.turn
+        self._deck_size = len(game.deck)
+
+    def estimate(self, game: hanabi.Game, budget: float = DEFAULT_BUDGET) -> Estimate:
+        if self._turn != game.turn:
+            self.rollouts = []
+            self._turn = game.turn
+            self._deck_size = len(game.deck)
+        if hanabi.check_state(game) is not hanabi.GameState.RUNNING:
+            score = hanabi.get_score(game)
+            self.rollouts = [Rollout([], score)]
+        else:
+            data = snapshot.game_to_bytes(game)
+            viewer = hanabi.get_active_player_name(game)
+            seeds = [self._rng.getrandbits(32) for _ in range(self.workers)]
+            if self.pool is None:
+                results = [run_rollouts(data, viewer, seeds[0], budget)]
+            else:
+                futures = [
+                    self.pool.submit(run_rollouts, data, viewer, seed, budget)
+                    for seed in seeds
+                ]
+                results = [future.result() for future in futures]
+            self.rollouts.extend(r for result in results for r in result)
+            del self.rollouts[:-MAX_KEPT_ROLLOUTS]
+        estimate = summarize(game.turn, [r.score for r in self.rollouts])
+        self.history.append((estimate, game.last_action_description))
+        return estimate
+
+    def biggest_losses(self, count: int = 3) -> list[tuple[float, str]]:
+        # the actions after which the estimated score dropped the most
+        drops = [
+            (before.mean - after.mean, action)
+            for (before, _), (after, action) in zip(
+                self.history, self.history[1:], strict=False
+            )
+            if after.turn == before.turn + 1 and after.mean < before.mean
+        ]
+        drops.sort(reverse=True)
+        return drops[:count]
+
+
+def summarize(turn: int, scores: list[int]) -> Estimate:
+    if len(scores) < 2:
+        score = float(scores[0]) if scores else 0.0
+        return Estimate(turn, len(scores), score, score, score)
+    percentiles = statistics.quantiles(scores, n=100, method="inclusive")
+    return Estimate(
+        turn,
+        len(scores),
+        statistics.fmean(scores),
+        percentiles[LOW_PERCENTILE - 1],
+        percentiles[HIGH_PERCENTILE - 1],
+    )
+
+
+def create_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
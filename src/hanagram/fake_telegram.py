@@ -0,0 +1,244 @@
+import email.parser
+import email.policy
+import http.server
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from collections.abc import Callable
+
+from .outbox import Message
+
+RETRY_AFTER = 1  # seconds
+MAX_UPDATES = 100
+PHOTO_SIZE = (1280, 960)
+TRUE_METHODS = {
+    "answerCallbackQuery",
+    "deleteMessage",
+    "deleteWebhook",
+    "setMyCommands",
+    "setWebhook",
+}
+
+# called with the method, its parameters and its result, after every request
+Observer = Callable[[str, dict[str, str], object], None]
+
+
+class FakeTelegram(http.server.ThreadingHTTPServer):
+    """A local stand-in for the Telegram Bot API, for load tests.
+
+    It implements the methods the bot uses, answering after a configurable latency,
+    and answers a configurable fraction of the requests with 429 errors. Updates
+    for the bot are queued with `push_update`, and every answered request is
+    reported to the observers.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: int = RETRY_AFTER,
+        seed: int | None = None,
+    ):
+        super().__init__((host, port), FakeTelegramRequestHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.observers: list[Observer] = []
+        self.calls: Counter[str] = Counter()
+        self.too_many_requests = 0
+        self.uploads = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._updates: list[Message] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def push_update(self, update: dict[str, object]) -> None:
+        with self._cond:
+            self._updates.append(
+                Message({**update, "update_id": next(self._update_ids)})
+            )
+            self._cond.notify_all()
+
+    def get_updates(self, offset: int, timeout: float) -> list[Message]:
+        with self._cond:
+            # like telegram, updates before the offset are confirmed and forgotten
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            self._cond.wait_for(lambda: bool(self._updates), timeout)
+            return self._updates[:MAX_UPDATES]
+
+    def call(
+        self, method: str, params: dict[str, str], files: dict[str, bytes]
+    ) -> tuple[int, dict[str, object]]:
+        with self._lock:
+            self.calls[method] += 1
+            self.uploads += len(files)
+            too_many = method != "getUpdates" and self._rng.random() < self.error_rate
+            if too_many:
+                self.too_many_requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if too_many:
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        result = self.result(method, params, files)
+        if result is None:
+            return 404, {
+                "ok": False,
+                "error_code": 404,
+                "description": "Not Found: method not found",
+            }
+        for observer in self.observers:
+            observer(method, params, result)
+        return 200, {"ok": True, "result": result}
+
+    def result(
+        self, method: str, params: dict[str, str], files: dict[str, bytes]
+    ) -> object:
+        if method in TRUE_METHODS:
+            return True
+        if method == "getMe":
+            return {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "Hanagram",
+                "username": "hanagram_fake_bot",
+            }
+        if method == "getUpdates":
+            return self.get_updates(
+                int(params.get("offset", 0)), float(params.get("timeout", 0))
+            )
+        if method == "sendMessage":
+            return self._message(params, text=params.get("text", ""))
+        if method == "editMessageText":
+            return self._message(params, text=params.get("text", ""))
+        if method == "sendPhoto":
+            return self._message(params, photo=self._photo(params.get("photo"), files))
+        if method == "editMessageMedia":
+            media = json.loads(params["media"])
+            return self._message(params, photo=self._photo(media["media"], files))
+        return None
+
+    def _message(self, params: dict[str, str], **content: object) -> Message:
+        message_id = params.get("message_id") or next(self._message_ids)
+        message = {
+            "message_id": int(message_id),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"])},
+            **content,
+        }
+        if "reply_markup" in params:
+            message["reply_markup"] = json.loads(params["reply_markup"])
+        return Message(message)
+
+    def _photo(
+        self, photo: str | None, files: dict[str, bytes]
+    ) -> list[dict[str, object]]:
+        # a photo is a file_id, or an uploaded file, maybe attached by name
+        if photo is None or photo.removeprefix("attach://") in files:
+            photo = f"photo-{next(self._file_ids)}"
+        width, height = PHOTO_SIZE
+        return [
+            {
+                "file_id": photo,
+                "file_unique_id": photo,
+                "width": width,
+                "height": height,
+            }
+        ]
+
+
+def parse_body(
+    content_type: str, body: bytes
+) -> tuple[dict[str, str], dict[str, bytes]]:
+    params: dict[str, str] = {}
+    files: dict[str, bytes] = {}
+    if content_type.startswith("multipart/form-data"):
+        parser = email.parser.BytesParser(policy=email.policy.HTTP)
+        form = parser.parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        for part in form.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            assert isinstance(name, str)
+            assert isinstance(payload, bytes)
+            if part.get_filename() is None:
+                params[name] = payload.decode()
+            else:
+                files[name] = payload
+    elif content_type.startswith("application/json"):
+        for key, value in json.loads(body or b"{}").items():
+            params[key] = value if isinstance(value, str) else json.dumps(value)
+    else:
+        params.update(urllib.parse.parse_qsl(body.decode()))
+    return params, files
+
+
+class FakeTelegramRequestHandler(http.server.BaseHTTPRequestHandler):
+    @property
+    def telegram(self) -> FakeTelegram:
+        assert isinstance(self.server, FakeTelegram)
+        return self.server
+
+    def do_GET(self) -> None:
+        self.do_POST()
+
+    def do_POST(self) -> None:
+        url = urllib.parse.urlparse(self.path)
+        parts = url.path.split("/")
+        if len(parts) != 3 or not parts[1].startswith("bot"):
+            self._reply(404, {"ok": False, "error_code": 404})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        params, files = parse_body(
+            self.headers.get("Content-Type", ""), self.rfile.read(length)
+        )
+        params.update(urllib.parse.parse_qsl(url.query))
+        status, body = self.telegram.call(parts[2], params, files)
+        self._reply(status, body)
+
+    def _reply(self, status: int, body: dict[str, object]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(  # type: ignore[explicit-override]
+        self, format: str, *args: object
+    ) -> None:
+        # don't log every request
+        pass
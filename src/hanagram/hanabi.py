@@ -1,5 +1,8 @@
+import copy
 import enum
+import random
 import typing
+from collections import Counter
 from dataclasses import dataclass, field
 from random import shuffle
 
@@ -47,14 +50,18 @@ class Card:
 
 class Deck(list[Card]):
     @classmethod
-    def new(cls) -> typing.Self:
+    def new(cls, rng: random.Random | None = None) -> typing.Self:
         deck = [
             Card(color, value)
             for color in COLORS
             for value in VALUES
             for _ in range(CARD_COUNT[value])
         ]
-        shuffle(deck)
+        # a seeded rng deals the same deck every time
+        if rng is None:
+            shuffle(deck)
+        else:
+            rng.shuffle(deck)
         return cls(deck)
 
 
@@ -67,6 +74,14 @@ class HandCard:
         self.not_colors: list[Color] = []
         self.not_values: list[Value] = []
 
+    def copy(self) -> "HandCard":
+        card = HandCard(self.color, self.value)
+        card.is_color_known = self.is_color_known
+        card.is_value_known = self.is_value_known
+        card.not_colors = list(self.not_colors)
+        card.not_values = list(self.not_values)
+        return card
+
     def real_name(self) -> str:
         return f"{self.color} {self.value}"
 
@@ -158,35 +173,76 @@ class Game:
     )
     final_moves: int = 0
     active_player: int = 0
+    turn: int = 0
     hands: dict[Player, Hand] = field(init=False)
     # TODO: change to game-log
     last_action_description: str = "Game just started"
+    # the parts that the game may change in place, or None if it owns all of them.
+    # the other parts may be shared with clones, see `clone_game`
+    owned: set[str | tuple[str, str]] | None = field(
+        default=None, repr=False, compare=False
+    )
 
     def __post_init__(self) -> None:
         num_cards = HAND_SIZE[len(self.players)]
         self.hands = {player: new_hand(self.deck, num_cards) for player in self.players}
 
 
-def check_color_finished(game: Game, color: Color) -> bool:
-    hinted = sum(
-        1
-        for hand in game.hands.values()
-        for card in hand
-        if card.is_color_known and card.color == color
-    )
+def clone_game(game: Game) -> Game:
+    """Copy a game in O(1), sharing its deck, piles, discards and hands.
+
+    Afterwards, each of the games copies a part the first time it changes it, with
+    the `own_*` functions, so changes to one game are never seen by the other.
+    """
+    clone = copy.copy(game)
+    game.owned = set()
+    clone.owned = set()
+    return clone
+
+
+def own_deck(game: Game) -> Deck:
+    if game.owned is not None and "deck" not in game.owned:
+        game.deck = Deck(game.deck)
+        game.owned.add("deck")
+    return game.deck
+
+
+def own_piles(game: Game) -> dict[Color, int]:
+    if game.owned is not None and "piles" not in game.owned:
+        game.piles = dict(game.piles)
+        game.owned.add("piles")
+    return game.piles
+
+
+def own_discarded(game: Game, color: Color) -> list[Value]:
+    if game.owned is not None and ("discarded", color) not in game.owned:
+        if "discarded" not in game.owned:
+            game.discarded = dict(game.discarded)
+            game.owned.add("discarded")
+        game.discarded[color] = list(game.discarded[color])
+        game.owned.add(("discarded", color))
+    return game.discarded[color]
+
+
+def own_hand(game: Game, player: Player) -> Hand:
+    if game.owned is not None and ("hand", player) not in game.owned:
+        if "hands" not in game.owned:
+            game.hands = dict(game.hands)
+            game.owned.add("hands")
+        game.hands[player] = Hand(card.copy() for card in game.hands[player])
+        game.owned.add(("hand", player))
+    return game.hands[player]
+
+
+def check_color_finished(game: Game, color: Color, hinted: int) -> bool:
+    # hinted is the number of cards in hands that are known to be of the color
     in_pile = game.piles[color]
     discarded = len(game.discarded[color])
     total = hinted + in_pile + discarded
     return total == COLOR_COUNT
 
 
-def check_value_finished(game: Game, value: Value) -> bool:
-    hinted = sum(
-        1
-        for hand in game.hands.values()
-        for card in hand
-        if card.is_value_known and card.value == value
-    )
+def check_value_finished(game: Game, value: Value, hinted: int) -> bool:
     in_piles = sum(color_value >= value for _color, color_value in game.piles.items())
     discarded = sum(
         color_discarded.count(value)
@@ -201,18 +257,10 @@ def count_discarded(game: Game, color: Color, value: Value) -> int:
     return game.discarded[color].count(value)
 
 
-def check_card_finished(game: Game, color: Color, value: Value) -> bool:
+def check_card_finished(game: Game, color: Color, value: Value, in_hands: int) -> bool:
+    # in_hands is the number of cards in hands that are known to be this card
     discarded = count_discarded(game, color, value)
     played = 1 if game.piles[color] >= value else 0
-    in_hands = sum(
-        1
-        for hand in game.hands.values()
-        for card in hand
-        if card.is_color_known
-        and card.is_value_known
-        and card.value == value
-        and card.color == color
-    )
 
     total = discarded + played + in_hands
     assert total <= CARD_COUNT[value]
@@ -256,43 +304,86 @@ def update_not_values(card: HandCard, value: Value) -> None:
 
 
 def update_hand_info(game: Game) -> None:
+    cards = [card for hand in game.hands.values() for card in hand]
+    # the known cards in hands are counted once, and the counts are updated as
+    # more cards become known
+    known_colors = Counter(card.color for card in cards if card.is_color_known)
+    known_values = Counter(card.value for card in cards if card.is_value_known)
+    known_cards = Counter(
+        (card.color, card.value)
+        for card in cards
+        if card.is_color_known and card.is_value_known
+    )
+
+    # a hand that is shared with a clone is copied before its cards change, so
+    # these return the card that is in the hand now
+    def learn_not_color(
+        player: Player, index: int, card: HandCard, color: Color
+    ) -> HandCard:
+        if card.is_color_known or card.color == color or color in card.not_colors:
+            return card
+        card = own_hand(game, player)[index]
+        update_not_colors(card, color)
+        if card.is_color_known:
+            known_colors[card.color] += 1
+            if card.is_value_known:
+                known_cards[card.color, card.value] += 1
+        return card
+
+    def learn_not_value(
+        player: Player, index: int, card: HandCard, value: Value
+    ) -> HandCard:
+        if card.is_value_known or card.value == value or value in card.not_values:
+            return card
+        card = own_hand(game, player)[index]
+        update_not_values(card, value)
+        if card.is_value_known:
+            known_values[card.value] += 1
+            if card.is_color_known:
+                known_cards[card.color, card.value] += 1
+        return card
+
     for color in COLORS:
-        if check_color_finished(game, color):
-            for hand in game.hands.values():
-                for card in hand:
-                    update_not_colors(card, color)
+        if check_color_finished(game, color, known_colors[color]):
+            for player, hand in game.hands.items():
+                for index, card in enumerate(hand):
+                    learn_not_color(player, index, card, color)
 
     for value in VALUES:
-        if check_value_finished(game, value):
-            for hand in game.hands.values():
-                for card in hand:
-                    update_not_values(card, value)
+        if check_value_finished(game, value, known_values[value]):
+            for player, hand in game.hands.items():
+                for index, card in enumerate(hand):
+                    learn_not_value(player, index, card, value)
 
-    for hand in game.hands.values():
-        for card in hand:
+    for player, hand in game.hands.items():
+        for index, card in enumerate(hand):
             if card.is_value_known and not card.is_color_known:
                 for color in COLORS:
-                    if check_card_finished(game, color, card.value):
-                        update_not_colors(card, color)
+                    if check_card_finished(
+                        game, color, card.value, known_cards[color, card.value]
+                    ):
+                        card = learn_not_color(player, index, card, color)
 
             elif card.is_color_known and not card.is_value_known:
                 for value in VALUES:
-                    if check_card_finished(game, card.color, value):
-                        update_not_values(card, value)
+                    if check_card_finished(
+                        game, card.color, value, known_cards[card.color, value]
+                    ):
+                        card = learn_not_value(player, index, card, value)
 
 
 def discard_card(game: Game, player: Player, index: int) -> bool:
     if index < 1 or index > len(game.hands[player]):
         return False
-    hand = game.hands[player]
+    hand = own_hand(game, player)
     card = hand.pop(index - 1)
-    game.discarded[card.color].append(card.value)
+    own_discarded(game, card.color).append(card.value)
     game.hints = min(game.hints + 1, INITIAL_HINTS)
 
     if len(game.deck) == 0:
         game.final_moves += 1
 
-    draw_card(hand, game.deck)
+    draw_card(hand, own_deck(game))
     return True
 
 
@@ -300,7 +391,7 @@ def play_card(game: Game, player: Player, index: int) -> bool:
     if index < 1 or index > len(game.hands[player]):
         return False
 
-    hand = game.hands[player]
+    hand = own_hand(game, player)
     card = hand.pop(index - 1)
 
     success = False
@@ -311,15 +402,15 @@ def play_card(game: Game, player: Player, index: int) -> bool:
             game.hints = min(game.hints + 1, INITIAL_HINTS)
 
     if success:
-        game.piles[card.color] += 1
+        own_piles(game)[card.color] += 1
     else:
         game.errors += 1
-        game.discarded[card.color].append(card.value)
+        own_discarded(game, card.color).append(card.value)
 
     if len(game.deck) == 0:
         game.final_moves += 1
 
-    draw_card(hand, game.deck)
+    draw_card(hand, own_deck(game))
     return True
 
 
@@ -358,7 +449,7 @@ def get_active_player_name(game: Game) -> Player:
 
 def give_hint(game: Game, player: Player, hint: Color | Value) -> bool:
     assert game.hints > 0
-    hand = game.hands[player]
+    hand = own_hand(game, player)
     if isinstance(hint, Color):
         hand.give_color_hint(hint)
     elif isinstance(hint, Value):
@@ -379,6 +470,11 @@ def parse_int(s: str) -> tuple[int, bool]:
         return 0, False
 
 
+def parse_slot(game: Game, player: Player, s: str) -> tuple[int, bool]:
+    index, ok = parse_int(s)
+    return index, ok and 1 <= index <= len(game.hands[player])
+
+
 def perform_action(game: Game, player: Player, action: str) -> bool:
     if " " not in action.strip():
         return False
@@ -391,7 +487,7 @@ def perform_action(game: Game, player: Player, action: str) -> bool:
         name = aliases[name]
 
     if name == "discard":
-        index, ok = parse_int(value)
+        index, ok = parse_slot(game, player, value)
         if not ok:
             return False
         hand_card = game.hands[player][index - 1]
@@ -404,7 +500,7 @@ def perform_action(game: Game, player: Player, action: str) -> bool:
         ok = discard_card(game, player, index)
 
     elif name == "play":
-        index, ok = parse_int(value)
+        index, ok = parse_slot(game, player, value)
         if not ok:
             return False
         hand_card = game.hands[player][index - 1]
@@ -425,17 +521,19 @@ def perform_action(game: Game, player: Player, action: str) -> bool:
             description = "+ " + description
 
     elif name == "hint":
-        other_player_str, hint = value.split(" ")
+        other_player_str, _, hint = value.partition(" ")
         other_player = Player(other_player_str)
         if other_player == player:
             return False
         if other_player not in game.hands:
             return False
+        if not game.hints:
+            return False
         if hint in COLORS:
             ok = give_hint(game, other_player, Color(hint))
         else:
             index, ok = parse_int(hint)
-            if not ok:
+            if not ok or index not in VALUES:
                 return False
             ok = give_hint(game, other_player, Value(index))
         description += f"hinted {hint!r} to {other_player}"
@@ -444,6 +542,7 @@ def perform_action(game: Game, player: Player, action: str) -> bool:
         print("Invalid action. Please repeat.")
     else:
         game.active_player = (game.active_player + 1) % len(game.players)
+        game.turn += 1
 
     game.last_action_description = description
     if ok:
@@ -0,0 +1,153 @@
+import itertools
+from dataclasses import dataclass
+
+from . import hanabi
+
+# a set of cards is a bitmask, with a bit for each color and value
+COLORS = list(hanabi.COLORS)
+VALUES = list(hanabi.VALUES)
+HINTS: list[hanabi.Color | hanabi.Value] = [*COLORS, *VALUES]
+ALL_COLORS = (1 << len(COLORS)) - 1
+ALL_VALUES = (1 << len(VALUES)) - 1
+# how much each effect of a hint is worth
+PLAYABLE_WEIGHT = 10
+CRITICAL_WEIGHT = 5
+
+
+def card_bit(color: hanabi.Color, value: hanabi.Value) -> int:
+    return 1 << (COLORS.index(color) * len(VALUES) + value - 1)
+
+
+# the cards a hand card may be, by the colors and by the values it may have
+POSSIBLE = [
+    [
+        sum(
+            card_bit(color, value)
+            for (c, color), (v, value) in itertools.product(
+                enumerate(COLORS), enumerate(VALUES)
+            )
+            if colors >> c & 1 and values >> v & 1
+        )
+        for values in range(ALL_VALUES + 1)
+    ]
+    for colors in range(ALL_COLORS + 1)
+]
+
+
+def color_mask(card: hanabi.HandCard) -> int:
+    if card.is_color_known:
+        return 1 << COLORS.index(card.color)
+    return ALL_COLORS & ~sum(1 << COLORS.index(c) for c in card.not_colors)
+
+
+def value_mask(card: hanabi.HandCard) -> int:
+    if card.is_value_known:
+        return 1 << (card.value - 1)
+    return ALL_VALUES & ~sum(1 << (v - 1) for v in card.not_values)
+
+
+def possible_cards(card: hanabi.HandCard) -> int:
+    # what the holder knows, from the hints
+    return POSSIBLE[color_mask(card)][value_mask(card)]
+
+
+def playable_cards(game: hanabi.Game) -> int:
+    return sum(
+        card_bit(color, hanabi.Value(pile + 1))
+        for color, pile in game.piles.items()
+        if pile < hanabi.MAX_VALUE
+    )
+
+
+def dead_cards(game: hanabi.Game) -> int:
+    # cards that were already played, so they can never be played again
+    return sum(
+        card_bit(color, value)
+        for color, pile in game.piles.items()
+        for value in VALUES[:pile]
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class HintSuggestion:
+    player: hanabi.Player
+    hint: hanabi.Color | hanabi.Value
+    touched: int
+    informed: int
+    playable: int
+    critical: int
+
+    @property
+    def score(self) -> int:
+        return (
+            self.playable * PLAYABLE_WEIGHT
+            + self.critical * CRITICAL_WEIGHT
+            + self.informed
+        )
+
+    @property
+    def action(self) -> str:
+        # for `perform_action`
+        return f"hint {self.player} {self.hint}"
+
+
+def hint_effects(
+    game: hanabi.Game, player: hanabi.Player, playable: int
+) -> list[HintSuggestion]:
+    hand = game.hands[player]
+    # what each card may be after each hint, by whether the hint touches it
+    cards = []
+    for card in hand:
+        colors, values = color_mask(card), value_mask(card)
+        critical = (
+            not card.is_color_known
+            and not card.is_value_known
+            and hanabi.is_critical_card(game, card.color, card.value)
+        )
+        cards.append((card, colors, values, POSSIBLE[colors][values], critical))
+
+    suggestions = []
+    for hint in HINTS:
+        touched = informed = newly_playable = protected = 0
+        is_color = isinstance(hint, hanabi.Color)
+        if isinstance(hint, hanabi.Color):
+            bit = 1 << COLORS.index(hint)
+        else:
+            bit = 1 << (hint - 1)
+        for card, colors, values, before, critical in cards:
+            touches = (card.color if is_color else card.value) == hint
+            if is_color:
+                after = POSSIBLE[bit if touches else colors & ~bit][values]
+            else:
+                after = POSSIBLE[colors][bit if touches else values & ~bit]
+            touched += touches
+            if after == before:
+                continue
+            informed += 1
+            newly_playable += after & ~playable == 0 and before & ~playable != 0
+            protected += touches and critical
+        suggestions.append(
+            HintSuggestion(player, hint, touched, informed, newly_playable, protected)
+        )
+    return suggestions
+
+
+def suggest_hints(game: hanabi.Game, player: hanabi.Player) -> list[HintSuggestion]:
+    """Rank the hints that the player can give, best first.
+
+    A hint is worth more when it makes cards known to be playable, when it touches
+    critical cards that were never hinted, and when it tells more cards anything.
+    Hints that tell nothing are left out.
+    """
+    if not game.hints:
+        return []
+    playable = playable_cards(game)
+    suggestions = [
+        suggestion
+        for other in game.players
+        if other != player
+        for suggestion in hint_effects(game, other, playable)
+        if suggestion.informed
+    ]
+    suggestions.sort(key=lambda suggestion: suggestion.score, reverse=True)
+    return suggestions
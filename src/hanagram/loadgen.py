@@ -0,0 +1,212 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+
+from telepot.loop import GetUpdatesLoop  # type: ignore[import-untyped]
+
+from . import play_telegram
+from .dispatch import ChatDispatcher
+from .fake_telegram import FakeTelegram
+from .outbox import Outbox
+from .sharding import ShardRouter
+from .tracing import tracer
+
+# how players choose their action, when all are available
+ACTION_WEIGHTS = {"discard": 5, "hint": 4, "play": 1}
+MIN_PLAYERS = 2
+MAX_PLAYERS = 5
+FIRST_USER_ID = 10_000
+
+
+def percentile(data: list[float], percent: int) -> float:
+    if len(data) < 2:
+        return data[0] if data else 0.0
+    return statistics.quantiles(data, n=100, method="inclusive")[percent - 1]
+
+
+class LoadGenerator:
+    """Simulate groups playing full /test games, through a FakeTelegram server.
+
+    Each group is a chat with one user who plays all the seats. The user answers
+    every keyboard the bot sends. A turn is timed from the button that completes
+    an action until the bot sends the keyboard of the next turn, or ends the game.
+    """
+
+    def __init__(
+        self,
+        telegram: FakeTelegram,
+        groups: int,
+        *,
+        think_time: float = 0.0,
+        seed: int = 0,
+    ):
+        self.telegram = telegram
+        self.groups = groups
+        self.think_time = think_time
+        self.turn_latencies: list[float] = []
+        self.games_finished = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._turn_started: dict[int, float] = {}
+        self._finished = threading.Event()
+        telegram.observers.append(self.observe)
+
+    def start(self) -> None:
+        for i in range(self.groups):
+            user_id = FIRST_USER_ID + i
+            players = self._rng.randint(MIN_PLAYERS, MAX_PLAYERS)
+            self.telegram.push_update(
+                {
+                    "message": {
+                        "message_id": 1,
+                        "date": int(time.time()),
+                        "from": {"id": user_id, "first_name": f"Player{i}"},
+                        "chat": {"id": -user_id, "type": "group"},
+                        "text": f"/test {players}",
+                    }
+                }
+            )
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def observe(self, method: str, params: dict[str, str], result: object) -> None:
+        if method not in {"sendMessage", "editMessageText"}:
+            return
+        chat_id = int(params["chat_id"])
+        if chat_id < 0 and params["text"].startswith("The game ended"):
+            self._end_turn(chat_id)
+            with self._lock:
+                self.games_finished += 1
+                if self.games_finished == self.groups:
+                    self._finished.set()
+            return
+        if "reply_markup" not in params:
+            return
+        buttons = [
+            button["callback_data"]
+            for row in json.loads(params["reply_markup"])["inline_keyboard"]
+            for button in row
+        ]
+        if not buttons or "|" not in buttons[0]:
+            # the join button of a lobby
+            return
+        group = int(buttons[0].rpartition("|")[2])
+        choices = [data.partition("|")[0] for data in buttons]
+        if "play" in choices:
+            self._end_turn(group)
+            choice = self._choose_action(choices)
+        else:
+            choice = self._rng.choice([c for c in choices if c != "back"])
+            if params["text"].startswith(("Choose card", "Choose information")):
+                # this choice completes the action
+                with self._lock:
+                    self._turn_started[group] = time.perf_counter()
+        assert isinstance(result, dict)
+        self._answer(chat_id, result["message_id"], f"{choice}|{group}")
+
+    def _choose_action(self, choices: list[str]) -> str:
+        actions = [action for action in ACTION_WEIGHTS if action in choices]
+        weights = [ACTION_WEIGHTS[action] for action in actions]
+        return self._rng.choices(actions, weights)[0]
+
+    def _end_turn(self, group: int) -> None:
+        with self._lock:
+            started = self._turn_started.pop(group, None)
+            if started is not None:
+                self.turn_latencies.append(time.perf_counter() - started)
+
+    def _answer(self, user_id: int, message_id: int, data: str) -> None:
+        update: dict[str, object] = {
+            "callback_query": {
+                "id": str(message_id),
+                "chat_instance": str(user_id),
+                "from": {"id": user_id, "first_name": "Player"},
+                "message": {"message_id": message_id, "chat": {"id": user_id}},
+                "data": data,
+            }
+        }
+        if self.think_time:
+            threading.Timer(
+                self.think_time, self.telegram.push_update, [update]
+            ).start()
+        else:
+            self.telegram.push_update(update)
+
+
+def start_bot(telegram: FakeTelegram, workers: int, unlimited: bool) -> None:
+    # worker processes read the settings from the environment
+    os.environ.setdefault("TELEGRAM_USERNAME", "hanagram_fake_bot")
+    os.environ.setdefault("TELEGRAM_API_KEY", "0:loadtest")
+    os.environ["TELEGRAM_API_URL"] = telegram.url
+    server = play_telegram.create_server()
+    if unlimited:
+        server.outbox = Outbox(
+            server.bot, private_chat_rate=1e6, group_chat_rate=1e6, global_rate=1e6
+        )
+    play_telegram.server = server
+    play_telegram.start_tracing(play_telegram.config().metrics_port)
+    if workers > 1:
+        router = ShardRouter(
+            play_telegram.run_shard_worker, play_telegram.update_chat_id, workers
+        )
+        router.start()
+        submit = router.submit
+    else:
+        submit = ChatDispatcher(
+            play_telegram.handle_update, play_telegram.update_chat_id
+        ).submit
+    GetUpdatesLoop(server.bot, submit).run_as_thread()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Play many games against a local fake Telegram server."
+    )
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="429 ratio")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds")
+    parser.add_argument(
+        "--unlimited", action="store_true", help="ignore telegram's rate limits"
+    )
+    args = parser.parse_args()
+
+    telegram = FakeTelegram(latency=args.latency, error_rate=args.error_rate)
+    telegram.start()
+    load = LoadGenerator(telegram, args.groups, think_time=args.think_time)
+    start_bot(telegram, args.workers, args.unlimited)
+    start = time.perf_counter()
+    load.start()
+    done = load.wait(args.timeout)
+    elapsed = time.perf_counter() - start
+
+    messages = sum(telegram.calls.values()) - telegram.calls["getUpdates"]
+    latencies = sorted(load.turn_latencies)
+    print(f"games:     {load.games_finished}/{args.groups} in {elapsed:.1f}s")
+    if not done:
+        print("           timed out")
+    print(f"turns:     {len(latencies)} ({len(latencies) / elapsed:.1f}/s)")
+    print(f"latency:   p50 {percentile(latencies, 50) * 1000:.0f}ms", end="")
+    print(f", p99 {percentile(latencies, 99) * 1000:.0f}ms")
+    print(f"messages:  {messages} ({messages / elapsed:.1f}/s)", end="")
+    print(f", {telegram.uploads} uploads, {telegram.too_many_requests} 429s")
+    for method, count in sorted(telegram.calls.items()):
+        print(f"  {method:<20}{count:8d}")
+    if tracer.histograms:
+        print("spans:     count   mean")
+        for name, histogram in sorted(tracer.histograms.items()):
+            mean = histogram.sum / histogram.count * 1000
+            print(f"  {name:<20}{histogram.count:6d} {mean:6.1f}ms")
+    # don't wait for the bot's threads
+    os._exit(0 if done else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+import collections
+import hashlib
+import io
+import threading
+import time
+import typing
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+import telepot  # type: ignore[import-untyped]
+from telepot.exception import (  # type: ignore[import-untyped]
+    TelegramError,
+    TooManyRequestsError,
+)
+
+from .tracing import Trace, tracer
+
+Message = typing.NewType("Message", dict[str, typing.Any])  # type: ignore[explicit-any]
+
+# see https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+PRIVATE_CHAT_RATE = 1.0  # requests per second
+GROUP_CHAT_RATE = 20 / 60
+GLOBAL_RATE = 30.0
+CHAT_BURST = 3
+GLOBAL_BURST = 30
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+MAX_MESSAGE_LENGTH = 4096
+DEFAULT_WORKERS = 4
+PHOTO_CACHE_SIZE = 1024
+NOT_MODIFIED = "message is not modified"
+# the name of the uploaded file part that editMessageMedia attaches
+MEDIA_ATTACHMENT = "photo"
+
+
+class Bot(telepot.Bot):  # type: ignore[misc]
+    def editMessageMedia(
+        self,
+        msg_identifier: tuple[int, int],
+        media: dict[str, object],
+        reply_markup: object = None,
+    ) -> Message:
+        # telepot sends the media as an array, like in sendMediaGroup, but telegram
+        # expects a single InputMedia object, with an upload attached by name
+        files = None
+        if not isinstance(media["media"], str):
+            files = {MEDIA_ATTACHMENT: media["media"]}
+            media = {**media, "media": f"attach://{MEDIA_ATTACHMENT}"}
+        chat_id, message_id = msg_identifier
+        params = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "media": media,
+            "reply_markup": reply_markup,
+        }
+        result: Message = self._api_request(
+            "editMessageMedia", telepot._rectify(params), files
+        )
+        return result
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+@dataclass(slots=True, eq=False)
+class Request:
+    method: str
+    chat_id: int
+    args: tuple[object, ...]
+    kwargs: dict[str, object]
+    future: Future[Message] = field(default_factory=Future)
+    attempts: int = 0
+    not_before: float = 0.0
+    photo_key: bytes | None = None
+    trace: Trace | None = None
+    # a queued request with the same key is dropped when this one is queued
+    supersedes: Hashable | None = None
+
+    def can_merge(self, request: "Request") -> bool:
+        # a merged message could not be superseded without dropping the other text
+        return (
+            self.method == request.method == "sendMessage"
+            and self.attempts == 0
+            and "reply_markup" not in self.kwargs
+            and self.kwargs == request.kwargs
+            and self.supersedes is None
+            and request.supersedes is None
+        )
+
+
+class PhotoCache:
+    """Remember the Telegram file_id of uploaded photos, keyed by their content."""
+
+    def __init__(self, max_size: int = PHOTO_CACHE_SIZE):
+        self.max_size = max_size
+        self.file_ids: collections.OrderedDict[bytes, str] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.file_ids)
+
+    @staticmethod
+    def key(photo: io.BytesIO) -> bytes:
+        with photo.getbuffer() as data:
+            return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(self, key: bytes) -> str | None:
+        with self._lock:
+            file_id = self.file_ids.get(key)
+            if file_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.file_ids.move_to_end(key)
+            return file_id
+
+    def put(self, key: bytes, file_id: str) -> None:
+        with self._lock:
+            self.file_ids[key] = file_id
+            self.file_ids.move_to_end(key)
+            while len(self.file_ids) > self.max_size:
+                self.file_ids.popitem(last=False)
+
+    def discard(self, key: bytes) -> None:
+        with self._lock:
+            self.file_ids.pop(key, None)
+
+
+def sent_photo_file_id(result: object) -> str | None:
+    # telegram returns a few sizes of the photo, the last one is the original
+    if not isinstance(result, dict) or not result.get("photo"):
+        return None
+    file_id: str = result["photo"][-1]["file_id"]
+    return file_id
+
+
+def request_photo(request: Request) -> object:
+    if request.method == "sendPhoto":
+        return request.args[1]
+    if request.method == "editMessageMedia":
+        media = request.args[1]
+        assert isinstance(media, dict)
+        return media["media"]
+    return None
+
+
+def replace_request_photo(request: Request, file_id: str) -> tuple[object, ...]:
+    if request.method == "editMessageMedia":
+        media = request.args[1]
+        assert isinstance(media, dict)
+        return (request.args[0], {**media, "media": file_id})
+    return (request.args[0], file_id)
+
+
+class ChatQueue:
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.requests: collections.deque[Request] = collections.deque()
+        self.in_flight = False
+
+
+class Outbox:
+    """Send requests to the Telegram API from background threads.
+
+    Requests to the same chat are sent in order, while respecting a per-chat and a
+    global rate limit. Consecutive plain text messages to the same chat are merged
+    into a single message, and requests answered with "429 Too Many Requests" are
+    retried after the delay requested by Telegram. Photos that were already uploaded
+    are sent again by their file_id instead of being uploaded again. A request can
+    supersede the queued requests that have the same key, which are then dropped and
+    resolved with an empty message.
+    """
+
+    def __init__(
+        self,
+        bot: telepot.Bot,
+        *,
+        workers: int = DEFAULT_WORKERS,
+        private_chat_rate: float = PRIVATE_CHAT_RATE,
+        group_chat_rate: float = GROUP_CHAT_RATE,
+        global_rate: float = GLOBAL_RATE,
+        chat_burst: int = CHAT_BURST,
+        global_burst: int = GLOBAL_BURST,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = BACKOFF_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        photo_cache: PhotoCache | None = None,
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_burst, clock())
+        self.photos = PhotoCache() if photo_cache is None else photo_cache
+        self.chats: dict[int, ChatQueue] = {}
+        self.pending = 0
+        self.in_flight = 0
+        self.api_calls: collections.Counter[str] = collections.Counter()
+        self.merged = 0
+        self.superseded = 0
+        self.retries = 0
+        self.failures = 0
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._closed = False
+
+    @property
+    def queue_depth(self) -> int:
+        with self._cond:
+            return self.pending
+
+    def send_message(
+        self,
+        chat_id: int,
+        text: str,
+        *,
+        supersedes: Hashable | None = None,
+        **kwargs: object,
+    ) -> Future[Message]:
+        return self.submit(
+            "sendMessage", chat_id, (chat_id, text), kwargs, supersedes=supersedes
+        )
+
+    def send_photo(
+        self,
+        chat_id: int,
+        photo: object,
+        *,
+        supersedes: Hashable | None = None,
+        **kwargs: object,
+    ) -> Future[Message]:
+        return self.submit(
+            "sendPhoto", chat_id, (chat_id, photo), kwargs, supersedes=supersedes
+        )
+
+    def edit_message_text(
+        self, msg_identifier: tuple[int, int], text: str, **kwargs: object
+    ) -> Future[Message]:
+        return self.submit(
+            "editMessageText", msg_identifier[0], (msg_identifier, text), kwargs
+        )
+
+    def edit_message_media(
+        self,
+        msg_identifier: tuple[int, int],
+        photo: object,
+        *,
+        supersedes: Hashable | None = None,
+        **kwargs: object,
+    ) -> Future[Message]:
+        media = {"type": "photo", "media": photo}
+        return self.submit(
+            "editMessageMedia",
+            msg_identifier[0],
+            (msg_identifier, media),
+            kwargs,
+            supersedes=supersedes,
+        )
+
+    def delete_message(self, msg_identifier: tuple[int, int]) -> Future[Message]:
+        return self.submit("deleteMessage", msg_identifier[0], (msg_identifier,), {})
+
+    def submit(
+        self,
+        method: str,
+        chat_id: int,
+        args: tuple[object, ...],
+        kwargs: dict[str, object],
+        *,
+        supersedes: Hashable | None = None,
+    ) -> Future[Message]:
+        trace = tracer.current()
+        request = Request(
+            method, chat_id, args, kwargs, trace=trace, supersedes=supersedes
+        )
+        future = self._enqueue(request)
+        if trace is not None:
+            # the update is traced until its requests are answered
+            tracer.hold(trace)
+            future.add_done_callback(lambda _future: tracer.release(trace))
+        return future
+
+    def join(self, timeout: float | None = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.pending == 0 and self.in_flight == 0, timeout
+            )
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _enqueue(self, request: Request) -> Future[Message]:
+        chat_id = request.chat_id
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("outbox is closed")
+            self._start_workers()
+            chat = self._chat_queue(chat_id)
+            last = chat.requests[-1] if chat.requests else None
+            if last and last.can_merge(request):
+                text = f"{last.args[1]}\n{request.args[1]}"
+                if len(text) <= MAX_MESSAGE_LENGTH:
+                    last.args = (chat_id, text)
+                    self.merged += 1
+                    return last.future
+            dropped = []
+            if request.supersedes is not None:
+                dropped = [
+                    r for r in chat.requests if r.supersedes == request.supersedes
+                ]
+                for old in dropped:
+                    chat.requests.remove(old)
+                self.pending -= len(dropped)
+                self.superseded += len(dropped)
+            chat.requests.append(request)
+            self.pending += 1
+            self._cond.notify()
+        # outside the lock, since the callbacks may queue more requests
+        for old in dropped:
+            old.future.set_result(Message({}))
+        return request.future
+
+    def _chat_queue(self, chat_id: int) -> ChatQueue:
+        if chat_id not in self.chats:
+            rate = self.group_chat_rate if chat_id < 0 else self.private_chat_rate
+            bucket = TokenBucket(rate, self.chat_burst, self.clock())
+            self.chats[chat_id] = ChatQueue(bucket)
+        return self.chats[chat_id]
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._work, name=f"outbox-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_request(self) -> Request | None:
+        # called with the lock held. blocks until a request may be sent
+        while not self._closed:
+            now = self.clock()
+            best: tuple[float, int] | None = None
+            for chat_id, chat in self.chats.items():
+                if chat.in_flight or not chat.requests:
+                    continue
+                ready = max(chat.bucket.ready_at(now), chat.requests[0].not_before)
+                if best is None or ready < best[0]:
+                    best = (ready, chat_id)
+            if best is None:
+                self._cond.wait()
+                continue
+            ready = max(best[0], self.global_bucket.ready_at(now))
+            if ready > now:
+                self._cond.wait(ready - now)
+                continue
+            chat = self.chats[best[1]]
+            chat.bucket.take(now)
+            self.global_bucket.take(now)
+            chat.in_flight = True
+            self.pending -= 1
+            self.in_flight += 1
+            # round-robin: move this chat to the end of the scan order
+            self.chats[best[1]] = self.chats.pop(best[1])
+            return chat.requests.popleft()
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                request = self._next_request()
+            if request is None:
+                return
+            done = self._send(request)
+            with self._cond:
+                chat = self.chats[request.chat_id]
+                chat.in_flight = False
+                self.in_flight -= 1
+                if not done:
+                    chat.requests.appendleft(request)
+                    self.pending += 1
+                elif not chat.requests and chat.bucket.is_full(self.clock()):
+                    del self.chats[request.chat_id]
+                self._cond.notify_all()
+
+    def _cached_photo_args(self, request: Request) -> tuple[object, ...] | None:
+        photo = request_photo(request)
+        if not isinstance(photo, io.BytesIO):
+            return None
+        if request.photo_key is None:
+            request.photo_key = self.photos.key(photo)
+        file_id = self.photos.get(request.photo_key)
+        if file_id is None:
+            return None
+        return replace_request_photo(request, file_id)
+
+    def _send(self, request: Request) -> bool:
+        # returns False if the request should be retried
+        for arg in [*request.args, request_photo(request)]:
+            if isinstance(arg, io.IOBase):
+                arg.seek(0)
+        request.attempts += 1
+        self.api_calls[request.method] += 1
+        cached_args = self._cached_photo_args(request)
+        args = request.args if cached_args is None else cached_args
+        try:
+            with tracer.span(f"api.{request.method}", request.trace):
+                result = getattr(self.bot, request.method)(*args, **request.kwargs)
+        except TooManyRequestsError as ex:
+            if request.attempts <= self.max_retries:
+                parameters = ex.json.get("parameters", {})
+                delay = parameters.get("retry_after") or self.backoff * 2 ** (
+                    request.attempts - 1
+                )
+                request.not_before = self.clock() + delay
+                self.retries += 1
+                return False
+            self._fail(request, ex)
+        except TelegramError as ex:
+            if NOT_MODIFIED in str(ex.description):
+                # nothing to do, the message already looks like this
+                request.future.set_result(Message({}))
+                return True
+            if cached_args is not None and request.photo_key is not None:
+                # the file_id is no longer valid, upload the photo again
+                self.photos.discard(request.photo_key)
+                return False
+            self._fail(request, ex)
+        except Exception as ex:
+            self._fail(request, ex)
+        else:
+            if cached_args is None and request.photo_key is not None:
+                file_id = sent_photo_file_id(result)
+                if file_id is not None:
+                    self.photos.put(request.photo_key, file_id)
+            request.future.set_result(Message(result))
+        return True
+
+    def _fail(self, request: Request, ex: Exception) -> None:
+        self.failures += 1
+        print("[ERROR]", request.method, request.chat_id, ex)
+        request.future.set_exception(ex)
@@ -1,8 +1,18 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import random
 import sys
-from collections.abc import Callable
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import TextIO
 
 from .hanabi import (
     COLORS,
+    HAND_SIZE,
+    Deck,
     Game,
     GameState,
     Player,
@@ -11,24 +21,37 @@ from .hanabi import (
     perform_action,
 )
 
+USAGE = """\
+Usage:
+discard <SLOT>
+play <SLOT>
+hint <PLAYER> <COLOR>
+hint <PLAYER> <VALUE>
+"""
+BATCH_CHUNK = 64  # games that a worker plays at once
 
-def print_board_state(game: Game, seen_from: Player | None = None) -> None:
+
+def format_board_state(game: Game, seen_from: Player | None = None) -> str:
+    lines = []
     for player in game.players:
-        print()
-        print(f"{player}'s hand:")
-        print(game.hands[player].to_string(player != seen_from))
-        print()
+        lines += ["", f"{player}'s hand:"]
+        lines += [game.hands[player].to_string(player != seen_from), ""]
 
     for color in COLORS:
-        print(
+        lines.append(
             f"{color:6}: {game.piles[color]}  {[int(v) for v in game.discarded[color]]}"
         )
-    print()
+    lines.append("")
 
     score = get_score(game)
-    print(f"hints: {game.hints}, errors: {game.errors}")
-    print(f"score: {score}, deck: {len(game.deck)}")
-    print()
+    lines.append(f"hints: {game.hints}, errors: {game.errors}")
+    lines.append(f"score: {score}, deck: {len(game.deck)}")
+    lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def print_board_state(game: Game, seen_from: Player | None = None) -> None:
+    print(format_board_state(game, seen_from), end="")
 
 
 def play_repl(
@@ -60,15 +83,137 @@ def play_repl(
                 print(game.last_action_description)
                 print("-" * len(game.last_action_description))
             else:
-                print("Usage:")
-                print("discard <SLOT>")
-                print("play <SLOT>")
-                print("hint <PLAYER> <COLOR>")
-                print("hint <PLAYER> <VALUE>")
+                print(USAGE, end="")
+
+
+@dataclass(slots=True)
+class Script:
+    line: int
+    seed: int
+    players: list[Player]
+    # the line number of each action, or of a `board` request
+    actions: list[tuple[int, str]] = field(default_factory=list)
+
+
+def read_scripts(lines: Iterable[str]) -> Iterator[Script]:
+    """Read games from lines of `game <seed> <player> <player>...`, each followed by
+    the actions of the active players, and `board` to print the whole board.
+    Empty lines and lines that start with `#` are skipped.
+    """
+    script = None
+    for line_number, line in enumerate(lines, 1):
+        text = line.strip()
+        if not text or text.startswith("#"):
+            continue
+        name, *args = text.split()
+        if name == "game":
+            if script is not None:
+                yield script
+            players = [Player(p) for p in args[1:]]
+            if (
+                not args
+                or not args[0].isdigit()
+                or len(players) not in HAND_SIZE
+                or len(set(players)) < len(players)
+            ):
+                print(
+                    "[ERROR]",
+                    f"line {line_number}: use game <seed> <players>, with"
+                    f" {min(HAND_SIZE)} to {max(HAND_SIZE)} different players",
+                    file=sys.stderr,
+                )
+                script = None
+                continue
+            script = Script(line_number, int(args[0]), players)
+        elif script is None:
+            print(
+                "[ERROR]",
+                f"line {line_number}: no game before {text!r}",
+                file=sys.stderr,
+            )
+        else:
+            script.actions.append((line_number, text))
+    if script is not None:
+        yield script
+
+
+def play_script(script: Script) -> tuple[str, int]:
+    # the output of the game and its result, and the number of performed actions
+    output = io.StringIO()
+    performed = 0
+    game = Game(script.players, deck=Deck.new(random.Random(script.seed)))
+    # perform_action prints its own errors, the line number is more useful
+    with contextlib.redirect_stdout(io.StringIO()):
+        for line_number, action in script.actions:
+            if action == "board":
+                output.write(format_board_state(game))
+                continue
+            if check_state(game) is not GameState.RUNNING:
+                output.write(f"line {line_number}: the game ended before {action!r}\n")
+                break
+            player = game.players[game.active_player]
+            if not perform_action(game, player, action):
+                output.write(f"line {line_number}: invalid action {action!r}\n")
+                break
+            performed += 1
+    output.write(format_board_state(game))
+    state = check_state(game)
+    output.write(
+        f"game at line {script.line}: {state.name}, score {get_score(game)},"
+        f" {game.turn} turns\n"
+    )
+    return output.getvalue(), performed
+
+
+def play_batch(
+    lines: Iterable[str], output: TextIO, workers: int = 1
+) -> tuple[int, int]:
+    # returns the number of games and of performed actions. the output is in the
+    # order of games
+    games = actions = 0
+    with contextlib.ExitStack() as stack:
+        if workers == 1:
+            results: Iterable[tuple[str, int]] = map(play_script, read_scripts(lines))
+        else:
+            context = multiprocessing.get_context("spawn")
+            pool = stack.enter_context(context.Pool(workers))
+            results = pool.imap(play_script, read_scripts(lines), chunksize=BATCH_CHUNK)
+        for result, performed in results:
+            output.write(result)
+            games += 1
+            actions += performed
+    return games, actions
 
 
 def main() -> None:
-    try:
-        play_repl(sys.argv[1:])
-    except EOFError:
-        sys.exit(1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("players", nargs="*")
+    parser.add_argument(
+        "--batch",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+        help="play the games of a script file, or of stdin",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="for --batch")
+    args = parser.parse_args()
+    if args.batch is None:
+        try:
+            play_repl(args.players)
+        except EOFError:
+            sys.exit(1)
+        return
+
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if args.batch == "-":
+            lines = sys.stdin
+        else:
+            lines = stack.enter_context(open(args.batch))
+        games, actions = play_batch(lines, sys.stdout, args.workers)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{games} games, {actions} actions in {elapsed:.2f}s,"
+        f" {games / max(elapsed, 1e-9):.0f} games per second",
+        file=sys.stderr,
+    )
@@ -0,0 +1,254 @@
+"""Host Hanabi games over TCP, for telnet and other line based clients."""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+from dataclasses import dataclass, field
+
+from . import hanabi
+from .play_repl import USAGE, format_board_state
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7777
+# a client that doesn't read its messages is disconnected
+MAX_WRITE_BUFFER = 1 << 20
+MAX_NAME_LENGTH = 20
+TURN_PROMPT = "your turn"
+LOBBY_HELP = """\
+Commands:
+play <players>   join a table for that many players, or open a new one
+tables           list the tables that wait for players
+join <table>     join a table
+leave            leave your table
+quit
+"""
+
+
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.name: hanabi.Player | None = None
+        self.table: Table | None = None
+
+    def send(self, text: str) -> None:
+        if self.writer.is_closing():
+            return
+        self.writer.write(text.encode())
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            print("[ERROR]", f"{self.name} doesn't read, disconnecting")
+            self.writer.close()
+
+    async def read_line(self) -> str | None:
+        # None when the client disconnected
+        try:
+            line = await self.reader.readline()
+        except (ConnectionError, ValueError):
+            return None
+        if not line:
+            return None
+        return line.decode(errors="replace").strip()
+
+
+@dataclass(eq=False)
+class Table:
+    number: int
+    size: int
+    seats: list[Connection] = field(default_factory=list)
+    game: hanabi.Game | None = None
+
+    def broadcast(self, text: str) -> None:
+        for seat in self.seats:
+            seat.send(text)
+
+    def describe(self) -> str:
+        names = ", ".join(str(seat.name) for seat in self.seats)
+        return f"table {self.number}: {len(self.seats)}/{self.size} players ({names})"
+
+
+class TcpServer:
+    """Host many games in one event loop, with a lobby to find a table.
+
+    Each player sees the board from their seat, with their own cards hidden, and
+    the active player acts with the same text as in the REPL.
+    """
+
+    def __init__(self) -> None:
+        self.tables: dict[int, Table] = {}
+        self.names: set[hanabi.Player] = set()
+        self.games_started = 0
+        self.games_finished = 0
+        self._table_numbers = itertools.count(1)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        connection = Connection(reader, writer)
+        try:
+            await self.serve(connection)
+        finally:
+            self.leave_table(connection)
+            if connection.name is not None:
+                self.names.discard(connection.name)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def serve(self, connection: Connection) -> None:
+        connection.send("Welcome to Hanagram! What is your name?\n")
+        while connection.name is None:
+            line = await connection.read_line()
+            if line is None:
+                return
+            name = hanabi.Player(line)
+            if not name or " " in name or len(name) > MAX_NAME_LENGTH:
+                connection.send(f"Use one word, up to {MAX_NAME_LENGTH} letters\n")
+            elif name in self.names:
+                connection.send(f"{name} is taken, choose another name\n")
+            else:
+                connection.name = name
+                self.names.add(name)
+        connection.send(f"Hello {connection.name}!\n{LOBBY_HELP}")
+
+        while (line := await connection.read_line()) is not None:
+            if line == "quit":
+                return
+            if line:
+                self.handle_line(connection, line)
+            await connection.writer.drain()
+
+    def handle_line(self, connection: Connection, line: str) -> None:
+        table = connection.table
+        if table is not None and table.game is not None and line != "leave":
+            self.play(table, connection, line)
+            return
+        command, _, argument = line.partition(" ")
+        if command == "play" and argument.isdigit():
+            size = int(argument)
+            if size not in hanabi.HAND_SIZE:
+                sizes = f"{min(hanabi.HAND_SIZE)} to {max(hanabi.HAND_SIZE)}"
+                connection.send(f"Tables are for {sizes} players\n")
+                return
+            waiting = (t for t in self.tables.values() if t.size == size and not t.game)
+            table = next(waiting, None)
+            if table is None:
+                table = Table(next(self._table_numbers), size)
+                self.tables[table.number] = table
+            self.join_table(connection, table)
+        elif command == "join" and argument.isdigit():
+            table = self.tables.get(int(argument))
+            if table is None or table.game is not None:
+                connection.send(f"No table {argument} waits for players\n")
+                return
+            self.join_table(connection, table)
+        elif command == "tables":
+            lines = [t.describe() for t in self.tables.values() if not t.game]
+            connection.send("\n".join(lines or ["No tables wait for players"]))
+            connection.send("\n")
+        elif command == "leave":
+            self.leave_table(connection)
+            connection.send(LOBBY_HELP)
+        else:
+            connection.send(LOBBY_HELP)
+
+    def join_table(self, connection: Connection, table: Table) -> None:
+        self.leave_table(connection)
+        table.broadcast(f"{connection.name} joined\n")
+        table.seats.append(connection)
+        connection.table = table
+        connection.send(f"You joined {table.describe()}\n")
+        if len(table.seats) == table.size:
+            self.start_game(table)
+
+    def leave_table(self, connection: Connection) -> None:
+        table = connection.table
+        if table is None:
+            return
+        connection.table = None
+        table.seats.remove(connection)
+        if table.game is not None:
+            # a game can't go on without a player
+            table.broadcast(f"{connection.name} left, the game ended\n{LOBBY_HELP}")
+            self.close_table(table)
+        else:
+            table.broadcast(f"{connection.name} left\n")
+            if not table.seats:
+                del self.tables[table.number]
+
+    def close_table(self, table: Table) -> None:
+        for seat in table.seats:
+            seat.table = None
+        table.seats.clear()
+        self.tables.pop(table.number, None)
+
+    def start_game(self, table: Table) -> None:
+        players = [hanabi.Player(seat.name) for seat in table.seats]
+        table.game = hanabi.Game(players)
+        self.games_started += 1
+        table.broadcast(f"The game starts: {', '.join(players)}\n")
+        self.send_boards(table)
+
+    def send_boards(self, table: Table) -> None:
+        assert table.game is not None
+        active = hanabi.get_active_player_name(table.game)
+        for seat in table.seats:
+            seat.send(format_board_state(table.game, seat.name))
+            if seat.name == active:
+                seat.send(f"{TURN_PROMPT}\n")
+            else:
+                seat.send(f"waiting for {active}\n")
+
+    def play(self, table: Table, connection: Connection, action: str) -> None:
+        game = table.game
+        assert game is not None
+        player = hanabi.get_active_player_name(game)
+        if connection.name != player:
+            connection.send(f"It's {player}'s turn\n")
+            return
+        # perform_action prints its errors, the player gets the usage instead
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = hanabi.perform_action(game, player, action)
+        if not ok:
+            connection.send(USAGE)
+            return
+
+        line = "-" * len(game.last_action_description)
+        table.broadcast(f"\n{line}\n{game.last_action_description}\n{line}\n")
+        state = hanabi.check_state(game)
+        if state is hanabi.GameState.RUNNING:
+            self.send_boards(table)
+            return
+        for seat in table.seats:
+            seat.send(format_board_state(game))
+        result = "won" if state is hanabi.GameState.MAX_SCORE else "lost"
+        table.broadcast(f"*** You {result}! ***\nscore: {hanabi.get_score(game)}\n")
+        table.broadcast(LOBBY_HELP)
+        self.games_finished += 1
+        self.close_table(table)
+
+
+async def start_server(
+    host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> tuple[TcpServer, asyncio.Server]:
+    tcp_server = TcpServer()
+    server = await asyncio.start_server(tcp_server.handle_connection, host, port)
+    return tcp_server, server
+
+
+async def run(host: str, port: int) -> None:
+    _tcp_server, server = await start_server(host, port)
+    for socket in server.sockets:
+        print(f"    Listening on {socket.getsockname()}")
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run(args.host, args.port))
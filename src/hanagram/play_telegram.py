@@ -1,28 +1,87 @@
 import enum
+import functools
+import io
 import itertools
+import json
 import os
 import time
 import typing
+import urllib.parse
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
 
-import dotenv
 import telepot  # type: ignore[import-untyped]
-from telepot.loop import MessageLoop  # type: ignore[import-untyped]
+from telepot.loop import GetUpdatesLoop  # type: ignore[import-untyped]
 from telepot.namedtuple import (  # type: ignore[import-untyped]
     InlineKeyboardButton,
     InlineKeyboardMarkup,
 )
 
-from . import draw, hanabi
-
-dotenv.load_dotenv()
+from . import ai, draw, estimate, hanabi, hints, snapshot
+from .dispatch import ChatDispatcher
+from .outbox import GLOBAL_BURST, GLOBAL_RATE, Bot, Message, Outbox
+from .registry import MAX_RESIDENT_BYTES, GameRegistry
+from .sharding import ShardRouter, UpdateQueue
+from .store import GameStore
+from .tracing import MetricsServer, tracer
+from .webhook import WebhookServer
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    username: str
+    api_key: str
+    # set a webhook url to receive updates over https, instead of polling for them
+    webhook_url: str | None
+    webhook_secret: str | None
+    webhook_port: int
+    # use another Bot API server, like a local fake_telegram for load tests
+    api_url: str | None
+    # set a path to an sqlite database to keep games across restarts
+    db_path: str | None
+    # idle games are evicted from memory when their snapshots exceed this size
+    max_games_mb: int
+    # collect latency histograms of updates, "log" to also print a json line per
+    # update
+    tracing: str
+    # serve the histograms for prometheus on this port, at /metrics
+    metrics_port: int
+    # handle chats in this many worker processes
+    workers: int
+
+    @property
+    def start_link(self) -> str:
+        return f"https://t.me/{self.username}"
+
+
+@functools.cache
+def config() -> Config:
+    # read when first needed, so importing this module has no side effects
+    import dotenv
+
+    dotenv.load_dotenv()
+    return Config(
+        username=os.environ["TELEGRAM_USERNAME"],
+        api_key=os.environ["TELEGRAM_API_KEY"],
+        webhook_url=os.environ.get("TELEGRAM_WEBHOOK_URL"),
+        webhook_secret=os.environ.get("TELEGRAM_WEBHOOK_SECRET"),
+        webhook_port=int(os.environ.get("PORT", "8080")),
+        api_url=os.environ.get("TELEGRAM_API_URL"),
+        db_path=os.environ.get("HANAGRAM_DB"),
+        max_games_mb=int(os.environ.get("HANAGRAM_MAX_GAMES_MB", "64")),
+        tracing=os.environ.get("HANAGRAM_TRACING", ""),
+        metrics_port=int(os.environ.get("HANAGRAM_METRICS_PORT", "0")),
+        workers=int(os.environ.get("HANAGRAM_WORKERS", "1")),
+    )
 
-USERNAME = os.environ["TELEGRAM_USERNAME"]
-TELEGRAM_API_KEY = os.environ["TELEGRAM_API_KEY"]
-START_LINK = f"https://t.me/{USERNAME}"
 
 MIN_PLAYERS = 2
 MAX_PLAYERS = max(hanabi.HAND_SIZE)
 DEFAULT_N_PLAYERS_IN_TEST = 4
+ESTIMATE_BUDGET = 0.2  # seconds
+# how long a handler waits for a keyboard message, to edit it in the next updates
+KEYBOARD_TIMEOUT = 5.0  # seconds
 BOT_COMMAND_DESCRIPTIONS = {
     "start": "show help",
     "link_for_newbies": "send instructions to enable bot for new players",
@@ -31,6 +90,12 @@ BOT_COMMAND_DESCRIPTIONS = {
     "end_game": "end this group game",
     "test": "start a playtest",
     "refresh": "resend current player the menu",
+    "edit_boards": "toggle editing the last board instead of sending a new one",
+    "views_on_demand": "toggle sending the board only to the current player",
+    "spectate": "toggle watching the whole board of this group game",
+    "add_bot": "add a computer player to this group game",
+    "suggest_hints": "toggle showing the best hint in the menu",
+    "estimate": "toggle estimating the final score after each turn",
 }
 
 BACKGROUND_COLORS_RGB = itertools.cycle(
@@ -48,11 +113,12 @@ class UserId(int):
     pass
 
 
-class ChatId(int):
-    pass
+# the user of players that the computer plays
+BOT_USER_ID = UserId(0)
 
 
-Message = typing.NewType("Message", dict[str, typing.Any])  # type: ignore[explicit-any]
+class ChatId(int):
+    pass
 
 
 class KeyboardType(enum.Enum):
@@ -69,20 +135,182 @@ class ChatGame:
         self.admin = admin
         self.player_to_user: dict[hanabi.Player, UserId] = {}
         self.user_to_message: dict[UserId, Message | None] = {}
+        self.user_to_board: dict[UserId, Message] = {}
+        self.edit_boards = False
+        # other players get a button that shows their board, instead of the board
+        self.views_on_demand = False
+        # boards rendered on demand, for the current version of the game
+        self.views: dict[hanabi.Player | None, bytes] = {}
+        self.views_version = (0, 0)
+        # chats that get the whole board each turn, like a channel
+        self.spectators: list[ChatId] = []
+        # players that the computer plays
+        self.bots: set[hanabi.Player] = set()
+        self.suggest_hints = False
+        # set when the final score is estimated after each turn
+        self.estimator: estimate.Estimator | None = None
         self.current_action = ""
         self.chat_id = chat_id
         self.background_color = (70, 70, 70)  # fallback value
         self.test_mode = test_mode
+        self.game_number = 0
+        # serialized keyboards that stay the same for the whole game
+        self.keyboards: dict[str, str] = {}
+        # the text and keyboard last shown in each user's keyboard message
+        self.user_to_keyboard: dict[UserId, tuple[str, str | None]] = {}
+        # the version of the last view sent to each user, and its request
+        self.user_to_view: dict[UserId, tuple[tuple[int, int], Future[Message]]] = {}
+
+
+def serialize_keyboard(chat_id: ChatId, rows: list[list[tuple[str, str]]]) -> str:
+    # rows of (text, data) buttons, as the json that telegram expects
+    keyboard = {
+        "inline_keyboard": [
+            [{"text": text, "callback_data": f"{data}|{chat_id}"} for text, data in row]
+            for row in rows
+        ]
+    }
+    return json.dumps(keyboard, separators=(",", ":"))
+
+
+def prepare_keyboards(chat_game: ChatGame) -> None:
+    assert chat_game.game is not None
+    chat_id = chat_game.chat_id
+    players = chat_game.game.players
+    back_row = [("Back", "back")]
+    keyboards = {}
+    for hints_left in range(hanabi.INITIAL_HINTS + 1):
+        action_row = [("Play", "play"), ("Discard", "discard")]
+        if hints_left > 0:
+            action_row.append((f"Hint ({hints_left})", "hint"))
+        keyboards[f"action {hints_left}"] = serialize_keyboard(chat_id, [action_row])
+    for player in players:
+        # players are sent by their seat, long names don't fit in the callback data
+        options_row = [(str(p), str(i)) for i, p in enumerate(players) if p != player]
+        keyboards[f"player {player}"] = serialize_keyboard(
+            chat_id, [options_row, back_row]
+        )
+    colors_row = [(str(c), str(c)) for c in hanabi.COLORS]
+    values_row = [(str(v), str(v)) for v in hanabi.VALUES]
+    keyboards["info"] = serialize_keyboard(chat_id, [colors_row, values_row, back_row])
+    keyboards["view"] = serialize_keyboard(chat_id, [[("Show board", "view")]])
+    chat_game.keyboards = keyboards
+
+
+def dump_message(message: Message | None) -> list[int]:
+    # only what's needed to edit or delete the message
+    if message is None:
+        return []
+    return [message["chat"]["id"], message["message_id"]]
+
+
+def load_message(data: list[int]) -> Message | None:
+    if not data:
+        return None
+    chat_id, message_id = data
+    return Message({"chat": {"id": chat_id}, "message_id": message_id})
+
+
+def dump_chat_game(chat_game: ChatGame) -> bytes:
+    data = {
+        "chat_id": chat_game.chat_id,
+        "admin": chat_game.admin,
+        "test_mode": chat_game.test_mode,
+        "players": list(chat_game.player_to_user.items()),
+        "messages": [
+            [user_id, *dump_message(message)]
+            for user_id, message in chat_game.user_to_message.items()
+        ],
+        "boards": [
+            [user_id, *dump_message(message)]
+            for user_id, message in chat_game.user_to_board.items()
+        ],
+        "edit_boards": chat_game.edit_boards,
+        "views_on_demand": chat_game.views_on_demand,
+        "spectators": chat_game.spectators,
+        "bots": sorted(chat_game.bots),
+        "suggest_hints": chat_game.suggest_hints,
+        "estimate": chat_game.estimator is not None,
+        "current_action": chat_game.current_action,
+        "background_color": chat_game.background_color,
+        "game_number": chat_game.game_number,
+        "game": chat_game.game and snapshot.dump_game(chat_game.game),
+    }
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def load_chat_game(data: bytes) -> ChatGame:
+    loaded = json.loads(data)
+    chat_game = ChatGame(
+        ChatId(loaded["chat_id"]), UserId(loaded["admin"]), loaded["test_mode"]
+    )
+    chat_game.player_to_user = {
+        hanabi.Player(name): UserId(user_id) for name, user_id in loaded["players"]
+    }
+    chat_game.user_to_message = {
+        UserId(user_id): load_message(message)
+        for user_id, *message in loaded["messages"]
+    }
+    for user_id, *message in loaded["boards"]:
+        if board := load_message(message):
+            chat_game.user_to_board[UserId(user_id)] = board
+    chat_game.edit_boards = loaded["edit_boards"]
+    chat_game.views_on_demand = loaded.get("views_on_demand", False)
+    chat_game.spectators = [ChatId(s) for s in loaded.get("spectators", [])]
+    chat_game.bots = {hanabi.Player(name) for name in loaded.get("bots", [])}
+    chat_game.suggest_hints = loaded.get("suggest_hints", False)
+    if loaded.get("estimate", False):
+        chat_game.estimator = create_estimator()
+    chat_game.current_action = loaded["current_action"]
+    chat_game.background_color = tuple(loaded["background_color"])
+    chat_game.game_number = loaded["game_number"]
+    if loaded["game"] is not None:
+        chat_game.game = snapshot.load_game(loaded["game"])
+    return chat_game
+
+
+# estimator work for a chat
+EstimatorJob = tuple[ChatId, Callable[[], None]]
 
 
 class BotServer:
-    def __init__(self, token: str):
-        self.bot = telepot.Bot(token)
+    def __init__(
+        self,
+        token: str,
+        store: GameStore | None = None,
+        max_games_bytes: int = MAX_RESIDENT_BYTES,
+        shards: int = 1,
+    ):
+        self.bot = Bot(token)
+        # the global limit is for the whole bot, each shard worker gets its share
+        self.outbox = Outbox(
+            self.bot,
+            global_rate=GLOBAL_RATE / shards,
+            global_burst=max(1, GLOBAL_BURST // shards),
+        )
         self.token = token
-        self.games: dict[ChatId, ChatGame] = {}
+        self.store = store
+        self.games: GameRegistry[ChatGame] = GameRegistry(
+            store, dump_chat_game, load_chat_game, max_bytes=max_games_bytes
+        )
+        self.games.start_evicting()
+        # started when a chat first asks for estimates
+        self.rollout_pool: ProcessPoolExecutor | None = None
+        self.estimates: ChatDispatcher[EstimatorJob] = ChatDispatcher(
+            lambda job: job[1](), key=lambda job: job[0]
+        )
+
 
+def create_estimator() -> estimate.Estimator:
+    # rollouts run in a pool of processes, shared by all the chats
+    workers = os.cpu_count() or 1
+    if workers > 1 and server.rollout_pool is None:
+        server.rollout_pool = estimate.create_pool(workers)
+    return estimate.Estimator(server.rollout_pool, workers)
 
-server = BotServer("DEADBEEF")
+
+# set when the bot starts
+server: BotServer
 
 
 def add_player(
@@ -91,237 +319,500 @@ def add_player(
     user_id: UserId,
     name: hanabi.Player,
     allow_repeated_players: bool = False,
-) -> None:
+) -> hanabi.Player | None:
     if chat_id not in server.games:
-        server.bot.sendMessage(chat_id, "No game created for this chat")
-        return
+        server.outbox.send_message(chat_id, "No game created for this chat")
+        return None
 
     player_to_user = server.games[chat_id].player_to_user
     user_to_message = server.games[chat_id].user_to_message
     if not allow_repeated_players and user_id in player_to_user.values():
-        server.bot.sendMessage(chat_id, "You already joined the game")
-        return
+        server.outbox.send_message(chat_id, "You already joined the game")
+        return None
 
     if len(player_to_user) >= MAX_PLAYERS:
-        server.bot.sendMessage(
+        server.outbox.send_message(
             chat_id, f"There are already {MAX_PLAYERS} players in the game."
         )
-        return
+        return None
 
     if name in player_to_user:
         name = hanabi.Player(f"{name}_{len(player_to_user)}")
 
-    server.bot.sendMessage(chat_id, f"{name} joined")
+    server.outbox.send_message(chat_id, f"{name} joined")
     player_to_user[name] = user_id
     user_to_message[user_id] = None
+    # players can't see their own cards
+    if ChatId(user_id) in server.games[chat_id].spectators:
+        server.games[chat_id].spectators.remove(ChatId(user_id))
+    return name
+
+
+def add_bot(server: BotServer, chat_id: ChatId, user_id: UserId) -> None:
+    if chat_id not in server.games:
+        server.outbox.send_message(chat_id, "No game created for this chat")
+        return
+    chat_game = server.games[chat_id]
+    if user_id != chat_game.admin:
+        server.outbox.send_message(chat_id, "Only the admin can add a bot")
+        return
+    if chat_game.game:
+        server.outbox.send_message(chat_id, "Game in progress")
+        return
+    name = add_player(
+        server, chat_id, BOT_USER_ID, hanabi.Player("Bot"), allow_repeated_players=True
+    )
+    if name is not None:
+        chat_game.bots.add(name)
+
+
+def toggle_spectator(
+    server: BotServer, chat_id: ChatId, user_id: UserId, name: str, text: str
+) -> None:
+    if chat_id not in server.games:
+        server.outbox.send_message(chat_id, "No game created for this chat")
+        return
+    chat_game = server.games[chat_id]
+    _, _, arg = text.partition(" ")
+    spectator = ChatId(user_id)
+    if arg:
+        # another chat, like a channel that the bot can post to
+        if user_id != chat_game.admin:
+            server.outbox.send_message(chat_id, "Only the admin can add a chat")
+            return
+        if not arg.lstrip("-").isdigit():
+            server.outbox.send_message(chat_id, "Usage: /spectate [chat id]")
+            return
+        spectator = ChatId(int(arg))
+        name = arg
+    if UserId(spectator) in chat_game.player_to_user.values():
+        server.outbox.send_message(chat_id, "Players can't watch the whole board")
+    elif spectator in chat_game.spectators:
+        chat_game.spectators.remove(spectator)
+        server.outbox.send_message(chat_id, f"{name} stopped watching")
+    else:
+        chat_game.spectators.append(spectator)
+        server.outbox.send_message(chat_id, f"{name} is watching")
 
 
 def send_game_views(
-    bot: telepot.Bot, chat_game: ChatGame, keyboard: bool = False
+    outbox: Outbox, chat_game: ChatGame, keyboard: bool = False
 ) -> None:
+    assert chat_game.game is not None
     if chat_game.test_mode:
         # send only once
-        send_game_view(None, chat_game.admin, bot, chat_game)
+        send_game_view(None, chat_game.admin, outbox, chat_game)
     else:
+        # the view buttons don't work after the game ends, send the last board
+        on_demand = chat_game.views_on_demand and (
+            hanabi.check_state(chat_game.game) is hanabi.GameState.RUNNING
+        )
         # first player
-        assert chat_game.game is not None
         next_player = hanabi.get_active_player_name(chat_game.game)
         next_user_id = chat_game.player_to_user[next_player]
-        send_game_view(next_player, next_user_id, bot, chat_game)
+        if next_player not in chat_game.bots:
+            send_game_view(next_player, next_user_id, outbox, chat_game)
         # other players
         for name, user_id in chat_game.player_to_user.items():
-            if name != next_player:
-                send_game_view(name, user_id, bot, chat_game)
+            if name == next_player or name in chat_game.bots:
+                continue
+            if on_demand:
+                send_view_button(user_id, outbox, chat_game)
+            else:
+                send_game_view(name, user_id, outbox, chat_game)
+    send_spectator_views(outbox, chat_game)
     # now send keyboard
     if keyboard:
         chat_game.current_action = ""
-        send_keyboard(bot, chat_game.chat_id, KeyboardType.ACTION)
+        if hanabi.get_active_player_name(chat_game.game) not in chat_game.bots:
+            send_keyboard(outbox, chat_game.chat_id, KeyboardType.ACTION)
+
+
+def play_bot_turn(outbox: Outbox, chat_game: ChatGame) -> None:
+    assert chat_game.game is not None
+    player = hanabi.get_active_player_name(chat_game.game)
+    with tracer.span("game"):
+        action = ai.choose_action(chat_game.game, player)
+        hanabi.perform_action(chat_game.game, player, action)
+    log_action(chat_game, player, action)
 
 
 def send_game_view(
     name: hanabi.Player | None,
     user_id: UserId,
-    bot: telepot.Bot,
+    outbox: Outbox,
     chat_game: ChatGame,
 ) -> None:
     assert chat_game.game is not None
-    image = draw.draw_board_state(
-        chat_game.game, player_viewing=name, background=chat_game.background_color
+    version = (chat_game.game_number, chat_game.game.turn)
+    if (last := chat_game.user_to_view.get(user_id)) is not None:
+        last_version, last_sent = last
+        if last_version == version and not last_sent.done():
+            # the same board is still on its way
+            return
+    photo = render_view(name, chat_game)
+    # a newer board replaces an older one that was not sent yet
+    supersedes = ("view", chat_game.chat_id)
+    if not chat_game.edit_boards:
+        sent = outbox.send_photo(user_id, photo, supersedes=supersedes)
+        chat_game.user_to_view[user_id] = (version, sent)
+        return
+
+    # the game stays resident until the board is remembered, so the change isn't
+    # made to a game that was evicted meanwhile
+    chat_id = chat_game.chat_id
+
+    def remember_board(sent: Future[Message]) -> None:
+        try:
+            if sent.exception() is None and "message_id" in sent.result():
+                chat_game.user_to_board[user_id] = sent.result()
+                # the update that sent the board may be done, and its game saved
+                server.games.changed(chat_id)
+        finally:
+            server.games.unpin(chat_id)
+
+    def send_if_not_edited(edited: Future[Message]) -> None:
+        if edited.exception() is None:
+            remember_board(edited)
+            return
+        try:
+            if (last := chat_game.user_to_view.get(user_id)) and last[0] > version:
+                # a newer board is already on its way
+                return
+            # the board can't be edited (maybe it was deleted), send a new one.
+            # newer boards may be queued by now, so it supersedes nothing
+            sent = outbox.send_photo(user_id, photo)
+            server.games.pin(chat_id)
+            sent.add_done_callback(remember_board)
+            chat_game.user_to_view[user_id] = (version, sent)
+        finally:
+            server.games.unpin(chat_id)
+
+    server.games.pin(chat_id)
+    if board := chat_game.user_to_board.get(user_id):
+        sent = outbox.edit_message_media(
+            telepot.message_identifier(board), photo, supersedes=supersedes
+        )
+        sent.add_done_callback(send_if_not_edited)
+    else:
+        sent = outbox.send_photo(user_id, photo, supersedes=supersedes)
+        sent.add_done_callback(remember_board)
+    chat_game.user_to_view[user_id] = (version, sent)
+
+
+def action_keyboard(chat_game: ChatGame, suggested: hints.HintSuggestion) -> str:
+    assert chat_game.game is not None
+    hints_left = chat_game.game.hints
+    action_row = [("Play", "play"), ("Discard", "discard")]
+    action_row.append((f"Hint ({hints_left})", "hint"))
+    seat = chat_game.game.players.index(suggested.player)
+    suggestion_row = [
+        (f"💡 {suggested.player}: {suggested.hint}", f"hint {seat} {suggested.hint}")
+    ]
+    return serialize_keyboard(chat_game.chat_id, [action_row, suggestion_row])
+
+
+def send_spectator_views(outbox: Outbox, chat_game: ChatGame) -> None:
+    spectators = list(chat_game.spectators)
+    if not spectators:
+        return
+    photo = render_view(None, chat_game)
+    supersedes = ("view", chat_game.chat_id)
+    first = outbox.send_photo(spectators[0], photo, supersedes=supersedes)
+
+    def fan_out(sent: Future[Message]) -> None:
+        if sent.exception() is None and not sent.result():
+            # a newer board replaced this one
+            return
+        # the outbox sends the uploaded board again by its file_id
+        for spectator in spectators[1:]:
+            outbox.send_photo(
+                spectator, io.BytesIO(photo.getvalue()), supersedes=supersedes
+            )
+
+    first.add_done_callback(fan_out)
+
+
+def send_view_button(user_id: UserId, outbox: Outbox, chat_game: ChatGame) -> None:
+    assert chat_game.game is not None
+    if not chat_game.keyboards:
+        prepare_keyboards(chat_game)
+    game = chat_game.game
+    outbox.send_message(
+        user_id,
+        f"Turn {game.turn}: {game.last_action_description}",
+        reply_markup=chat_game.keyboards["view"],
+        supersedes=("view button", chat_game.chat_id),
     )
-    try:
-        bot.sendPhoto(user_id, draw.image_to_bytes(image))
-    except Exception as ex:
-        print(ex)
+
+
+def render_view(name: hanabi.Player | None, chat_game: ChatGame) -> io.BytesIO:
+    assert chat_game.game is not None
+    version = (chat_game.game_number, chat_game.game.turn)
+    if chat_game.views_version != version:
+        chat_game.views.clear()
+        chat_game.views_version = version
+    if name in chat_game.views:
+        return io.BytesIO(chat_game.views[name])
+    with tracer.span("render"):
+        image = draw.draw_board_state(
+            chat_game.game, player_viewing=name, background=chat_game.background_color
+        )
+    with tracer.span("encode"):
+        photo = draw.image_to_bytes(image)
+    if chat_game.views_on_demand or name is None:
+        # players may ask for their board more than once in a turn, and the
+        # whole board is sent to the spectators and at the end of the game
+        chat_game.views[name] = photo.getvalue()
+    return photo
 
 
 def start_game(server: BotServer, chat_id: ChatId, user_id: UserId) -> None:
     if chat_id not in server.games:
-        server.bot.sendMessage(chat_id, "No game created for this chat")
+        server.outbox.send_message(chat_id, "No game created for this chat")
         return
 
     if user_id != server.games[chat_id].admin:
-        server.bot.sendMessage(chat_id, "You cannot start this game")
+        server.outbox.send_message(chat_id, "You cannot start this game")
         return
 
     player_to_user = server.games[chat_id].player_to_user
     if len(server.games[chat_id].player_to_user) < MIN_PLAYERS:
-        server.bot.sendMessage(chat_id, "Too few players")
+        server.outbox.send_message(chat_id, "Too few players")
+        return
+    if set(player_to_user) <= server.games[chat_id].bots:
+        server.outbox.send_message(chat_id, "At least one player must be human")
         return
 
     players = list(player_to_user)
-    server.bot.sendMessage(chat_id, f"Starting game with players {players}")
-    server.bot.sendMessage(chat_id, "FYI: newest card → oldest card")
+    server.outbox.send_message(chat_id, f"Starting game with players {players}")
+    server.outbox.send_message(chat_id, "FYI: newest card → oldest card")
     chat_game = server.games[chat_id]
     chat_game.background_color = next(BACKGROUND_COLORS_RGB)
-    chat_game.game = hanabi.Game(players)
-    server.bot.sendMessage(
-        chat_id, f"Go to [private chat]({START_LINK}) to play", parse_mode="Markdown"
+    with tracer.span("game"):
+        chat_game.game = hanabi.Game(players)
+    prepare_keyboards(chat_game)
+    chat_game.game_number += 1
+    chat_game.user_to_board.clear()
+    chat_game.user_to_keyboard.clear()
+    if server.store is not None:
+        server.store.log_deal(
+            chat_id, chat_game.game_number, snapshot.game_to_bytes(chat_game.game)
+        )
+    server.outbox.send_message(
+        chat_id,
+        f"Go to [private chat]({config().start_link}) to play",
+        parse_mode="Markdown",
     )
 
     # send a view to all the players
-    send_game_views(server.bot, chat_game, keyboard=True)
+    send_game_views(server.outbox, chat_game, keyboard=True)
+    if hanabi.get_active_player_name(chat_game.game) in chat_game.bots:
+        play_bot_turn(server.outbox, chat_game)
+        complete_processed_action(server.outbox, chat_id)
 
 
 def edit_message(
     chat_game: ChatGame,
-    bot: telepot.Bot,
+    outbox: Outbox,
     user_id: UserId,
     message: str,
-    keyboard: InlineKeyboardMarkup | None = None,
+    keyboard: str | None = None,
 ) -> None:
-    if msg := chat_game.user_to_message[user_id]:
-        edited = telepot.message_identifier(msg)
-        bot.editMessageText(edited, message, reply_markup=keyboard)
+    msg = chat_game.user_to_message[user_id]
+    if not msg:
+        return
+    if chat_game.user_to_keyboard.get(user_id) == (message, keyboard):
+        # telegram would answer that the message is not modified
+        return
+    chat_game.user_to_keyboard[user_id] = (message, keyboard)
+    outbox.edit_message_text(
+        telepot.message_identifier(msg), message, reply_markup=keyboard
+    )
 
 
-def delete_message(chat_game: ChatGame, bot: telepot.Bot, user_id: UserId) -> None:
+def delete_message(chat_game: ChatGame, outbox: Outbox, user_id: UserId) -> None:
     edited = telepot.message_identifier(chat_game.user_to_message[user_id])
-    bot.deleteMessage(edited)
+    outbox.delete_message(edited)
 
 
-def send_keyboard(
-    bot: telepot.Bot, chat_id: ChatId, keyboard_type: KeyboardType
+def remember_message(
+    chat_game: ChatGame, user_id: UserId, sent: Future[Message]
 ) -> None:
+    try:
+        if sent.exception() is None and chat_game.user_to_message.get(user_id) is None:
+            chat_game.user_to_message[user_id] = sent.result()
+            server.games.changed(chat_game.chat_id)
+    finally:
+        server.games.unpin(chat_game.chat_id)
+
+
+def send_keyboard(outbox: Outbox, chat_id: ChatId, keyboard_type: KeyboardType) -> None:
     chat_game = server.games[chat_id]
     assert chat_game.game is not None
     player = hanabi.get_active_player_name(chat_game.game)
     user_id = chat_game.player_to_user[player]
+    if not chat_game.keyboards:
+        # a game that was loaded from the store
+        prepare_keyboards(chat_game)
     if keyboard_type is KeyboardType.ACTION:
-        action_row = [
-            InlineKeyboardButton(text="Play", callback_data=f"play|{chat_id}"),
-            InlineKeyboardButton(text="Discard", callback_data=f"discard|{chat_id}"),
-        ]
-        if chat_game.game.hints > 0:
-            action_row.append(
-                InlineKeyboardButton(
-                    text=f"Hint ({chat_game.game.hints})",
-                    callback_data=f"hint|{chat_id}",
-                )
-            )
-
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[action_row])
+        keyboard = chat_game.keyboards[f"action {chat_game.game.hints}"]
+        if chat_game.suggest_hints and (
+            suggested := hints.suggest_hints(chat_game.game, player)
+        ):
+            keyboard = action_keyboard(chat_game, suggested[0])
         if chat_game.user_to_message[user_id] is not None:
             edit_message(
-                chat_game, bot, user_id, f"{player}, choose an action", keyboard
+                chat_game, outbox, user_id, f"{player}, choose an action", keyboard
             )
         else:
-            chat_game.user_to_message[user_id] = bot.sendMessage(
-                user_id, f"{player}, it's your turn", reply_markup=keyboard
-            )
+            text = f"{player}, it's your turn"
+            sent = outbox.send_message(user_id, text, reply_markup=keyboard)
+            chat_game.user_to_keyboard[user_id] = (text, keyboard)
+            try:
+                chat_game.user_to_message[user_id] = sent.result(KEYBOARD_TIMEOUT)
+            except TimeoutError:
+                # the outbox waits out a rate limit, remember the message when sent
+                server.games.pin(chat_id)
+                sent.add_done_callback(
+                    functools.partial(remember_message, chat_game, user_id)
+                )
 
     elif keyboard_type in [KeyboardType.PLAY, KeyboardType.DISCARD]:
-        game = chat_game.game
-        active_player = game.players[game.active_player]
-        player_hand = chat_game.game.hands[active_player]
+        player_hand = chat_game.game.hands[player]
         options_row = [
-            InlineKeyboardButton(
-                text=card.known_name(), callback_data=f"{i + 1}|{chat_id}"
-            )
-            for i, card in enumerate(player_hand)
+            (card.known_name(), str(i + 1)) for i, card in enumerate(player_hand)
         ]
-
-        back_row = [InlineKeyboardButton(text="Back", callback_data=f"back|{chat_id}")]
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[options_row, back_row])
+        keyboard = serialize_keyboard(chat_id, [options_row, [("Back", "back")]])
         edit_message(
-            chat_game, bot, user_id, f"Choose card to {keyboard_type.value}", keyboard
+            chat_game,
+            outbox,
+            user_id,
+            f"Choose card to {keyboard_type.value}",
+            keyboard,
         )
 
     elif keyboard_type == KeyboardType.PLAYER:
-        players = chat_game.game.players
-        options_row = [
-            InlineKeyboardButton(text=p, callback_data=f"{p}|{chat_id}")
-            for p in players
-            if p != player
-        ]
-        back_row = [InlineKeyboardButton(text="Back", callback_data=f"back|{chat_id}")]
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[options_row, back_row])
         edit_message(
-            chat_game, bot, user_id, "Choose a player to hint", keyboard=keyboard
+            chat_game,
+            outbox,
+            user_id,
+            "Choose a player to hint",
+            keyboard=chat_game.keyboards[f"player {player}"],
         )
 
     elif keyboard_type == KeyboardType.INFO:
         _action, hinted_player = chat_game.current_action.split(" ")
-        colors_row = [
-            InlineKeyboardButton(text=str(c), callback_data=f"{c}|{chat_id}")
-            for c in hanabi.COLORS
-        ]
-        values_row = [
-            InlineKeyboardButton(text=str(v), callback_data=f"{v}|{chat_id}")
-            for v in hanabi.VALUES
-        ]
-        back_row = [InlineKeyboardButton(text="Back", callback_data=f"back|{chat_id}")]
-        keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[colors_row, values_row, back_row]
-        )
         edit_message(
             chat_game,
-            bot,
+            outbox,
             user_id,
             f"Choose information to hint to {hinted_player}",
-            keyboard=keyboard,
+            keyboard=chat_game.keyboards["info"],
         )
 
 
 def restart_turn(chat_id: ChatId) -> None:
     chat_game = server.games[chat_id]
     chat_game.current_action = ""
-    send_keyboard(server.bot, chat_id, KeyboardType.ACTION)
+    send_keyboard(server.outbox, chat_id, KeyboardType.ACTION)
+
+
+def run_estimator(chat_game: ChatGame, work: Callable[[], None]) -> None:
+    # an estimate takes its whole time budget, so it runs after the update is
+    # handled. the estimator work of a chat runs in the order it was asked for
+    trace = tracer.current()
+    if trace is not None:
+        tracer.hold(trace)
+
+    def job() -> None:
+        try:
+            with tracer.span("estimate", trace):
+                work()
+        finally:
+            if trace is not None:
+                tracer.release(trace)
+
+    server.estimates.submit((chat_game.chat_id, job))
 
 
-def handle_game_ending(bot: telepot.Bot, chat_game: ChatGame) -> None:
+def send_estimate(
+    outbox: Outbox, chat_game: ChatGame, estimator: estimate.Estimator
+) -> None:
     assert chat_game.game is not None
-    send_game_views(bot, chat_game)
+    # the next updates change the game while it is estimated
+    game = hanabi.clone_game(chat_game.game)
+
+    def estimate_and_send() -> None:
+        result = estimator.estimate(game, ESTIMATE_BUDGET)
+        outbox.send_message(
+            chat_game.chat_id,
+            f"Estimated final score: {result.low:.0f}-{result.high:.0f}"
+            f" (mean {result.mean:.1f})",
+            supersedes=("estimate", chat_game.chat_id),
+        )
+
+    run_estimator(chat_game, estimate_and_send)
+
+
+def handle_game_ending(outbox: Outbox, chat_game: ChatGame) -> None:
+    assert chat_game.game is not None
+    send_game_views(outbox, chat_game)
     chat_id = chat_game.chat_id
     game = chat_game.game
-    image = draw.draw_board_state(
-        chat_game.game, player_viewing=None, background=chat_game.background_color
-    )
-    try:
-        bot.sendPhoto(chat_id, draw.image_to_bytes(image))
-    except Exception as ex:
-        print(ex)
+    outbox.send_photo(chat_id, render_view(None, chat_game))
 
     score = hanabi.get_score(game)
-    for user_id in set(chat_game.player_to_user.values()).union([UserId(chat_id)]):
-        bot.sendMessage(user_id, f"The game ended with score {score}")
-    bot.sendMessage(chat_id, f"Type /deal_cards@{USERNAME} to play again")
+    users = set(chat_game.player_to_user.values()) - {BOT_USER_ID}
+    for user_id in users.union([UserId(chat_id)]):
+        outbox.send_message(user_id, f"The game ended with score {score}")
+    if (estimator := chat_game.estimator) is not None:
+        ended = hanabi.clone_game(game)
+
+        def send_losses() -> None:
+            # the last estimate is the final score
+            estimator.estimate(ended)
+            if losses := estimator.biggest_losses():
+                lines = [f"-{drop:.1f} after: {action}" for drop, action in losses]
+                outbox.send_message(
+                    chat_id, "Where points were lost:\n" + "\n".join(lines)
+                )
+            estimator.history.clear()
+
+        run_estimator(chat_game, send_losses)
+    outbox.send_message(chat_id, f"Type /deal_cards@{config().username} to play again")
     chat_game.game = None
 
 
-def complete_processed_action(bot: telepot.Bot, chat_id: ChatId) -> None:
+def complete_processed_action(outbox: Outbox, chat_id: ChatId) -> None:
     # check game ending
     chat_game = server.games[chat_id]
-    assert chat_game.game is not None
-    if hanabi.check_state(chat_game.game) is not hanabi.GameState.RUNNING:
-        handle_game_ending(bot, chat_game)
-        return
+    game = chat_game.game
+    assert game is not None
+    # the bots play their turns here, one after the other, until a human plays
+    while True:
+        if hanabi.check_state(game) is not hanabi.GameState.RUNNING:
+            handle_game_ending(outbox, chat_game)
+            return
+
+        if chat_game.estimator is not None:
+            send_estimate(outbox, chat_game, chat_game.estimator)
+        send_game_views(outbox, chat_game, keyboard=True)
+        if hanabi.get_active_player_name(game) not in chat_game.bots:
+            return
+        play_bot_turn(outbox, chat_game)
 
-    send_game_views(bot, chat_game, keyboard=True)
+
+def seat_player(game: hanabi.Game, seat: str) -> hanabi.Player | None:
+    if not seat.isdigit() or int(seat) >= len(game.players):
+        return None
+    return game.players[int(seat)]
 
 
 def handle_keyboard_response(msg: Message) -> bool | None:
     try:
-        _query_id, _from_id, data = telepot.glance(msg, flavor="callback_query")
+        with tracer.span("parse"):
+            _query_id, _from_id, data = telepot.glance(msg, flavor="callback_query")
     except Exception:
         print("[ERROR]", msg)
         return None
@@ -344,6 +835,13 @@ def handle_keyboard_response(msg: Message) -> bool | None:
     if not game:
         return None
 
+    if data == "view":
+        names = [n for n, u in chat_game.player_to_user.items() if u == user_id]
+        if names:
+            name = None if chat_game.test_mode else names[0]
+            send_game_view(name, user_id, server.outbox, chat_game)
+        return None
+
     active_player = hanabi.get_active_player_name(game)
     active_user_id = chat_game.player_to_user[active_player]
     if user_id != active_user_id:
@@ -359,16 +857,23 @@ def handle_keyboard_response(msg: Message) -> bool | None:
         if chat_game.current_action != "":
             return False
         chat_game.current_action = "discard"
-        send_keyboard(server.bot, chat_id, KeyboardType.DISCARD)
+        send_keyboard(server.outbox, chat_id, KeyboardType.DISCARD)
         return True
 
     if data == "play":
         if chat_game.current_action != "":
             return False
         chat_game.current_action = "play"
-        send_keyboard(server.bot, chat_id, KeyboardType.PLAY)
+        send_keyboard(server.outbox, chat_id, KeyboardType.PLAY)
         return True
 
+    if data.startswith("hint ") and chat_game.current_action == "":
+        # the suggested hint, continue as if the player chose it
+        seat, _, data = data.removeprefix("hint ").partition(" ")
+        if (hinted := seat_player(game, seat)) is None:
+            return False
+        chat_game.current_action = f"hint {hinted}"
+
     if data == "hint":
         if chat_game.current_action != "":
             return False
@@ -376,9 +881,9 @@ def handle_keyboard_response(msg: Message) -> bool | None:
         if len(chat_game.player_to_user) == 2:
             i = 1 - game.active_player
             chat_game.current_action += " " + game.players[i]
-            send_keyboard(server.bot, chat_id, KeyboardType.INFO)
+            send_keyboard(server.outbox, chat_id, KeyboardType.INFO)
         else:
-            send_keyboard(server.bot, chat_id, KeyboardType.PLAYER)
+            send_keyboard(server.outbox, chat_id, KeyboardType.PLAYER)
         return True
 
     if chat_game.current_action in [
@@ -386,29 +891,56 @@ def handle_keyboard_response(msg: Message) -> bool | None:
         "play",
     ] or chat_game.current_action.startswith("hint "):
         chat_game.current_action += " " + data
-        success = hanabi.perform_action(game, active_player, chat_game.current_action)
+        with tracer.span("game"):
+            success = hanabi.perform_action(
+                game, active_player, chat_game.current_action
+            )
 
         if success:
-            delete_message(chat_game, server.bot, user_id)
+            log_action(chat_game, active_player, chat_game.current_action)
+            delete_message(chat_game, server.outbox, user_id)
             chat_game.user_to_message[active_user_id] = None
-            complete_processed_action(server.bot, chat_id)
+            chat_game.user_to_keyboard.pop(active_user_id, None)
+            complete_processed_action(server.outbox, chat_id)
         else:
             restart_turn(chat_id)
         return None
 
     if chat_game.current_action == "hint":
-        chat_game.current_action += " " + data
-        send_keyboard(server.bot, chat_id, KeyboardType.INFO)
+        if (hinted := seat_player(game, data)) is None:
+            return False
+        chat_game.current_action += " " + hinted
+        send_keyboard(server.outbox, chat_id, KeyboardType.INFO)
         return None
 
     raise RuntimeError(f"invalid state, {chat_game.current_action=}, {data=}")
 
 
+def log_action(chat_game: ChatGame, player: hanabi.Player, action: str) -> None:
+    assert chat_game.game is not None
+    if chat_game.estimator is not None:
+        run_estimator(
+            chat_game,
+            functools.partial(
+                chat_game.estimator.observe, hanabi.clone_game(chat_game.game), action
+            ),
+        )
+    if server.store is not None:
+        server.store.log_action(
+            chat_game.chat_id,
+            chat_game.game_number,
+            chat_game.game.turn,
+            player,
+            action,
+            chat_game.game.last_action_description,
+        )
+
+
 def link_for_newbies(chat_id: ChatId) -> None:
-    server.bot.sendMessage(
+    server.outbox.send_message(
         chat_id,
         "Before you join a game for the first time, "
-        f"please open a [chat with me]({START_LINK}) "
+        f"please open a [chat with me]({config().start_link}) "
         "and press the big blue START button at the bottom.",
         parse_mode="Markdown",
         disable_web_page_preview=True,
@@ -416,7 +948,8 @@ def link_for_newbies(chat_id: ChatId) -> None:
 
 
 def handle_message(message_object: Message) -> None:
-    content_type, _chat_type, chat_id = telepot.glance(message_object)
+    with tracer.span("parse"):
+        content_type, _chat_type, chat_id = telepot.glance(message_object)
     user_id = UserId(message_object["from"]["id"])
     chat_id = ChatId(chat_id)
 
@@ -429,18 +962,18 @@ def handle_message(message_object: Message) -> None:
 
     text = message_object["text"].split("@")[0].strip()
     if text == "/start":
-        server.bot.sendMessage(chat_id, "Thanks for trying Hanagram bot.")
-        server.bot.sendMessage(
+        server.outbox.send_message(chat_id, "Thanks for trying Hanagram bot.")
+        server.outbox.send_message(
             chat_id, "Add me to a group, than type /new_game to create a game."
         )
-        server.bot.sendMessage(
+        server.outbox.send_message(
             chat_id,
             "Type /refresh in that group to resend the menu to the current player.",
         )
-        server.bot.sendMessage(
+        server.outbox.send_message(
             chat_id, "Type /test in a group or a private chat, to run a playtest."
         )
-        server.bot.sendMessage(
+        server.outbox.send_message(
             chat_id,
             "If i'm sleeping, try to go to https://hanagram.onrender.com/ . "
             "It won't show anything, but it might wake me up.",
@@ -453,23 +986,23 @@ def handle_message(message_object: Message) -> None:
 
     if text == "/new_game":
         if chat_id == ChatId(user_id):
-            server.bot.sendMessage(chat_id, "Start the game in a group chat")
+            server.outbox.send_message(chat_id, "Start the game in a group chat")
             return
         if chat_id in server.games and server.games[chat_id].game:
-            server.bot.sendMessage(
+            server.outbox.send_message(
                 chat_id, "Game in progress. Send /end_game if you want to end it"
             )
             return
         server.games[chat_id] = ChatGame(chat_id, admin=user_id)
         keyboard = [[InlineKeyboardButton(text="Join", callback_data="join")]]
         keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard)
-        server.bot.sendMessage(
+        server.outbox.send_message(
             chat_id,
             "🎴 A new game has been created.\n"
-            f"After everyone joined, type /deal_cards@{USERNAME} to start the game",
+            f"After everyone joined, type /deal_cards@{config().username} to start the game",
         )
         link_for_newbies(chat_id)
-        server.bot.sendMessage(
+        server.outbox.send_message(
             chat_id,
             "Click here ↓ to join.",
             reply_markup=keyboard,
@@ -477,15 +1010,17 @@ def handle_message(message_object: Message) -> None:
 
     if text == "/end_game":
         if chat_id not in server.games:
-            server.bot.sendMessage(chat_id, "No game to end")
+            server.outbox.send_message(chat_id, "No game to end")
         elif not server.games[chat_id].game:
-            server.bot.sendMessage(chat_id, "Ending the game which has not started yet")
+            server.outbox.send_message(
+                chat_id, "Ending the game which has not started yet"
+            )
             del server.games[chat_id]
         else:
             try:
-                server.bot.sendMessage(chat_id, "Ending the game")
+                server.outbox.send_message(chat_id, "Ending the game")
                 edit_message(
-                    server.games[chat_id], server.bot, user_id, "The game ended."
+                    server.games[chat_id], server.outbox, user_id, "The game ended."
                 )
             finally:
                 del server.games[chat_id]
@@ -494,32 +1029,208 @@ def handle_message(message_object: Message) -> None:
         start_game(server, chat_id, user_id)
 
     if text.startswith("/test"):
-        try:
-            _, n_str = text.split(" ")
-            n = int(n_str)
-        except ValueError:
-            n = DEFAULT_N_PLAYERS_IN_TEST
+        # /test [players] [bots]
+        args = [int(arg) for arg in text.split()[1:] if arg.isdigit()]
+        n = args[0] if args else DEFAULT_N_PLAYERS_IN_TEST
+        # at least one human, who gets the boards
+        n_bots = min(args[1], n - 1) if len(args) > 1 else 0
         server.games[chat_id] = ChatGame(chat_id, admin=user_id, test_mode=True)
-        server.bot.sendMessage(chat_id, "A new game has been created.")
+        server.outbox.send_message(chat_id, "A new game has been created.")
         test_players = [
             hanabi.Player(s) for s in ["Alice", "Bob", "Carol", "Dan", "Erin", "Frank"]
         ]
-        for name in test_players[:n]:
-            add_player(server, chat_id, user_id, name, allow_repeated_players=True)
+        for i, name in enumerate(test_players[:n]):
+            # the last seats are played by bots
+            bot = i >= n - n_bots
+            add_player(
+                server,
+                chat_id,
+                BOT_USER_ID if bot else user_id,
+                name,
+                allow_repeated_players=True,
+            )
+            if bot:
+                server.games[chat_id].bots.add(name)
         start_game(server, chat_id, user_id)
 
+    if text == "/add_bot":
+        add_bot(server, chat_id, user_id)
+
+    if text == "/edit_boards":
+        if chat_id not in server.games:
+            server.outbox.send_message(chat_id, "No game created for this chat")
+        else:
+            chat_game = server.games[chat_id]
+            chat_game.edit_boards = not chat_game.edit_boards
+            if chat_game.edit_boards:
+                server.outbox.send_message(chat_id, "The board will be edited in place")
+            else:
+                server.outbox.send_message(
+                    chat_id, "A new board will be sent each turn"
+                )
+
+    if text == "/views_on_demand":
+        if chat_id not in server.games:
+            server.outbox.send_message(chat_id, "No game created for this chat")
+        else:
+            chat_game = server.games[chat_id]
+            chat_game.views_on_demand = not chat_game.views_on_demand
+            if chat_game.views_on_demand:
+                server.outbox.send_message(
+                    chat_id, "Only the current player will get the board each turn"
+                )
+            else:
+                server.outbox.send_message(
+                    chat_id, "Every player will get the board each turn"
+                )
+
+    if text.startswith("/spectate"):
+        name = message_object["from"]["first_name"]
+        toggle_spectator(server, chat_id, user_id, name, text)
+
+    if text == "/suggest_hints":
+        if chat_id not in server.games:
+            server.outbox.send_message(chat_id, "No game created for this chat")
+        else:
+            chat_game = server.games[chat_id]
+            chat_game.suggest_hints = not chat_game.suggest_hints
+            if chat_game.suggest_hints:
+                server.outbox.send_message(chat_id, "The menu will suggest a hint")
+            else:
+                server.outbox.send_message(chat_id, "The menu won't suggest hints")
+
+    if text == "/estimate":
+        if chat_id not in server.games:
+            server.outbox.send_message(chat_id, "No game created for this chat")
+        else:
+            chat_game = server.games[chat_id]
+            if chat_game.estimator is None:
+                chat_game.estimator = create_estimator()
+                server.outbox.send_message(
+                    chat_id, "The final score will be estimated after each turn"
+                )
+            else:
+                chat_game.estimator = None
+                server.outbox.send_message(
+                    chat_id, "The final score won't be estimated"
+                )
+
     if text == "/refresh":
         if chat_id not in server.games:
-            server.bot.sendMessage(chat_id, "No game to refresh")
+            server.outbox.send_message(chat_id, "No game to refresh")
         elif not server.games[chat_id].game:
-            server.bot.sendMessage(chat_id, "Game has not started yet")
+            server.outbox.send_message(chat_id, "Game has not started yet")
         else:
             restart_turn(chat_id)
 
 
-def start_telegram_bot(token: str = TELEGRAM_API_KEY) -> typing.Never:
+def handle_update(update: Message) -> None:
+    chat_id = update_chat_id(update)
+    kind = next(iter(update.keys() - {"update_id"}), "")
+    with tracer.trace(kind, chat_id), server.games.hold(chat_id):
+        if "message" in update:
+            handle_message(Message(update["message"]))
+        elif "callback_query" in update:
+            handle_keyboard_response(Message(update["callback_query"]))
+
+
+def update_chat_id(update: Message) -> ChatId:
+    # the chat of the game this update belongs to
+    if "callback_query" in update:
+        query = update["callback_query"]
+        _data, _, chat_id = query.get("data", "").rpartition("|")
+        if chat_id.lstrip("-").isdigit():
+            return ChatId(chat_id)
+        return ChatId(query["message"]["chat"]["id"])
+    for key in ["message", "edited_message", "channel_post"]:
+        if key in update:
+            return ChatId(update[key]["chat"]["id"])
+    return ChatId(0)
+
+
+def set_api_url(url: str) -> None:
+    # telepot has no setting for the server url
+    def methodurl(req: tuple[str, str, object, object], **_user_kw: object) -> str:
+        token, method, _params, _files = req
+        return f"{url}/bot{token}/{method}"
+
+    telepot.api._methodurl = methodurl
+
+
+def serve_updates(updates: UpdateQueue) -> None:
+    # handle updates from a router, until it sends None
+    dispatcher = ChatDispatcher(handle_update, update_chat_id)
+    while (update := updates.get()) is not None:
+        dispatcher.submit(update)
+    dispatcher.join()
+    dispatcher.close()
+    server.estimates.join()
+    server.estimates.close()
+    server.outbox.join()
+    server.outbox.close()
+    server.games.close()
+    if server.store is not None:
+        server.store.close()
+
+
+def start_tracing(metrics_port: int) -> None:
+    tracing = config().tracing
+    tracer.configure(enabled=bool(tracing or metrics_port), log=tracing == "log")
+    tracer.gauges.update(
+        {
+            "hanagram_outbox_queue_depth": lambda: server.outbox.queue_depth,
+            "hanagram_games_resident": lambda: server.games.resident,
+            "hanagram_game_evictions": lambda: server.games.evictions,
+        }
+    )
+    if metrics_port:
+        metrics = MetricsServer(tracer, port=metrics_port)
+        metrics.start()
+        print(f"    Serving metrics on port {metrics.port}")
+
+
+def create_server(token: str | None = None, shards: int = 1) -> BotServer:
+    if api_url := config().api_url:
+        set_api_url(api_url)
+    db_path = config().db_path
+    return BotServer(
+        token or config().api_key,
+        GameStore(db_path) if db_path else None,
+        config().max_games_mb * 2**20,
+        shards,
+    )
+
+
+def run_shard_worker(shard: int, updates: UpdateQueue) -> None:
+    global server
+    server = create_server(shards=config().workers)
+    # each worker serves its own metrics, on the ports after the router's
+    metrics_port = config().metrics_port
+    start_tracing(metrics_port + 1 + shard if metrics_port else 0)
+    serve_updates(updates)
+
+
+def start_webhook(
+    webhook_url: str, secret_token: str | None, submit: Callable[[Message], None]
+) -> WebhookServer:
+    webhook = WebhookServer(
+        submit,
+        secret_token=secret_token,
+        port=config().webhook_port,
+        path=urllib.parse.urlparse(webhook_url).path or "/",
+    )
+    webhook.start()
+    # telepot's setWebhook doesn't support the secret_token parameter
+    params = {"url": webhook_url}
+    if secret_token:
+        params["secret_token"] = secret_token
+    server.bot._api_request("setWebhook", params)
+    return webhook
+
+
+def start_telegram_bot(token: str | None = None) -> typing.Never:
     global server
-    server = BotServer(token)
+    server = create_server(token)
     server.bot.setMyCommands(
         [
             {"command": command, "description": description}
@@ -528,9 +1239,26 @@ def start_telegram_bot(token: str = TELEGRAM_API_KEY) -> typing.Never:
     )
 
     print("*** Telegram bot started ***")
-    print("    Now listening...")
-    MessageLoop(
-        server.bot, {"chat": handle_message, "callback_query": handle_keyboard_response}
-    ).run_as_thread()
+    start_tracing(config().metrics_port)
+    router = None
+    workers = config().workers
+    if workers > 1:
+        if not config().db_path:
+            print("[ERROR]", "set HANAGRAM_DB, or games are lost when workers restart")
+        router = ShardRouter(run_shard_worker, update_chat_id, workers)
+        router.start()
+        submit = router.submit
+        print(f"    Routing chats to {workers} workers")
+    else:
+        submit = ChatDispatcher(handle_update, update_chat_id).submit
+    if webhook_url := config().webhook_url:
+        webhook = start_webhook(webhook_url, config().webhook_secret, submit)
+        print(f"    Now listening on port {webhook.port}...")
+    else:
+        server.bot.deleteWebhook()
+        print("    Now listening...")
+        GetUpdatesLoop(server.bot, submit).run_as_thread()
     while 1:
-        time.sleep(10)
+        time.sleep(1)
+        if router is not None:
+            router.restart_dead()
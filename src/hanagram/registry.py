@@ -0,0 +1,249 @@
+import collections
+import contextlib
+import math
+import threading
+import time
+import typing
+import zlib
+from collections.abc import Callable, Iterator
+
+from .store import GameStore
+
+T = typing.TypeVar("T")
+
+MAX_RESIDENT = 10_000
+MAX_RESIDENT_BYTES = 64 * 2**20
+IDLE_TIMEOUT = 60 * 60  # seconds
+EVICT_INTERVAL = 60  # seconds
+
+
+class GameRegistry(typing.Generic[T]):
+    """The games of all chats, backed by an optional GameStore.
+
+    Stored games are not loaded on startup. A stored game is loaded the first time
+    its chat is accessed. Evicted games are written to the store (or kept
+    compressed, without a store) and loaded again on demand. Games that don't fit in
+    the memory limits are evicted when a game is accessed or saved, games that were
+    not used for a while only by `evict_idle`, which `start_evicting` calls
+    periodically. Pinned games are never evicted.
+    """
+
+    def __init__(
+        self,
+        store: GameStore | None,
+        dump: Callable[[T], bytes],
+        load: Callable[[bytes], T],
+        *,
+        max_resident: int = MAX_RESIDENT,
+        max_bytes: int = MAX_RESIDENT_BYTES,
+        idle_timeout: float = IDLE_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.store = store
+        self.dump = dump
+        self.load = load
+        self.max_resident = max_resident
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.evictions = 0
+        self.reloads = 0
+        self.reload_time = 0.0
+        self.max_reload_time = 0.0
+        # resident games, least recently used first, with their last use time
+        self._games: collections.OrderedDict[int, tuple[T, float]] = (
+            collections.OrderedDict()
+        )
+        # the size of the last dump of each resident game, and their sum
+        self._sizes: dict[int, int] = {}
+        self._bytes = 0
+        self._pinned: collections.Counter[int] = collections.Counter()
+        # evicted games, when there is no store to write them to
+        self._spilled: dict[int, bytes] = {}
+        # games that were changed after they were held, and not saved since
+        self._changed: set[int] = set()
+        self._stop = threading.Event()
+        self._evicter: threading.Thread | None = None
+        self._stored = set() if store is None else store.active_chat_ids()
+        self._lock = threading.RLock()
+
+    def __getitem__(self, chat_id: int) -> T:
+        with self._lock:
+            if chat_id in self._games:
+                value, _used = self._games[chat_id]
+                self._games[chat_id] = value, self.clock()
+                self._games.move_to_end(chat_id)
+                return value
+            if chat_id not in self._stored:
+                raise KeyError(chat_id)
+            start = time.perf_counter()
+            data = self._load_data(chat_id)
+            self._stored.discard(chat_id)
+            if data is None:
+                raise KeyError(chat_id)
+            value = self.load(data)
+            self._games[chat_id] = value, self.clock()
+            self._set_size(chat_id, len(data))
+            elapsed = time.perf_counter() - start
+            self.reloads += 1
+            self.reload_time += elapsed
+            self.max_reload_time = max(self.max_reload_time, elapsed)
+        self._evict(keep=chat_id)
+        return value
+
+    def __contains__(self, chat_id: object) -> bool:
+        return chat_id in self._games or chat_id in self._stored
+
+    def __setitem__(self, chat_id: int, value: T) -> None:
+        with self._lock:
+            self._games[chat_id] = value, self.clock()
+            self._games.move_to_end(chat_id)
+            self._stored.discard(chat_id)
+            self._spilled.pop(chat_id, None)
+        self.save(chat_id)
+
+    def __delitem__(self, chat_id: int) -> None:
+        with self._lock:
+            if chat_id not in self:
+                raise KeyError(chat_id)
+            self._games.pop(chat_id, None)
+            self._set_size(chat_id, 0)
+            self._stored.discard(chat_id)
+            self._spilled.pop(chat_id, None)
+        if self.store is not None:
+            self.store.archive(chat_id)
+
+    def __iter__(self) -> Iterator[int]:
+        with self._lock:
+            return iter([*self._games, *self._stored])
+
+    def __len__(self) -> int:
+        return len(self._games) + len(self._stored)
+
+    def get(self, chat_id: int, default: T | None = None) -> T | None:
+        try:
+            return self[chat_id]
+        except KeyError:
+            return default
+
+    def values(self) -> list[T]:
+        return [self[chat_id] for chat_id in self]
+
+    @property
+    def resident(self) -> int:
+        return len(self._games)
+
+    @property
+    def resident_bytes(self) -> int:
+        return self._bytes
+
+    def pin(self, chat_id: int) -> None:
+        # keep a game resident until it is unpinned as many times
+        with self._lock:
+            self._pinned[chat_id] += 1
+
+    def unpin(self, chat_id: int) -> None:
+        with self._lock:
+            self._pinned[chat_id] -= 1
+            if not self._pinned[chat_id]:
+                del self._pinned[chat_id]
+
+    @contextlib.contextmanager
+    def hold(self, chat_id: int) -> Iterator[None]:
+        # keep a game resident while it is changed, and save it afterwards
+        self.pin(chat_id)
+        try:
+            yield
+        finally:
+            self.unpin(chat_id)
+            self.save(chat_id)
+
+    def changed(self, chat_id: int) -> None:
+        # call after changing a game that is not held (from a callback), it is
+        # saved by the next evict_idle. pin the game until then, or the changes
+        # may be made to a game that was evicted meanwhile
+        with self._lock:
+            if chat_id in self._games:
+                self._changed.add(chat_id)
+
+    def save(self, chat_id: int) -> None:
+        # call after changing a game, to persist it
+        with self._lock:
+            self._changed.discard(chat_id)
+            if chat_id not in self._games:
+                return
+            value, _used = self._games[chat_id]
+            data = self.dump(value)
+            self._set_size(chat_id, len(data))
+            if self.store is not None:
+                self.store.save(chat_id, data)
+        self._evict(keep=chat_id)
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            # a game that is held now is saved when it is released
+            for chat_id in self._changed - self._pinned.keys():
+                self.save(chat_id)
+        return self._evict(idle=True)
+
+    def start_evicting(self, interval: float = EVICT_INTERVAL) -> None:
+        self._evicter = threading.Thread(
+            target=self._evict_loop, args=(interval,), name="game-evicter", daemon=True
+        )
+        self._evicter.start()
+
+    def close(self) -> None:
+        # stop evicting, and save the games that were changed after they were held
+        self._stop.set()
+        if self._evicter is not None:
+            self._evicter.join()
+        with self._lock:
+            for chat_id in list(self._changed):
+                self.save(chat_id)
+
+    def _evict_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def _load_data(self, chat_id: int) -> bytes | None:
+        if chat_id in self._spilled:
+            return zlib.decompress(self._spilled.pop(chat_id))
+        if self.store is None:
+            return None
+        return self.store.load(chat_id)
+
+    def _evict(self, keep: int | None = None, idle: bool = False) -> int:
+        with self._lock:
+            idle_since = self.clock() - self.idle_timeout if idle else -math.inf
+            count, size = len(self._games), self._bytes
+            evicted = []
+            for chat_id, (_value, used) in self._games.items():
+                over_limit = count > self.max_resident or size > self.max_bytes
+                if not over_limit and used > idle_since:
+                    # the rest were used more recently
+                    break
+                if chat_id == keep or chat_id in self._pinned:
+                    continue
+                evicted.append(chat_id)
+                count -= 1
+                size -= self._sizes.get(chat_id, 0)
+            for chat_id in evicted:
+                self._spill(chat_id)
+        return len(evicted)
+
+    def _set_size(self, chat_id: int, size: int) -> None:
+        self._bytes += size - self._sizes.pop(chat_id, 0)
+        if size:
+            self._sizes[chat_id] = size
+
+    def _spill(self, chat_id: int) -> None:
+        value, _used = self._games.pop(chat_id)
+        self._changed.discard(chat_id)
+        self._set_size(chat_id, 0)
+        data = self.dump(value)
+        if self.store is None:
+            self._spilled[chat_id] = zlib.compress(data)
+        else:
+            self.store.save(chat_id, data)
+        self._stored.add(chat_id)
+        self.evictions += 1
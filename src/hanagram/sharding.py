@@ -0,0 +1,88 @@
+import multiprocessing
+import multiprocessing.process
+import multiprocessing.queues
+import typing
+from collections.abc import Callable
+
+from .outbox import Message
+
+# None tells a worker to finish its queued updates and exit
+UpdateQueue: typing.TypeAlias = "multiprocessing.queues.Queue[Message | None]"
+
+
+def shard_of(chat_id: int, shards: int) -> int:
+    # chat ids never change, so a chat is always handled by the same worker
+    return chat_id % shards
+
+
+class ShardRouter:
+    """Route updates to worker processes, by the chat they belong to.
+
+    Each worker runs `target(shard, updates)` and owns the chats of its shard. A
+    worker that exits is restarted with the same queue, so no updates are lost;
+    its games should be kept in a shared GameStore to survive the restart.
+    """
+
+    def __init__(
+        self,
+        target: Callable[[int, UpdateQueue], None],
+        key: Callable[[Message], int],
+        workers: int,
+    ):
+        assert workers > 0
+        self.target = target
+        self.key = key
+        self.routed = [0] * workers
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._queues: list[UpdateQueue] = [
+            self._context.Queue() for _ in range(workers)
+        ]
+        self._processes: list[multiprocessing.process.BaseProcess | None] = [
+            None
+        ] * workers
+        self._closing = False
+
+    @property
+    def workers(self) -> int:
+        return len(self._queues)
+
+    def start(self) -> None:
+        for shard in range(self.workers):
+            self._start(shard)
+
+    def submit(self, update: Message) -> None:
+        shard = shard_of(self.key(update), self.workers)
+        self._queues[shard].put(update)
+        self.routed[shard] += 1
+
+    def restart_dead(self) -> int:
+        restarted = 0
+        for shard, process in enumerate(self._processes):
+            if self._closing or process is None or process.is_alive():
+                continue
+            print(
+                "[ERROR]",
+                f"worker {shard} exited with code {process.exitcode}, restarting",
+            )
+            self._start(shard)
+            self.restarts += 1
+            restarted += 1
+        return restarted
+
+    def close(self, timeout: float | None = None) -> None:
+        self._closing = True
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout)
+
+    def _start(self, shard: int) -> None:
+        process = self._context.Process(
+            target=self.target,
+            args=(shard, self._queues[shard]),
+            name=f"shard-{shard}",
+        )
+        process.start()
+        self._processes[shard] = process
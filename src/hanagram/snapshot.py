@@ -0,0 +1,123 @@
+import json
+from typing import TypedDict
+
+from .hanabi import (
+    COLORS,
+    Card,
+    Color,
+    Deck,
+    Game,
+    Hand,
+    HandCard,
+    Player,
+    Value,
+)
+
+# cards are written as the initial of their color and their value, e.g. "r3"
+COLOR_CODES = {color: str(color)[0] for color in COLORS}
+CODE_COLORS = {code: color for color, code in COLOR_CODES.items()}
+assert len(CODE_COLORS) == len(COLORS)
+
+COLOR_KNOWN = 1
+VALUE_KNOWN = 2
+
+
+class GameSnapshot(TypedDict):
+    players: list[str]
+    deck: str
+    errors: int
+    hints: int
+    piles: list[int]
+    discarded: list[str]
+    final_moves: int
+    active_player: int
+    turn: int
+    hands: list[list[tuple[str, int, str, str]]]
+    last_action: str
+
+
+def card_code(color: Color, value: Value) -> str:
+    return f"{COLOR_CODES[color]}{value:d}"
+
+
+def dump_hand_card(card: HandCard) -> tuple[str, int, str, str]:
+    known = (COLOR_KNOWN if card.is_color_known else 0) | (
+        VALUE_KNOWN if card.is_value_known else 0
+    )
+    return (
+        card_code(card.color, card.value),
+        known,
+        "".join(COLOR_CODES[color] for color in card.not_colors),
+        "".join(str(int(value)) for value in card.not_values),
+    )
+
+
+def load_hand_card(data: tuple[str, int, str, str]) -> HandCard:
+    # json loads the tuple as a list, which unpacks the same way
+    code, known, not_colors, not_values = data
+    card = HandCard(CODE_COLORS[code[0]], Value(int(code[1])))
+    card.is_color_known = bool(known & COLOR_KNOWN)
+    card.is_value_known = bool(known & VALUE_KNOWN)
+    card.not_colors = [CODE_COLORS[c] for c in not_colors]
+    card.not_values = [Value(int(v)) for v in not_values]
+    return card
+
+
+def dump_game(game: Game) -> GameSnapshot:
+    return {
+        "players": list(game.players),
+        "deck": "".join(card_code(card.color, card.value) for card in game.deck),
+        "errors": game.errors,
+        "hints": game.hints,
+        "piles": [game.piles[color] for color in COLORS],
+        "discarded": [
+            "".join(str(int(value)) for value in game.discarded[color])
+            for color in COLORS
+        ],
+        "final_moves": game.final_moves,
+        "active_player": game.active_player,
+        "turn": game.turn,
+        "hands": [
+            [dump_hand_card(card) for card in game.hands[player]]
+            for player in game.players
+        ],
+        "last_action": game.last_action_description,
+    }
+
+
+def load_game(data: GameSnapshot) -> Game:
+    # an empty deck deals empty hands, the saved hands and deck replace them
+    deck = data["deck"]
+    game = Game(
+        [Player(name) for name in data["players"]],
+        deck=Deck(),
+        errors=data["errors"],
+        hints=data["hints"],
+        piles=dict(zip(COLORS, data["piles"], strict=True)),
+        discarded={
+            color: [Value(int(v)) for v in values]
+            for color, values in zip(COLORS, data["discarded"], strict=True)
+        },
+        final_moves=data["final_moves"],
+        active_player=data["active_player"],
+        turn=data["turn"],
+        last_action_description=data["last_action"],
+    )
+    game.deck = Deck(
+        Card(CODE_COLORS[deck[i]], Value(int(deck[i + 1])))
+        for i in range(0, len(deck), 2)
+    )
+    game.hands = {
+        player: Hand(load_hand_card(card) for card in hand)
+        for player, hand in zip(game.players, data["hands"], strict=True)
+    }
+    return game
+
+
+def game_to_bytes(game: Game) -> bytes:
+    return json.dumps(dump_game(game), separators=(",", ":")).encode()
+
+
+def game_from_bytes(data: bytes) -> Game:
+    snapshot: GameSnapshot = json.loads(data)
+    return load_game(snapshot)
@@ -0,0 +1,220 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+FLUSH_INTERVAL = 0.5  # seconds
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    chat_id INTEGER PRIMARY KEY,
+    active INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    snapshot BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_active ON games (active) WHERE active;
+CREATE TABLE IF NOT EXISTS deals (
+    chat_id INTEGER NOT NULL,
+    game INTEGER NOT NULL,
+    time REAL NOT NULL,
+    snapshot BLOB NOT NULL,
+    PRIMARY KEY (chat_id, game)
+);
+CREATE TABLE IF NOT EXISTS actions (
+    chat_id INTEGER NOT NULL,
+    game INTEGER NOT NULL,
+    turn INTEGER NOT NULL,
+    time REAL NOT NULL,
+    player TEXT NOT NULL,
+    action TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (chat_id, game, turn)
+);
+"""
+
+
+@dataclass(slots=True)
+class Batch:
+    # None marks a game that was removed, and should be archived
+    snapshots: dict[int, bytes | None] = field(default_factory=dict)
+    deals: list[tuple[int, int, float, bytes]] = field(default_factory=list)
+    actions: list[tuple[int, int, int, float, str, str, str]] = field(
+        default_factory=list
+    )
+
+    def __len__(self) -> int:
+        return len(self.snapshots) + len(self.deals) + len(self.actions)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # in WAL mode, NORMAL is safe from corruption, but may lose the last commits
+    # if the machine (not the process) crashes
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class GameStore:
+    """Persist game snapshots and action logs in SQLite.
+
+    Writes are queued in memory and committed in batches by a background thread, so
+    callers never wait for the disk. Reads see queued writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        flush_interval: float = FLUSH_INTERVAL,
+        batch_size: int = BATCH_SIZE,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.commits = 0
+        self._reader = connect(path)
+        self._reader.executescript(SCHEMA)
+        self._reader_lock = threading.Lock()
+        self._pending = Batch()
+        # the batch that is being written, which readers can't see in the db yet
+        self._writing: Batch | None = None
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="game-store", daemon=True
+        )
+        self._writer.start()
+
+    def active_chat_ids(self) -> set[int]:
+        with self._reader_lock:
+            rows = self._reader.execute("SELECT chat_id FROM games WHERE active")
+            stored = {chat_id for (chat_id,) in rows}
+        with self._cond:
+            for batch in [self._writing, self._pending]:
+                if batch is None:
+                    continue
+                for chat_id, snapshot in batch.snapshots.items():
+                    if snapshot is None:
+                        stored.discard(chat_id)
+                    else:
+                        stored.add(chat_id)
+        return stored
+
+    def load(self, chat_id: int) -> bytes | None:
+        with self._cond:
+            for batch in [self._pending, self._writing]:
+                if batch is not None and chat_id in batch.snapshots:
+                    return batch.snapshots[chat_id]
+        with self._reader_lock:
+            row = self._reader.execute(
+                "SELECT snapshot FROM games WHERE chat_id = ? AND active", (chat_id,)
+            ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def save(self, chat_id: int, snapshot: bytes) -> None:
+        with self._cond:
+            self._pending.snapshots[chat_id] = snapshot
+            self._notify_if_full()
+
+    def archive(self, chat_id: int) -> None:
+        with self._cond:
+            self._pending.snapshots[chat_id] = None
+            self._notify_if_full()
+
+    def log_deal(self, chat_id: int, game: int, snapshot: bytes) -> None:
+        with self._cond:
+            self._pending.deals.append((chat_id, game, time.time(), snapshot))
+            self._notify_if_full()
+
+    def log_action(
+        self,
+        chat_id: int,
+        game: int,
+        turn: int,
+        player: str,
+        action: str,
+        description: str,
+    ) -> None:
+        with self._cond:
+            self._pending.actions.append(
+                (chat_id, game, turn, time.time(), player, action, description)
+            )
+            self._notify_if_full()
+
+    def flush(self) -> None:
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._pending and self._writing is None)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._reader.close()
+
+    def _notify_if_full(self) -> None:
+        if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+            self._cond.notify_all()
+
+    def _write_loop(self) -> None:
+        connection = connect(self.path)
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or bool(self._pending))
+                # wait a little, to write more changes in the same transaction
+                self._cond.wait_for(
+                    lambda: self._closed
+                    or self._flush_requested
+                    or len(self._pending) >= self.batch_size,
+                    self.flush_interval,
+                )
+                batch, self._pending = self._pending, Batch()
+                self._flush_requested = False
+                self._writing = batch
+            if batch:
+                try:
+                    self._write(connection, batch)
+                except sqlite3.Error as ex:
+                    print("[ERROR]", "failed to save games:", ex)
+            with self._cond:
+                self._writing = None
+                self._cond.notify_all()
+                if self._closed and not self._pending:
+                    break
+        connection.close()
+
+    def _write(self, connection: sqlite3.Connection, batch: Batch) -> None:
+        now = time.time()
+        with connection:
+            connection.executemany(
+                "INSERT INTO games (chat_id, active, updated, snapshot)"
+                " VALUES (?, 1, ?, ?) ON CONFLICT (chat_id) DO UPDATE"
+                " SET active = 1, updated = excluded.updated,"
+                " snapshot = excluded.snapshot",
+                [
+                    (chat_id, now, snapshot)
+                    for chat_id, snapshot in batch.snapshots.items()
+                    if snapshot is not None
+                ],
+            )
+            connection.executemany(
+                "UPDATE games SET active = 0, updated = ? WHERE chat_id = ?",
+                [
+                    (now, chat_id)
+                    for chat_id, snapshot in batch.snapshots.items()
+                    if snapshot is None
+                ],
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO deals VALUES (?, ?, ?, ?)", batch.deals
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO actions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                batch.actions,
+            )
+        self.commits += 1
@@ -0,0 +1,293 @@
+"""Play random legal and illegal actions, and check the game engine after each."""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import random
+import time
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+from . import ai, hanabi, snapshot
+
+CHUNK_SIZE = 200  # games in each work unit
+# a game of only illegal actions never ends
+MAX_STEPS = 1000
+# the shares of illegal actions, and of the convention player's actions. random
+# legal actions lose most games in a few turns
+ILLEGAL_SHARE = 0.25
+AI_SHARE = 0.5
+MAX_FAILURES = 20  # that are printed
+# {player} is the active player, {other} another player, {over} after the last slot
+ILLEGAL_ACTIONS = [
+    "",
+    "play",
+    "play 0",
+    "play -1",
+    "play {over}",
+    "discard 0",
+    "discard {over}",
+    "discard one",
+    "d 1.5",
+    "hint {player} red",
+    "hint nobody 1",
+    "hint {other}",
+    "hint {other} 0",
+    "hint {other} 6",
+    "hint {other} purple",
+    "hint {other} red 1",
+    "h  {other} 1",
+    "pass 1",
+]
+
+
+@dataclass(slots=True)
+class Report:
+    games: int = 0
+    actions: int = 0
+    illegal: int = 0
+    failures: list[str] = field(default_factory=list)
+
+    def add(self, other: "Report") -> None:
+        self.games += other.games
+        self.actions += other.actions
+        self.illegal += other.illegal
+        self.failures += other.failures
+
+
+def recount_hand_info(game: hanabi.Game) -> None:
+    """The reference for `hanabi.update_hand_info`, counting the known cards again
+    for every check.
+    """
+
+    def known_colors(color: hanabi.Color) -> int:
+        return sum(
+            card.is_color_known and card.color == color
+            for hand in game.hands.values()
+            for card in hand
+        )
+
+    def known_values(value: hanabi.Value) -> int:
+        return sum(
+            card.is_value_known and card.value == value
+            for hand in game.hands.values()
+            for card in hand
+        )
+
+    def known_cards(color: hanabi.Color, value: hanabi.Value) -> int:
+        return sum(
+            card.is_color_known
+            and card.is_value_known
+            and card.color == color
+            and card.value == value
+            for hand in game.hands.values()
+            for card in hand
+        )
+
+    for color in hanabi.COLORS:
+        if hanabi.check_color_finished(game, color, known_colors(color)):
+            for hand in game.hands.values():
+                for card in hand:
+                    hanabi.update_not_colors(card, color)
+
+    for value in hanabi.VALUES:
+        if hanabi.check_value_finished(game, value, known_values(value)):
+            for hand in game.hands.values():
+                for card in hand:
+                    hanabi.update_not_values(card, value)
+
+    for hand in game.hands.values():
+        for card in hand:
+            if card.is_value_known and not card.is_color_known:
+                for color in hanabi.COLORS:
+                    if hanabi.check_card_finished(
+                        game, color, card.value, known_cards(color, card.value)
+                    ):
+                        hanabi.update_not_colors(card, color)
+
+            elif card.is_color_known and not card.is_value_known:
+                for value in hanabi.VALUES:
+                    if hanabi.check_card_finished(
+                        game, card.color, value, known_cards(card.color, value)
+                    ):
+                        hanabi.update_not_values(card, value)
+
+
+@contextlib.contextmanager
+def reference_engine() -> Iterator[None]:
+    # perform_action looks update_hand_info up each time it is called
+    update_hand_info = hanabi.update_hand_info
+    hanabi.update_hand_info = recount_hand_info
+    try:
+        yield
+    finally:
+        hanabi.update_hand_info = update_hand_info
+
+
+def random_action(game: hanabi.Game, player: hanabi.Player, rng: random.Random) -> str:
+    slots = len(game.hands[player])
+    other = rng.choice([p for p in game.players if p != player])
+    roll = rng.random()
+    if roll < ILLEGAL_SHARE:
+        action = rng.choice(ILLEGAL_ACTIONS)
+        return action.format(player=player, other=other, over=slots + 1)
+    if roll < ILLEGAL_SHARE + AI_SHARE:
+        return ai.choose_action(game, player)
+    hint = rng.choice([*hanabi.COLORS, *map(str, hanabi.VALUES)])
+    # a hint is illegal when there are no hints left
+    return rng.choice(
+        [f"play {rng.randint(1, slots)}", f"discard {rng.randint(1, slots)}"] * 2
+        + [f"hint {other} {hint}", f"h {other} {hint}"]
+    )
+
+
+def check_invariants(game: hanabi.Game) -> list[str]:
+    problems = []
+    cards = Counter(
+        (card.color, card.value)
+        for card in [*game.deck, *(c for hand in game.hands.values() for c in hand)]
+    )
+    for color in hanabi.COLORS:
+        cards.update((color, value) for value in game.discarded[color])
+        cards.update((color, hanabi.Value(v)) for v in range(1, game.piles[color] + 1))
+        if not 0 <= game.piles[color] <= hanabi.MAX_VALUE:
+            problems.append(f"the {color} pile is {game.piles[color]}")
+    for (color, value), count in cards.items():
+        if count != hanabi.CARD_COUNT[value]:
+            problems.append(f"{count} cards of {color} {value}")
+    if not 0 <= game.hints <= hanabi.INITIAL_HINTS:
+        problems.append(f"{game.hints} hints")
+    if not 0 <= game.errors <= hanabi.ALLOWED_ERRORS:
+        problems.append(f"{game.errors} errors")
+    if game.active_player != game.turn % len(game.players):
+        problems.append(f"player {game.active_player} is active at turn {game.turn}")
+
+    hand_size = hanabi.HAND_SIZE[len(game.players)]
+    for player, hand in game.hands.items():
+        if len(hand) > hand_size or (game.deck and len(hand) < hand_size):
+            problems.append(f"{player} has {len(hand)} cards")
+        for card in hand:
+            if card.color in card.not_colors or card.value in card.not_values:
+                problems.append(f"{player} rules out their {card.real_name()}")
+            if len(set(card.not_colors)) == len(hanabi.COLORS) - 1 and not (
+                card.is_color_known
+            ):
+                problems.append(f"{player} doesn't know the color of a card")
+            if len(set(card.not_values)) == len(hanabi.VALUES) - 1 and not (
+                card.is_value_known
+            ):
+                problems.append(f"{player} doesn't know the value of a card")
+    return problems
+
+
+def stress_game(seed: int, players: int) -> Report:
+    """Play the same random actions on the reference engine, on a clone of the
+    game for each action, and on a game that is saved and loaded for each action.
+    """
+    rng = random.Random(seed)
+    names = [hanabi.Player(f"player{i}") for i in range(players)]
+    deck = hanabi.Deck.new(random.Random(seed))
+    reference = hanabi.Game(names, deck=hanabi.Deck(deck))
+    cloned = hanabi.Game(names, deck=hanabi.Deck(deck))
+    compact = hanabi.Game(names, deck=hanabi.Deck(deck))
+    report = Report(games=1)
+
+    def fail(step: int, action: str, problem: str) -> Report:
+        report.failures.append(
+            f"seed {seed}, {players} players, step {step}, {action!r}: {problem}"
+        )
+        return report
+
+    for step in range(MAX_STEPS):
+        if hanabi.check_state(reference) is not hanabi.GameState.RUNNING:
+            break
+        player = hanabi.get_active_player_name(reference)
+        action = random_action(reference, player, rng)
+        before = snapshot.dump_game(reference)
+        previous = cloned
+        cloned = hanabi.clone_game(cloned)
+        compact = snapshot.game_from_bytes(snapshot.game_to_bytes(compact))
+        try:
+            with reference_engine():
+                ok = hanabi.perform_action(reference, player, action)
+            ok_cloned = hanabi.perform_action(cloned, player, action)
+            ok_compact = hanabi.perform_action(compact, player, action)
+        except Exception as e:
+            return fail(step, action, f"{type(e).__name__}: {e}")
+        report.actions += 1
+        report.illegal += not ok
+
+        after = snapshot.dump_game(reference)
+        if not ok == ok_cloned == ok_compact:
+            return fail(step, action, "the engines disagree if it is legal")
+        if not ok and {**after, "last_action": ""} != {**before, "last_action": ""}:
+            return fail(step, action, "an illegal action changed the game")
+        if ok and reference.turn != before["turn"] + 1:
+            return fail(step, action, "a legal action didn't end the turn")
+        if snapshot.dump_game(cloned) != after:
+            return fail(step, action, "the clone differs from the reference")
+        if snapshot.dump_game(previous) != before:
+            return fail(step, action, "the clone changed the game it was cloned from")
+        if snapshot.dump_game(compact) != after:
+            return fail(step, action, "the loaded game differs from the reference")
+        if problems := check_invariants(reference):
+            return fail(step, action, ", ".join(problems))
+    return report
+
+
+def stress_chunk(chunk: tuple[int, int, int]) -> Report:
+    players, start, stop = chunk
+    report = Report()
+    # perform_action prints the illegal actions
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seed in range(start, stop):
+            report.add(stress_game(seed, players))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--players",
+        type=int,
+        nargs="+",
+        default=sorted(hanabi.HAND_SIZE),
+        choices=sorted(hanabi.HAND_SIZE),
+    )
+    parser.add_argument("--start", type=int, default=0, help="first seed")
+    parser.add_argument("--stop", type=int, default=10_000, help="last seed + 1")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    todo = [
+        (players, start, min(start + CHUNK_SIZE, args.stop))
+        for start in range(args.start, args.stop, CHUNK_SIZE)
+        for players in args.players
+    ]
+    total = Report()
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers) as pool:
+        for i, report in enumerate(pool.imap_unordered(stress_chunk, todo), 1):
+            total.add(report)
+            elapsed = time.perf_counter() - start
+            print(
+                f"  {i}/{len(todo)} chunks, {total.actions} actions,"
+                f" {total.actions / elapsed:.0f} actions/s,"
+                f" {len(total.failures)} failures",
+                flush=True,
+            )
+    print(
+        f"{total.games} games, {total.actions} actions"
+        f" ({total.illegal} illegal), {len(total.failures)} failures"
+    )
+    for failure in total.failures[:MAX_FAILURES]:
+        print("[ERROR]", failure)
+    if total.failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Compare computer player strategies on the same seeded deals."""
+
+import argparse
+import math
+import multiprocessing
+import random
+import time
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import ai, hanabi
+
+BLOCK_SIZE = 100  # seeds in each work unit
+# the z score of a 95% confidence interval
+Z_95 = 1.96
+# the columns of each game, and their array type codes
+COLUMNS = {"players": "B", "seed": "I", "score": "B", "turns": "H"}
+SHARDS_FILE = "shards.csv"
+PERFECT_SCORE = hanabi.MAX_VALUE * len(hanabi.COLORS)
+
+
+@dataclass(frozen=True, slots=True)
+class WorkUnit:
+    strategy: str
+    players: int
+    block: int
+
+    @property
+    def seeds(self) -> range:
+        return range(self.block * BLOCK_SIZE, (self.block + 1) * BLOCK_SIZE)
+
+
+def new_game(seed: int, players: int) -> hanabi.Game:
+    # the same deal as `deals.deal`, for the same seed
+    names = [hanabi.Player(f"player{i}") for i in range(players)]
+    return hanabi.Game(names, deck=hanabi.Deck.new(random.Random(seed)))
+
+
+def play_unit(unit: WorkUnit) -> tuple[WorkUnit, dict[str, list[int]]]:
+    strategy = ai.STRATEGIES[unit.strategy]
+    columns: dict[str, list[int]] = {name: [] for name in COLUMNS}
+    for seed in unit.seeds:
+        game = new_game(seed, unit.players)
+        score = ai.play_game(game, strategy)
+        columns["players"].append(unit.players)
+        columns["seed"].append(seed)
+        columns["score"].append(score)
+        columns["turns"].append(game.turn)
+    return unit, columns
+
+
+class ResultStore:
+    """The games of each strategy, in append-only column files.
+
+    Each strategy has a directory with a file for each column, and a shards file
+    with a line for each finished work unit and the number of rows after it. The
+    line is written after the columns, so the columns are cut back to the last
+    line when a run stops while writing.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: set[WorkUnit] = set()
+        self.rows: dict[str, int] = {}
+        if path.exists():
+            for directory in sorted(path.iterdir()):
+                if directory.is_dir():
+                    self._recover(directory.name)
+
+    def _recover(self, strategy: str) -> None:
+        rows = 0
+        shards = self.path / strategy / SHARDS_FILE
+        if shards.exists():
+            # keep the lines that were written whole
+            lines = shards.read_text().splitlines(keepends=True)
+            lines = [line for line in lines if line.endswith("\n")]
+            for line in lines:
+                players, block, rows = map(int, line.split(","))
+                self.done.add(WorkUnit(strategy, players, block))
+            shards.write_text("".join(lines))
+        self.rows[strategy] = rows
+        for name, typecode in COLUMNS.items():
+            column = self.path / strategy / name
+            if column.exists():
+                with column.open("r+b") as f:
+                    f.truncate(rows * array(typecode).itemsize)
+
+    def append(self, unit: WorkUnit, columns: dict[str, list[int]]) -> None:
+        directory = self.path / unit.strategy
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, typecode in COLUMNS.items():
+            with (directory / name).open("ab") as f:
+                array(typecode, columns[name]).tofile(f)
+        rows = self.rows.get(unit.strategy, 0) + len(columns["seed"])
+        with (directory / SHARDS_FILE).open("a") as f:
+            f.write(f"{unit.players},{unit.block},{rows}\n")
+        self.rows[unit.strategy] = rows
+        self.done.add(unit)
+
+    def read(self, strategy: str) -> dict[str, list[int]]:
+        columns = {}
+        for name, typecode in COLUMNS.items():
+            column = array(typecode)
+            with (self.path / strategy / name).open("rb") as f:
+                column.fromfile(f, self.rows[strategy])
+            columns[name] = column.tolist()
+        return columns
+
+
+@dataclass(slots=True)
+class Stats:
+    games: int = 0
+    total: int = 0
+    total_squares: int = 0
+    perfect: int = 0
+
+    def add(self, scores: list[int]) -> None:
+        self.games += len(scores)
+        self.total += sum(scores)
+        self.total_squares += sum(score * score for score in scores)
+        self.perfect += scores.count(PERFECT_SCORE)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.games if self.games else 0.0
+
+    def mean_interval(self) -> float:
+        # half the width of the confidence interval of the mean score
+        if self.games < 2:
+            return math.inf
+        variance = (self.total_squares - self.total * self.mean) / (self.games - 1)
+        return Z_95 * math.sqrt(max(variance, 0.0) / self.games)
+
+    def perfect_interval(self) -> tuple[float, float]:
+        # the Wilson score interval, which works also when no game was perfect
+        if not self.games:
+            return 0.0, 1.0
+        n = self.games
+        rate = self.perfect / n
+        center = (rate + Z_95**2 / (2 * n)) / (1 + Z_95**2 / n)
+        width = Z_95 * math.sqrt(rate * (1 - rate) / n + Z_95**2 / (4 * n**2))
+        width /= 1 + Z_95**2 / n
+        return max(0.0, center - width), min(1.0, center + width)
+
+    def describe(self) -> str:
+        low, high = self.perfect_interval()
+        return (
+            f"{self.games:6d} games"
+            f"  score {self.mean:5.2f} ± {self.mean_interval():.2f}"
+            f"  perfect {100 * low:4.1f}%-{100 * high:4.1f}%"
+        )
+
+
+def work_units(
+    strategies: list[str], players: list[int], games: int, done: set[WorkUnit]
+) -> list[WorkUnit]:
+    # seed blocks first, so every strategy plays the same deals as the results come
+    return [
+        unit
+        for block in range(math.ceil(games / BLOCK_SIZE))
+        for n in players
+        for strategy in strategies
+        if (unit := WorkUnit(strategy, n, block)) not in done
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--strategies",
+        nargs="+",
+        default=list(ai.STRATEGIES),
+        choices=list(ai.STRATEGIES),
+    )
+    parser.add_argument(
+        "--players",
+        type=int,
+        nargs="+",
+        default=sorted(hanabi.HAND_SIZE),
+        choices=sorted(hanabi.HAND_SIZE),
+    )
+    parser.add_argument(
+        "--games",
+        type=int,
+        default=1000,
+        help=f"of each strategy and player count, in blocks of {BLOCK_SIZE}",
+    )
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--output", type=Path, default=Path("tournament"))
+    args = parser.parse_args()
+
+    store = ResultStore(args.output)
+    stats: defaultdict[tuple[str, int], Stats] = defaultdict(Stats)
+    for strategy in store.rows:
+        columns = store.read(strategy)
+        scores: defaultdict[int, list[int]] = defaultdict(list)
+        for players, score in zip(columns["players"], columns["score"], strict=True):
+            scores[players].append(score)
+        for players, player_scores in scores.items():
+            stats[strategy, players].add(player_scores)
+    todo = work_units(args.strategies, args.players, args.games, store.done)
+    print(f"{len(store.done)} work units in {args.output}, {len(todo)} to play")
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers) as pool:
+        for unit, columns in pool.imap_unordered(play_unit, todo):
+            store.append(unit, columns)
+            stats[unit.strategy, unit.players].add(columns["score"])
+            elapsed = time.perf_counter() - start
+            print(
+                f"{elapsed:6.0f}s  {unit.strategy:>12} {unit.players}p"
+                f"  {stats[unit.strategy, unit.players].describe()}",
+                flush=True,
+            )
+
+    print()
+    for (strategy, players), result in sorted(stats.items()):
+        if strategy in args.strategies and players in args.players:
+            print(f"{strategy:>12} {players}p  {result.describe()}")
+
+
+if __name__ == "__main__":
+    main()
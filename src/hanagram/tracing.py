@@ -0,0 +1,222 @@
+import bisect
+import contextlib
+import http.server
+import json
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_PATH = "/metrics"
+# a shared, reusable context manager, for spans when tracing is off
+NO_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        # the last count is for values above all the buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@dataclass(slots=True, eq=False)
+class Trace:
+    kind: str
+    chat_id: int
+    start: float = field(default_factory=time.perf_counter)
+    spans: list[tuple[str, float]] = field(default_factory=list)
+    # API requests of this update that were not sent yet
+    pending: int = 0
+    handled: float | None = None
+
+
+class Tracer:
+    """Time the parts of handling each update, and keep latency histograms.
+
+    An update is traced from when its handling starts until its last API request is
+    answered. Spans in the handling thread are added to the update's trace, spans in
+    other threads need the trace passed explicitly. When the tracer is disabled,
+    `span` returns a shared no-op context manager.
+    """
+
+    def __init__(self, *, enabled: bool = False, log: bool = False):
+        self.enabled = enabled or log
+        self.log = log
+        self.histograms: dict[str, Histogram] = {}
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.updates = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, *, enabled: bool = False, log: bool = False) -> None:
+        self.enabled = enabled or log
+        self.log = log
+
+    def current(self) -> Trace | None:
+        if not self.enabled:
+            return None
+        trace: Trace | None = getattr(self._local, "trace", None)
+        return trace
+
+    def span(
+        self, name: str, trace: Trace | None = None
+    ) -> contextlib.AbstractContextManager[None]:
+        if not self.enabled:
+            return NO_SPAN
+        return self._span(name, trace or self.current())
+
+    @contextlib.contextmanager
+    def trace(self, kind: str, chat_id: int) -> Iterator[Trace | None]:
+        if not self.enabled:
+            yield None
+            return
+        trace = Trace(kind, chat_id)
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = None
+            handled = time.perf_counter()
+            self.observe("handle", handled - trace.start)
+            with self._lock:
+                trace.handled = handled
+                done = trace.pending == 0
+            if done:
+                self._finish(trace)
+
+    def hold(self, trace: Trace) -> None:
+        # the trace ends only after a matching release
+        with self._lock:
+            trace.pending += 1
+
+    def release(self, trace: Trace) -> None:
+        with self._lock:
+            trace.pending -= 1
+            done = trace.pending == 0 and trace.handled is not None
+        if done:
+            self._finish(trace)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+    def render(self) -> str:
+        # the prometheus text exposition format
+        lines = [
+            "# HELP hanagram_updates_total Updates that were handled.",
+            "# TYPE hanagram_updates_total counter",
+            f"hanagram_updates_total {self.updates}",
+            "# HELP hanagram_span_seconds Time spent in each part of an update.",
+            "# TYPE hanagram_span_seconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(
+                    [*histogram.buckets, "+Inf"], histogram.counts, strict=True
+                ):
+                    cumulative += count
+                    lines.append(
+                        f'hanagram_span_seconds_bucket{{span="{name}",le="{bound}"}}'
+                        f" {cumulative}"
+                    )
+                lines.append(
+                    f'hanagram_span_seconds_sum{{span="{name}"}} {histogram.sum}'
+                )
+                lines.append(
+                    f'hanagram_span_seconds_count{{span="{name}"}} {histogram.count}'
+                )
+        for name, gauge in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {gauge()}")
+        return "\n".join(lines) + "\n"
+
+    @contextlib.contextmanager
+    def _span(self, name: str, trace: Trace | None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(name, elapsed)
+            if trace is not None:
+                with self._lock:
+                    trace.spans.append((name, elapsed))
+
+    def _finish(self, trace: Trace) -> None:
+        total = time.perf_counter() - trace.start
+        self.observe("total", total)
+        with self._lock:
+            self.updates += 1
+        if self.log:
+            line = {
+                "update": trace.kind,
+                "chat_id": trace.chat_id,
+                "total_ms": round(total * 1000, 3),
+                "spans": [
+                    {"name": name, "ms": round(seconds * 1000, 3)}
+                    for name, seconds in trace.spans
+                ],
+            }
+            print(json.dumps(line), flush=True)
+
+
+tracer = Tracer()
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, tracer: Tracer, *, host: str = "", port: int = 9100):
+        super().__init__((host, port), MetricsRequestHandler)
+        self.tracer = tracer
+
+    @property
+    def port(self) -> int:
+        return int(self.server_address[1])
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    @property
+    def metrics(self) -> MetricsServer:
+        assert isinstance(self.server, MetricsServer)
+        return self.server
+
+    def do_GET(self) -> None:
+        if self.path != METRICS_PATH:
+            self.send_error(404)
+            return
+        data = self.metrics.tracer.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(  # type: ignore[explicit-override]
+        self, format: str, *args: object
+    ) -> None:
+        # don't log every scrape
+        pass
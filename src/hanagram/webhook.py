@@ -0,0 +1,139 @@
+import hmac
+import http.server
+import json
+import queue
+import threading
+from collections.abc import Callable
+
+from .outbox import Message
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+HEALTH_PATH = "/healthz"
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_WORKERS = 1
+
+
+class WebhookServer(http.server.ThreadingHTTPServer):
+    """Receive updates from Telegram over HTTP, and handle them in worker threads.
+
+    Updates are acknowledged as soon as they are queued. When the queue is full the
+    server answers 503, and Telegram will deliver the update again later.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        handle: Callable[[Message], None],
+        *,
+        secret_token: str | None,
+        host: str = "",
+        port: int = 8080,
+        path: str = "/",
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        workers: int = DEFAULT_WORKERS,
+    ):
+        super().__init__((host, port), WebhookRequestHandler)
+        self.handle_update = handle
+        self.secret_token = secret_token
+        self.webhook_path = path
+        self.updates: queue.Queue[Message | None] = queue.Queue(queue_size)
+        self.received = 0
+        self.rejected = 0
+        self.workers = [
+            threading.Thread(target=self._work, name=f"webhook-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    @property
+    def port(self) -> int:
+        return int(self.server_address[1])
+
+    def check_secret(self, token: str | None) -> bool:
+        if self.secret_token is None:
+            return True
+        return token is not None and hmac.compare_digest(token, self.secret_token)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        for _worker in self.workers:
+            self.updates.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def _work(self) -> None:
+        while (update := self.updates.get()) is not None:
+            try:
+                self.handle_update(update)
+            except Exception as ex:
+                print("[ERROR]", ex, update)
+            finally:
+                self.updates.task_done()
+        self.updates.task_done()
+
+
+class WebhookRequestHandler(http.server.BaseHTTPRequestHandler):
+    @property
+    def webhook(self) -> WebhookServer:
+        assert isinstance(self.server, WebhookServer)
+        return self.server
+
+    def do_GET(self) -> None:
+        if self.path != HEALTH_PATH:
+            self._reply(404, {"ok": False})
+            return
+        self._reply(
+            200,
+            {
+                "ok": True,
+                "queue_depth": self.webhook.updates.qsize(),
+                "received": self.webhook.received,
+                "rejected": self.webhook.rejected,
+            },
+        )
+
+    def do_POST(self) -> None:
+        if self.path != self.webhook.webhook_path:
+            self._reply(404, {"ok": False})
+            return
+        if not self.webhook.check_secret(self.headers.get(SECRET_HEADER)):
+            self._reply(403, {"ok": False})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            update = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._reply(400, {"ok": False})
+            return
+        try:
+            self.webhook.updates.put_nowait(Message(update))
+        except queue.Full:
+            self.webhook.rejected += 1
+            self._reply(503, {"ok": False})
+            return
+        self.webhook.received += 1
+        self._reply(200, {"ok": True})
+
+    def _reply(self, status: int, body: dict[str, object]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(  # type: ignore[explicit-override]
+        self, format: str, *args: object
+    ) -> None:
+        # don't log every update
+        pass
@@ -0,0 +1,72 @@
+import io
+import threading
+
+from telepot.exception import (  # type: ignore[import-untyped]
+    TelegramError,
+    TooManyRequestsError,
+)
+
+from hanagram.outbox import Message
+
+
+class FakeBot:
+    def __init__(self, fail_first: int = 0):
+        self.calls: list[tuple[str, tuple[object, ...]]] = []
+        self.fail_first = fail_first
+        self.release = threading.Event()
+        self.release.set()
+
+    def _record(self, method: str, *args: object) -> Message:
+        self.release.wait()
+        self.calls.append((method, args))
+        if self.fail_first:
+            self.fail_first -= 1
+            raise TooManyRequestsError(
+                "Too Many Requests: retry after 0",
+                429,
+                {"parameters": {"retry_after": 0.01}},
+            )
+        return Message({"message_id": len(self.calls), "chat": {"id": args[0]}})
+
+    def sendMessage(self, chat_id: int, text: str, **_kwargs: object) -> Message:
+        return self._record("sendMessage", chat_id, text)
+
+    def sendPhoto(self, chat_id: int, photo: object, **_kwargs: object) -> Message:
+        message = self._record("sendPhoto", chat_id, photo)
+        if isinstance(photo, io.BytesIO):
+            message["photo"] = [{"file_id": f"small-{len(self.calls)}"}]
+            message["photo"].append({"file_id": f"file-{len(self.calls)}"})
+        return message
+
+    def editMessageText(
+        self, msg_identifier: tuple[int, int], text: str, **_kwargs: object
+    ) -> Message:
+        return self._record("editMessageText", msg_identifier[0], text)
+
+    def editMessageMedia(
+        self, msg_identifier: tuple[int, int], media: dict[str, object]
+    ) -> Message:
+        self._record("editMessageMedia", msg_identifier[0], media["media"])
+        if not isinstance(media["media"], io.BytesIO):
+            raise TelegramError("Bad Request: message is not modified", 400, {})
+        return Message({"message_id": msg_identifier[1], "photo": [{"file_id": "f"}]})
+
+    def deleteMessage(self, msg_identifier: tuple[int, int]) -> bool:
+        self._record("deleteMessage", msg_identifier[0])
+        return True
+
+
+def callback(user_id: int, chat_id: int, data: str) -> Message:
+    # a button that the user pressed, on a keyboard of the game in the chat
+    return Message(
+        {
+            "update_id": 0,
+            "callback_query": {
+                "id": "0",
+                "chat_instance": "0",
+                "from": {"id": user_id, "first_name": "Admin"},
+                "message": {"message_id": 1, "chat": {"id": user_id}},
+                "data": f"{data}|{chat_id}",
+            },
+        }
+    )
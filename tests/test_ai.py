@@ -0,0 +1,54 @@
+import random
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from hanagram import ai, hanabi
+
+
+def new_game(n_players: int) -> hanabi.Game:
+    players = [hanabi.Player(name) for name in ["Alice", "Bob", "Carol", "Dan", "Erin"]]
+    return hanabi.Game(players[:n_players])
+
+
+def test_plays_a_known_playable_card() -> None:
+    game = new_game(2)
+    card = game.hands[hanabi.Player("Alice")][2]
+    card.color, card.value = hanabi.Color.RED, hanabi.Value.n1
+    card.is_color_known = card.is_value_known = True
+    assert ai.choose_action(game, hanabi.Player("Alice")) == "play 3"
+    # a card that may be any 1 is also playable, since no pile was started
+    card.is_color_known = False
+    assert ai.choose_action(game, hanabi.Player("Alice")) == "play 3"
+
+
+def test_hints_a_playable_card() -> None:
+    game = new_game(2)
+    for i, card in enumerate(game.hands[hanabi.Player("Bob")]):
+        card.color, card.value = hanabi.Color.BLUE, hanabi.Value(2 + i % 4)
+    game.hands[hanabi.Player("Bob")][4].value = hanabi.Value.n1
+    assert ai.choose_action(game, hanabi.Player("Alice")) == "hint Bob 1"
+    # without hints, the oldest card is discarded
+    game.hints = 0
+    assert ai.choose_action(game, hanabi.Player("Alice")) == "discard 5"
+
+
+def test_self_play(benchmark: BenchmarkFixture) -> None:
+    random.seed(0)
+    games = [new_game(n) for n in [2, 3, 4, 5] for _ in range(5)]
+    scores = [ai.play_game(game) for game in games]
+    assert all(
+        hanabi.check_state(game) is not hanabi.GameState.RUNNING for game in games
+    )
+    assert sum(scores) / len(scores) > 5
+
+    game = new_game(4)
+    benchmark(ai.choose_action, game, hanabi.Player("Alice"))
+
+
+@pytest.mark.parametrize("strategy", sorted(ai.STRATEGIES))
+def test_strategies_finish_games(strategy: str) -> None:
+    random.seed(1)
+    game = new_game(3)
+    assert 0 < ai.play_game(game, ai.STRATEGIES[strategy]) <= 25
+    assert hanabi.check_state(game) is not hanabi.GameState.RUNNING
@@ -0,0 +1,58 @@
+from collections import Counter
+from pathlib import Path
+
+from hanagram import ai, analytics, hanabi, snapshot, tournament
+from hanagram.store import GameStore
+
+
+def test_analyze_logged_games(tmp_path: Path) -> None:
+    path = tmp_path / "games.db"
+    store = GameStore(str(path))
+    scores: Counter[tuple[int, int]] = Counter()
+    critical = turns = 0
+    for chat_id, players in [(1, 2), (2, 3), (3, 5)]:
+        for game_number in [1, 2]:
+            game = tournament.new_game(10 * chat_id + game_number, players)
+            store.log_deal(chat_id, game_number, snapshot.game_to_bytes(game))
+            while hanabi.check_state(game) is hanabi.GameState.RUNNING:
+                player = hanabi.get_active_player_name(game)
+                action = ai.play_turn(game)
+                description = game.last_action_description
+                store.log_action(
+                    chat_id, game_number, game.turn, player, action, description
+                )
+                turns += 1
+                if chat_id != 3 or game_number != 2:
+                    critical += "discarded a critical" in description
+            if chat_id != 3 or game_number != 2:
+                scores[players, hanabi.get_score(game)] += 1
+    # the last game of a saved chat may be still running
+    store.save(3, b"{}")
+    store.close()
+
+    assert list(analytics.chat_ranges(path, 2)) == [(1, 2), (3, 3)]
+    totals = analytics.Totals()
+    for low, high in analytics.chat_ranges(path, 2):
+        totals.add(analytics.analyze_range(path, low, high))
+    assert {
+        (players, score): count
+        for players, counts in enumerate(totals.scores)
+        for score, count in enumerate(counts)
+        if count
+    } == scores
+    assert sum(totals.critical_discards) == critical
+    assert sum(map(sum, totals.bombs)) == scores.total()
+    assert sum(totals.turn_tenths) == turns
+    lines = analytics.report(totals)
+    assert len(lines) == 1 + 3 + 1
+    assert lines[-1].startswith(f"{turns} turns: p50 0.0s")
+
+
+def test_percentile() -> None:
+    histogram = analytics.counts(10)
+    histogram[2] = 50
+    histogram[7] = 49
+    histogram[9] = 1
+    assert analytics.percentile(histogram, 50) == 2
+    assert analytics.percentile(histogram, 90) == 7
+    assert analytics.percentile(histogram, 100) == 9
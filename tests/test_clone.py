@@ -0,0 +1,92 @@
+import copy
+import random
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from hanagram import ai, hanabi, snapshot
+
+PLAYERS = [hanabi.Player(name) for name in ["Alice", "Bob", "Carol", "Dan"]]
+
+
+def new_game(seed: int) -> hanabi.Game:
+    return hanabi.Game(PLAYERS, deck=hanabi.Deck.new(random.Random(seed)))
+
+
+def random_action(game: hanabi.Game, rng: random.Random) -> str:
+    player = hanabi.get_active_player_name(game)
+    other = rng.choice([p for p in game.players if p != player])
+    slot = rng.randint(1, len(game.hands[player]))
+    hint = rng.choice([*hanabi.COLORS, *map(str, hanabi.VALUES)])
+    if game.hints:
+        return rng.choice([f"play {slot}", f"discard {slot}", f"hint {other} {hint}"])
+    return rng.choice([f"play {slot}", f"discard {slot}"])
+
+
+def play_random(game: hanabi.Game, rng: random.Random, turns: int) -> None:
+    for _ in range(turns):
+        if hanabi.check_state(game) is not hanabi.GameState.RUNNING:
+            return
+        player = hanabi.get_active_player_name(game)
+        hanabi.perform_action(game, player, random_action(game, rng))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_clone_plays_like_a_deep_copy(seed: int) -> None:
+    game = new_game(seed)
+    play_random(game, random.Random(seed), 10)
+    before = snapshot.dump_game(game)
+
+    clone = hanabi.clone_game(game)
+    deep = copy.deepcopy(game)
+    play_random(clone, random.Random(seed + 100), 100)
+    play_random(deep, random.Random(seed + 100), 100)
+    assert snapshot.dump_game(clone) == snapshot.dump_game(deep)
+    assert snapshot.dump_game(game) == before
+
+    # the original can still change, without changing its clone
+    after = snapshot.dump_game(clone)
+    play_random(game, random.Random(seed + 200), 100)
+    assert snapshot.dump_game(clone) == after
+
+
+def test_clone_of_clone() -> None:
+    game = new_game(0)
+    clone = hanabi.clone_game(game)
+    ai.play_turn(clone)
+    second = hanabi.clone_game(clone)
+    after = snapshot.dump_game(clone)
+    ai.play_game(second)
+    assert snapshot.dump_game(clone) == after
+    assert game.turn == 0
+
+
+def test_clone_of_loaded_game() -> None:
+    game = snapshot.load_game(snapshot.dump_game(new_game(0)))
+    ai.play_turn(game)
+    clone = hanabi.clone_game(game)
+    after = snapshot.dump_game(game)
+    ai.play_game(clone)
+    assert snapshot.dump_game(game) == after
+
+
+@pytest.mark.benchmark(group="clone")
+def test_clone_and_play_speed(benchmark: BenchmarkFixture) -> None:
+    game = new_game(0)
+    play_random(game, random.Random(0), 20)
+
+    def clone_and_play() -> None:
+        ai.play_turn(hanabi.clone_game(game))
+
+    benchmark(clone_and_play)
+
+
+@pytest.mark.benchmark(group="clone")
+def test_deepcopy_and_play_speed(benchmark: BenchmarkFixture) -> None:
+    game = new_game(0)
+    play_random(game, random.Random(0), 20)
+
+    def deepcopy_and_play() -> None:
+        ai.play_turn(copy.deepcopy(game))
+
+    benchmark(deepcopy_and_play)
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from hanagram import deals, hanabi
+
+
+def test_deals_are_seeded() -> None:
+    assert deals.deal(7, 3) == deals.deal(7, 3)
+    assert deals.deal(7, 3) != deals.deal(8, 3)
+    dealt = deals.deal(7, 4)
+    assert [len(hand) for hand in dealt.hands] == [hanabi.HAND_SIZE[4]] * 4
+    assert sorted([*sum(dealt.hands, ()), *dealt.draws]) == sorted(
+        card for card, copies in enumerate(deals.COPIES) for _ in range(copies)
+    )
+
+
+def test_late_cards_bound_the_score() -> None:
+    threes = [2, 7, 12]
+    cards = [card for card, copies in enumerate(deals.COPIES) for _ in range(copies)]
+    for card in threes * 2:
+        cards.remove(card)
+    # the 3s of three colors are drawn in the last 6 draws. the 9 cards from these
+    # 3s up can be played only in the last 5 draws and the 2 final moves
+    hands = (tuple(cards[:5]), tuple(cards[5:10]))
+    dealt = deals.Deal(2, hands, (*cards[10:], *threes, *threes))
+    assert deals.pace_bound(dealt) == deals.MAX_SCORE - 2
+    search = deals.Search(dealt, 20_000)
+    bound = search.run(deals.pace_bound(dealt))
+    assert search.best <= bound <= deals.MAX_SCORE - 2
+
+
+def test_analyze_deal() -> None:
+    result = deals.analyze_deal(0, 3)
+    assert result.best <= result.bound <= deals.MAX_SCORE
+    assert result.exact == (result.best == result.bound)
+    assert result.to_line().startswith("3,0,")
+
+
+def test_resume_from_checkpoint(tmp_path: Path) -> None:
+    output = tmp_path / "deals.csv"
+    # the last line was cut while it was written
+    output.write_text(f"{deals.HEADER}\n3,0,25,25,1\n3,1,25,25,1\n3,2,2")
+    done = deals.read_checkpoint(output)
+    assert done == {(3, 0), (3, 1)}
+    todo = list(deals.chunks([3, 4], 0, 2, 100, done))
+    assert todo == [(4, 0, 2, 100)]
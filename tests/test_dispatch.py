@@ -0,0 +1,114 @@
+import random
+import threading
+import time
+
+import pytest
+from fakes import FakeBot, callback
+
+from hanagram import hanabi, play_telegram
+from hanagram.dispatch import ChatDispatcher
+from hanagram.outbox import Message, Outbox
+
+N_CHATS = 300
+N_ACTION_CHATS = 10
+
+
+def test_updates_of_a_chat_run_in_order() -> None:
+    seen: dict[int, list[int]] = {}
+    lock = threading.Lock()
+
+    def handle(update: Message) -> None:
+        time.sleep(random.random() / 1000)
+        with lock:
+            seen.setdefault(update["chat"], []).append(update["n"])
+
+    dispatcher = ChatDispatcher(handle, key=lambda update: int(update["chat"]))
+    for n in range(50):
+        for chat in range(20):
+            dispatcher.submit(Message({"chat": chat, "n": n}))
+    assert dispatcher.join(timeout=10)
+    assert seen == {chat: list(range(50)) for chat in range(20)}
+    assert dispatcher.handled == 1000
+    assert dispatcher.queue_depth == dispatcher.errors == 0
+
+
+def test_interleaved_callbacks_keep_games_consistent(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    server = play_telegram.BotServer("DEADBEEF")
+    server.outbox = Outbox(
+        FakeBot(), private_chat_rate=1e6, group_chat_rate=1e6, global_rate=1e6
+    )
+    # the server is set only when the bot starts
+    monkeypatch.setattr(play_telegram, "server", server, raising=False)
+    rng = random.Random(0)
+    players = [hanabi.Player("Alice"), hanabi.Player("Bob")]
+
+    streams: list[list[Message]] = []
+    for i in range(N_CHATS):
+        chat_id = play_telegram.ChatId(-1000 - i)
+        user_id = play_telegram.UserId(1000 + i)
+        chat_game = play_telegram.ChatGame(chat_id, admin=user_id, test_mode=True)
+        chat_game.player_to_user = dict.fromkeys(players, user_id)
+        chat_game.user_to_message[user_id] = Message(
+            {"message_id": 1, "chat": {"id": user_id}}
+        )
+        chat_game.game = hanabi.Game(players)
+        server.games[chat_id] = chat_game
+        # every menu is opened and closed, so only the last step changes the game
+        steps = [rng.choice(["play", "discard", "hint"]) for _ in range(10)]
+        data = [d for step in steps for d in [step, "back"]]
+        data += ["hint", "red"] if i < N_ACTION_CHATS else ["play"]
+        streams.append([callback(user_id, chat_id, d) for d in data])
+
+    def handle(update: Message) -> None:
+        # simulate network jitter, so races have a chance to happen
+        time.sleep(random.random() / 1000)
+        play_telegram.handle_update(update)
+
+    dispatcher = ChatDispatcher(handle, play_telegram.update_chat_id)
+    while streams:
+        stream = rng.choice(streams)
+        dispatcher.submit(stream.pop(0))
+        if not stream:
+            streams.remove(stream)
+    assert dispatcher.join(timeout=60)
+    assert server.outbox.join(timeout=60)
+
+    assert dispatcher.errors == 0
+    for chat_game in server.games.values():
+        assert chat_game.game is not None
+        if -1000 - chat_game.chat_id < N_ACTION_CHATS:
+            assert chat_game.current_action == ""
+            assert chat_game.game.hints == hanabi.INITIAL_HINTS - 1
+            assert chat_game.game.active_player == 1
+        else:
+            assert chat_game.current_action == "play"
+            assert chat_game.game.hints == hanabi.INITIAL_HINTS
+            assert chat_game.game.active_player == 0
+
+
+def test_submit_blocks_when_full() -> None:
+    release = threading.Event()
+
+    def handle(_update: Message) -> None:
+        release.wait()
+
+    dispatcher = ChatDispatcher(
+        handle,
+        key=lambda update: int(update["chat"]),
+        max_pending=3,
+    )
+    for chat in range(3):
+        dispatcher.submit(Message({"chat": chat}))
+    blocked = threading.Thread(target=dispatcher.submit, args=[Message({"chat": 0})])
+    blocked.start()
+    blocked.join(timeout=0.1)
+    assert blocked.is_alive()
+    assert dispatcher.queue_depth == 3
+    release.set()
+    blocked.join(timeout=5)
+    assert not blocked.is_alive()
+    assert dispatcher.join(timeout=5)
+    assert dispatcher.handled == 4
+    dispatcher.close()
@@ -0,0 +1,79 @@
+import random
+from collections import Counter
+
+from hanagram import ai, estimate, hanabi, hints
+
+PLAYERS = [hanabi.Player(name) for name in ["Alice", "Bob", "Carol"]]
+
+
+def hidden_cards(game: hanabi.Game, viewer: hanabi.Player) -> Counter[hanabi.Card]:
+    cards = [hanabi.Card(c.color, c.value) for c in game.hands[viewer]]
+    return Counter(cards + game.deck)
+
+
+def test_samples_are_consistent_with_the_hints() -> None:
+    random.seed(0)
+    game = hanabi.Game(PLAYERS)
+    for _ in range(6):
+        ai.play_turn(game)
+    viewer = hanabi.get_active_player_name(game)
+    masks = [hints.possible_cards(card) for card in game.hands[viewer]]
+    rng = random.Random(0)
+    for _ in range(20):
+        sample = estimate.sample_game(game, viewer, rng)
+        assert hidden_cards(sample, viewer) == hidden_cards(game, viewer)
+        for mask, card in zip(masks, sample.hands[viewer], strict=True):
+            assert mask & hints.card_bit(card.color, card.value)
+        for player in PLAYERS:
+            if player != viewer:
+                assert [c.real_name() for c in sample.hands[player]] == [
+                    c.real_name() for c in game.hands[player]
+                ]
+
+
+def test_estimator_keeps_the_rollouts_that_the_game_follows() -> None:
+    random.seed(1)
+    game = hanabi.Game(PLAYERS)
+    # the player knows their cards, and the next card, so every rollout is dealt
+    # the real cards and draws the real card
+    for card in game.hands[hanabi.get_active_player_name(game)]:
+        card.is_color_known = card.is_value_known = True
+    game.deck = hanabi.Deck(game.deck[-1:])
+    estimator = estimate.Estimator(seed=0)
+    first = estimator.estimate(game, budget=0.05)
+    assert first.rollouts >= 1
+    assert 0 <= first.low <= first.mean <= first.high <= 25
+
+    action = ai.play_turn(game)
+    estimator.observe(game, action)
+    kept = len(estimator.rollouts)
+    assert kept == first.rollouts
+    second = estimator.estimate(game, budget=0.05)
+    assert second.rollouts > kept
+
+    ai.play_game(game)
+    estimator.estimate(game)
+    assert estimator.history[-1][0].mean == hanabi.get_score(game)
+    for drop, _action in estimator.biggest_losses():
+        assert drop > 0
+
+
+def test_estimator_drops_the_rollouts_dealt_other_cards() -> None:
+    random.seed(2)
+    game = hanabi.Game(PLAYERS)
+    estimator = estimate.Estimator(seed=0)
+    first = estimator.estimate(game, budget=0.05)
+    # the next player sees the cards of this player, which the rollouts dealt again
+    exact = [r for r in estimator.rollouts if r.exact]
+    assert len(exact) < first.rollouts
+    action = ai.play_turn(game)
+    estimator.observe(game, action)
+    assert len(estimator.rollouts) <= len(exact)
+
+
+def test_estimator_runs_in_worker_processes() -> None:
+    game = hanabi.Game(PLAYERS)
+    with estimate.create_pool(2) as pool:
+        estimator = estimate.Estimator(pool, workers=2)
+        result = estimator.estimate(game, budget=0.05)
+    assert result.rollouts >= 2
@@ -0,0 +1,91 @@
+import io
+import json
+from collections.abc import Iterator
+
+import pytest
+import telepot  # type: ignore[import-untyped]
+import telepot.api  # type: ignore[import-untyped]
+from telepot.exception import TooManyRequestsError  # type: ignore[import-untyped]
+from telepot.namedtuple import (  # type: ignore[import-untyped]
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+)
+
+from hanagram import play_telegram
+from hanagram.fake_telegram import FakeTelegram
+from hanagram.outbox import Bot, Outbox
+
+
+@pytest.fixture
+def telegram(monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeTelegram]:
+    server = FakeTelegram()
+    server.start()
+    # restored after the test
+    monkeypatch.setattr(telepot.api, "_methodurl", telepot.api._methodurl)
+    play_telegram.set_api_url(server.url)
+    yield server
+    server.stop()
+
+
+def test_bot_methods(telegram: FakeTelegram) -> None:
+    seen: list[tuple[str, dict[str, str]]] = []
+    telegram.observers.append(
+        lambda method, params, _result: seen.append((method, params))
+    )
+    bot = telepot.Bot("0:test")
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="Play", callback_data="play|-1")]]
+    )
+    sent = bot.sendMessage(5, "hello", reply_markup=keyboard)
+    assert sent["chat"]["id"] == 5
+    assert sent["reply_markup"]["inline_keyboard"][0][0]["callback_data"] == "play|-1"
+    edited = bot.editMessageText((5, sent["message_id"]), "bye")
+    assert edited["message_id"] == sent["message_id"]
+    assert bot.deleteMessage((5, sent["message_id"])) is True
+
+    photo = bot.sendPhoto(5, io.BytesIO(b"image"))
+    file_id = photo["photo"][-1]["file_id"]
+    assert bot.sendPhoto(5, file_id)["photo"][-1]["file_id"] == file_id
+    assert telegram.uploads == 1
+
+    telegram.push_update({"message": {"text": "/start"}})
+    updates = bot.getUpdates(offset=0, timeout=1)
+    assert [update["message"]["text"] for update in updates] == ["/start"]
+    assert bot.getUpdates(offset=updates[-1]["update_id"] + 1, timeout=0) == []
+    assert [method for method, _params in seen][:3] == [
+        "sendMessage",
+        "editMessageText",
+        "deleteMessage",
+    ]
+
+
+def test_too_many_requests(telegram: FakeTelegram) -> None:
+    telegram.error_rate = 1
+    bot = telepot.Bot("0:test")
+    with pytest.raises(TooManyRequestsError) as error:
+        bot.sendMessage(5, "hello")
+    assert error.value.json["parameters"]["retry_after"] == telegram.retry_after
+    assert telegram.too_many_requests == 1
+
+
+def test_edit_message_media(telegram: FakeTelegram) -> None:
+    seen: list[dict[str, str]] = []
+    telegram.observers.append(lambda _method, params, _result: seen.append(params))
+    bot = Bot("0:test")
+    sent = bot.sendPhoto(5, io.BytesIO(b"image"))
+    board = (5, sent["message_id"])
+    outbox = Outbox(bot)
+    try:
+        edited = outbox.edit_message_media(board, io.BytesIO(b"other")).result(5)
+        file_id = edited["photo"][-1]["file_id"]
+        assert telegram.uploads == 2
+        assert json.loads(seen[-1]["media"]) == {
+            "type": "photo",
+            "media": "attach://photo",
+        }
+        edited = bot.editMessageMedia(board, {"type": "photo", "media": file_id})
+        assert edited["photo"][-1]["file_id"] == file_id
+        assert telegram.uploads == 2
+        assert outbox.failures == 0
+    finally:
+        outbox.close()
@@ -0,0 +1,43 @@
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from hanagram import hanabi, hints
+
+PLAYERS = [hanabi.Player(name) for name in ["Alice", "Bob", "Carol", "Dan", "Erin"]]
+
+
+def set_hand(game: hanabi.Game, player: hanabi.Player, cards: list[str]) -> None:
+    for hand_card, card in zip(game.hands[player], cards, strict=True):
+        color, value = card.split()
+        hand_card.color, hand_card.value = hanabi.Color(color), hanabi.Value(int(value))
+
+
+def test_suggest_hints() -> None:
+    game = hanabi.Game(PLAYERS[:3])
+    set_hand(game, PLAYERS[1], ["red 2", "red 3", "blue 4", "green 4", "red 1"])
+    set_hand(game, PLAYERS[2], ["white 3", "white 4", "yellow 5", "white 2", "blue 3"])
+    suggestions = hints.suggest_hints(game, PLAYERS[0])
+    best = suggestions[0]
+    assert (best.player, best.hint, best.touched, best.playable) == (
+        "Bob",
+        hanabi.Value.n1,
+        1,
+        1,
+    )
+    assert best.action == "hint Bob 1"
+    # the only 5 is critical
+    five = next(s for s in suggestions if s.hint == hanabi.Value.n5)
+    assert (five.player, five.critical, five.playable) == ("Carol", 1, 0)
+    assert five.score > max(
+        s.score for s in suggestions if not s.playable and not s.critical
+    )
+    assert all(s.informed for s in suggestions)
+    assert not any(s.player == PLAYERS[0] for s in suggestions)
+    game.hints = 0
+    assert hints.suggest_hints(game, PLAYERS[0]) == []
+
+
+def test_suggest_hints_speed(benchmark: BenchmarkFixture) -> None:
+    players = [*PLAYERS, hanabi.Player("Frank")]
+    game = hanabi.Game(players)
+    suggestions = benchmark(hints.suggest_hints, game, players[0])
+    assert len({(s.player, s.hint) for s in suggestions}) == len(suggestions)
@@ -0,0 +1,134 @@
+import io
+import time
+
+from fakes import FakeBot
+
+from hanagram.outbox import Outbox
+
+
+def fast_outbox(bot: FakeBot, workers: int = 4) -> Outbox:
+    return Outbox(
+        bot,
+        workers=workers,
+        private_chat_rate=1000,
+        group_chat_rate=1000,
+        global_rate=1000,
+    )
+
+
+def test_merges_consecutive_messages() -> None:
+    bot = FakeBot()
+    bot.release.clear()
+    outbox = fast_outbox(bot, workers=1)
+    outbox.send_photo(1, "photo")
+    first = outbox.send_message(1, "hello")
+    second = outbox.send_message(1, "world")
+    outbox.send_message(1, "keyboard", reply_markup="{}")
+    assert outbox.queue_depth >= 2
+    bot.release.set()
+    assert outbox.join(timeout=5)
+    assert first.result() is second.result()
+    assert bot.calls == [
+        ("sendPhoto", (1, "photo")),
+        ("sendMessage", (1, "hello\nworld")),
+        ("sendMessage", (1, "keyboard")),
+    ]
+    assert outbox.queue_depth == 0
+
+
+def test_superseding_messages_are_not_merged() -> None:
+    bot = FakeBot()
+    bot.release.clear()
+    outbox = fast_outbox(bot, workers=1)
+    outbox.send_photo(1, "photo")
+    while outbox.queue_depth:
+        time.sleep(0.001)
+    first = outbox.send_message(1, "estimate 1", supersedes="estimate")
+    other = outbox.send_message(1, "Alice is watching")
+    second = outbox.send_message(1, "estimate 2", supersedes="estimate")
+    assert first.result(timeout=5) == {}
+    bot.release.set()
+    assert outbox.join(timeout=5)
+    assert bot.calls == [
+        ("sendPhoto", (1, "photo")),
+        ("sendMessage", (1, "Alice is watching")),
+        ("sendMessage", (1, "estimate 2")),
+    ]
+    assert other.result() is not second.result()
+    assert outbox.merged == 0
+    assert outbox.superseded == 1
+
+
+def test_retries_too_many_requests() -> None:
+    bot = FakeBot(fail_first=2)
+    outbox = fast_outbox(bot)
+    result = outbox.send_message(1, "hello").result(timeout=5)
+    assert result["message_id"] == 3
+    assert outbox.retries == 2
+    assert outbox.api_calls["sendMessage"] == 3
+
+
+def test_per_chat_order_and_rate() -> None:
+    bot = FakeBot()
+    outbox = Outbox(bot, private_chat_rate=50, chat_burst=1, global_rate=1000)
+    for i in range(5):
+        outbox.send_photo(1, i)
+        outbox.send_photo(2, i)
+    assert outbox.join(timeout=5)
+    for chat_id in (1, 2):
+        sent = [args[1] for _method, args in bot.calls if args[0] == chat_id]
+        assert sent == list(range(5))
+
+
+def test_reuses_uploaded_photos() -> None:
+    bot = FakeBot()
+    outbox = fast_outbox(bot, workers=1)
+    outbox.send_photo(1, io.BytesIO(b"board"))
+    outbox.send_photo(2, io.BytesIO(b"board"))
+    outbox.send_photo(2, io.BytesIO(b"other board"))
+    assert outbox.join(timeout=5)
+    assert [args[1] for _method, args in bot.calls[1:]] == [
+        "file-1",
+        bot.calls[2][1][1],
+    ]
+    assert isinstance(bot.calls[2][1][1], io.BytesIO)
+    assert (outbox.photos.hits, outbox.photos.misses) == (1, 2)
+    assert len(outbox.photos) == 2
+
+
+def test_edits_photos_in_place() -> None:
+    bot = FakeBot()
+    outbox = fast_outbox(bot, workers=1)
+    first = outbox.edit_message_media((1, 7), io.BytesIO(b"board"))
+    assert first.result(timeout=5)["message_id"] == 7
+    # the second edit uses the cached file_id, and the photo did not change
+    second = outbox.edit_message_media((1, 7), io.BytesIO(b"board"))
+    assert second.result(timeout=5) == {}
+    assert bot.calls[-1] == ("editMessageMedia", (1, "f"))
+    assert outbox.failures == 0
+
+
+def test_newer_views_supersede_queued_ones() -> None:
+    bot = FakeBot()
+    bot.release.clear()
+    outbox = fast_outbox(bot, workers=1)
+    # the first board is in flight, the next ones wait in the queue
+    first = outbox.send_photo(1, "turn 1", supersedes="view")
+    while outbox.queue_depth:
+        time.sleep(0.001)
+    second = outbox.send_photo(1, "turn 2", supersedes="view")
+    other = outbox.send_photo(1, "other game", supersedes="other view")
+    third = outbox.send_photo(1, "turn 3", supersedes="view")
+    assert second.result(timeout=5) == {}
+    bot.release.set()
+    assert outbox.join(timeout=5)
+    assert [args[1] for _method, args in bot.calls] == [
+        "turn 1",
+        "other game",
+        "turn 3",
+    ]
+    assert first.result()["message_id"] == 1
+    assert other.result()["message_id"] == 2
+    assert third.result()["message_id"] == 3
+    assert outbox.superseded == 1
+    assert outbox.queue_depth == 0
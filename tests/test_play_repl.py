@@ -0,0 +1,63 @@
+import io
+
+import pytest
+
+from hanagram import ai, hanabi, play_repl, tournament
+
+
+def test_print_board_state(capsys: pytest.CaptureFixture[str]) -> None:
+    game = tournament.new_game(0, 3)
+    play_repl.print_board_state(game, game.players[0])
+    printed = capsys.readouterr().out
+    assert printed == play_repl.format_board_state(game, game.players[0])
+    assert printed.startswith("\nplayer0's hand:\n")
+    assert printed.endswith("hints: 8, errors: 0\nscore: 0, deck: 35\n\n")
+
+
+def test_batch_replays_games() -> None:
+    lines = ["# seed and players, then the actions"]
+    scores = []
+    for seed in range(5):
+        game = tournament.new_game(seed, 3)
+        lines.append(f"game {seed} {' '.join(game.players)}")
+        while hanabi.check_state(game) is hanabi.GameState.RUNNING:
+            lines.append(ai.play_turn(game))
+        scores.append(hanabi.get_score(game))
+    lines.insert(3, "board")
+    lines += ["game 9 Alice Bob", "play 1", "hint Bob red", "discard 1"]
+
+    output = io.StringIO()
+    games, actions = play_repl.play_batch(lines, output)
+    assert games == 6
+    # the invalid hint and the discard after it are not performed
+    assert actions == len(lines) - 1 - 6 - 1 - 2
+    results = output.getvalue().split("game at line ")[1:]
+    assert len(results) == 6
+    for result, score in zip(results, scores, strict=False):
+        assert f"score {score}, " in result.splitlines()[0]
+        assert "RUNNING" not in result.splitlines()[0]
+    # boards at the end of each game, and on request
+    assert output.getvalue().count("player0's hand:") == 5 + 1
+    invalid = f"line {len(lines) - 1}: invalid action 'hint Bob red'"
+    assert invalid in output.getvalue()
+    assert output.getvalue().endswith(": RUNNING, score 0, 1 turns\n")
+
+    # workers keep the order of the games
+    parallel = io.StringIO()
+    assert play_repl.play_batch(lines, parallel, workers=2) == (games, actions)
+    assert parallel.getvalue() == output.getvalue()
+
+
+def test_batch_errors_go_to_stderr(capsys: pytest.CaptureFixture[str]) -> None:
+    output = io.StringIO()
+    lines = [
+        "play 1",
+        "game x Alice Bob",
+        "game 1 Alice",
+        "game 1 A B C D E F G",
+        "game 1 Alice Alice",
+    ]
+    assert play_repl.play_batch(lines, output) == (0, 0)
+    captured = capsys.readouterr()
+    assert captured.out == output.getvalue() == ""
+    assert captured.err.count("[ERROR]") == len(lines)
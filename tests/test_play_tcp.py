@@ -0,0 +1,81 @@
+import asyncio
+
+from hanagram import play_tcp
+
+TIMEOUT = 10  # seconds
+
+
+class Client:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def send(self, line: str) -> None:
+        self.writer.write(f"{line}\n".encode())
+
+    async def read_until(self, last_line: str) -> str:
+        lines: list[str] = []
+        while not lines or lines[-1] != last_line:
+            line = await asyncio.wait_for(self.reader.readline(), TIMEOUT)
+            assert line, "disconnected"
+            lines.append(line.decode().rstrip("\n"))
+        return "\n".join(lines)
+
+
+async def connect(server: play_tcp.TcpServer, port: int, name: str) -> Client:
+    reader, writer = await asyncio.open_connection(play_tcp.DEFAULT_HOST, port)
+    client = Client(reader, writer)
+    client.send(name)
+    await client.read_until("quit")
+    return client
+
+
+async def play_a_game() -> None:
+    server, tcp = await play_tcp.start_server(port=0)
+    port = tcp.sockets[0].getsockname()[1]
+    alice = await connect(server, port, "Alice")
+    alice.send("play 2")
+    await alice.read_until("You joined table 1: 1/2 players (Alice)")
+
+    reader, writer = await asyncio.open_connection(play_tcp.DEFAULT_HOST, port)
+    bob = Client(reader, writer)
+    bob.send("Alice")
+    await bob.read_until("Alice is taken, choose another name")
+    bob.send("Bob")
+    await bob.read_until("quit")
+    bob.send("play 2")
+    board = await alice.read_until(play_tcp.TURN_PROMPT)
+    await bob.read_until("waiting for Alice")
+
+    # each player sees the other hand, but not their own
+    table = server.tables[1]
+    assert table.game is not None
+    for player, hand in table.game.hands.items():
+        lines = hand.to_string(player != "Alice")
+        assert f"{player}'s hand:\n{lines}\n" in board
+
+    bob.send("discard 1")
+    await bob.read_until("It's Alice's turn")
+    alice.send("discard 9")
+    await alice.read_until("hint <PLAYER> <VALUE>")
+    alice.send("discard 1")
+    await bob.read_until(play_tcp.TURN_PROMPT)
+    assert table.game.turn == 1
+
+    bob.send("leave")
+    await alice.read_until("Bob left, the game ended")
+    await alice.read_until("quit")
+    assert not server.tables
+    assert server.games_started == 1
+    alice.send("quit")
+    assert await alice.reader.read() == b""
+
+    for client in [alice, bob]:
+        client.writer.close()
+        await client.writer.wait_closed()
+    tcp.close()
+    await tcp.wait_closed()
+
+
+def test_play_over_tcp() -> None:
+    asyncio.run(play_a_game())
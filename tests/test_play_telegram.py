@@ -0,0 +1,346 @@
+import io
+import json
+import threading
+import time
+from collections.abc import Iterator
+
+import pytest
+from fakes import FakeBot, callback
+from PIL import Image
+from telepot.exception import TelegramError  # type: ignore[import-untyped]
+
+from hanagram import ai, draw, estimate, hanabi, hints, play_telegram
+from hanagram.outbox import Message, Outbox
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[play_telegram.BotServer]:
+    server = play_telegram.BotServer("DEADBEEF")
+    server.outbox = Outbox(
+        FakeBot(), private_chat_rate=1e6, group_chat_rate=1e6, global_rate=1e6
+    )
+    # the server is set only when the bot starts
+    monkeypatch.setattr(play_telegram, "server", server, raising=False)
+    yield server
+    server.estimates.close()
+    server.outbox.close()
+
+
+@pytest.fixture
+def renders(monkeypatch: pytest.MonkeyPatch) -> list[hanabi.Player | None]:
+    # the views that were rendered
+    rendered: list[hanabi.Player | None] = []
+    draw_board_state = draw.draw_board_state
+
+    def counting_draw(
+        game: hanabi.Game,
+        player_viewing: hanabi.Player | None,
+        background: tuple[int, int, int],
+    ) -> Image.Image:
+        rendered.append(player_viewing)
+        return draw_board_state(game, player_viewing, background)
+
+    monkeypatch.setattr(draw, "draw_board_state", counting_draw)
+    return rendered
+
+
+def test_unchanged_keyboards_are_not_sent_again(
+    monkeypatch: pytest.MonkeyPatch, server: play_telegram.BotServer
+) -> None:
+    edits: list[tuple[str, str]] = []
+    monkeypatch.setattr(
+        server.outbox.bot,
+        "editMessageText",
+        lambda _msg, text, reply_markup: edits.append((text, reply_markup)),
+    )
+    chat_id = play_telegram.ChatId(-1000)
+    user_id = play_telegram.UserId(1000)
+    chat_game = play_telegram.ChatGame(chat_id, admin=user_id, test_mode=True)
+    players = [hanabi.Player(name) for name in ["Alice", "Bob", "Carol"]]
+    chat_game.player_to_user = dict.fromkeys(players, user_id)
+    chat_game.user_to_message[user_id] = Message(
+        {"message_id": 1, "chat": {"id": user_id}}
+    )
+    chat_game.game = hanabi.Game(players)
+    server.games[chat_id] = chat_game
+
+    # a button that doesn't change the menu, like a double tap
+    for data in ["hint", "hint", "back", "back", "hint"]:
+        play_telegram.handle_update(callback(user_id, chat_id, data))
+    assert server.outbox.join(timeout=10)
+
+    assert [text for text, _keyboard in edits] == [
+        "Choose a player to hint",
+        "Alice, choose an action",
+        "Choose a player to hint",
+    ]
+    # the keyboards are serialized once per game
+    assert edits[0][1] is edits[2][1] is chat_game.keyboards["player Alice"]
+    assert json.loads(edits[0][1]) == {
+        "inline_keyboard": [
+            [
+                {"text": "Bob", "callback_data": f"1|{chat_id}"},
+                {"text": "Carol", "callback_data": f"2|{chat_id}"},
+            ],
+            [{"text": "Back", "callback_data": f"back|{chat_id}"}],
+        ]
+    }
+
+
+def test_views_on_demand(
+    monkeypatch: pytest.MonkeyPatch,
+    server: play_telegram.BotServer,
+    renders: list[hanabi.Player | None],
+) -> None:
+    photos: list[int] = []
+
+    def send_photo(chat_id: int, _photo: object) -> Message:
+        photos.append(chat_id)
+        return Message({})
+
+    monkeypatch.setattr(server.outbox.bot, "sendPhoto", send_photo)
+    chat_id = play_telegram.ChatId(-1000)
+    chat_game = play_telegram.ChatGame(chat_id, admin=play_telegram.UserId(1))
+    players = [hanabi.Player(name) for name in ["Alice", "Bob", "Carol"]]
+    chat_game.player_to_user = {
+        player: play_telegram.UserId(i + 1) for i, player in enumerate(players)
+    }
+    chat_game.user_to_message = dict.fromkeys(chat_game.player_to_user.values())
+    chat_game.game = hanabi.Game(players)
+    chat_game.views_on_demand = True
+    server.games[chat_id] = chat_game
+    play_telegram.send_game_views(server.outbox, chat_game)
+    assert server.outbox.join(timeout=10)
+    # only the current player gets a board
+    assert photos == [1]
+    assert len(renders) == 1
+    # the others may ask for theirs, and a second ask uses the rendered board
+    for _ in range(2):
+        play_telegram.handle_update(callback(3, chat_id, "view"))
+        assert server.outbox.join(timeout=10)
+    assert photos == [1, 3, 3]
+    assert len(renders) == 2
+    # everyone gets the last board, the view buttons don't work after the game
+    chat_game.game.errors = hanabi.ALLOWED_ERRORS
+    play_telegram.send_game_views(server.outbox, chat_game)
+    assert server.outbox.join(timeout=10)
+    assert sorted(photos[3:]) == [1, 2, 3]
+
+
+def test_spectators_share_one_render(
+    monkeypatch: pytest.MonkeyPatch,
+    server: play_telegram.BotServer,
+    renders: list[hanabi.Player | None],
+) -> None:
+    photos: list[tuple[int, object]] = []
+
+    def send_photo(chat_id: int, photo: object) -> Message:
+        photos.append((chat_id, photo))
+        return Message({"photo": [{"file_id": f"file-{len(photos)}"}]})
+
+    monkeypatch.setattr(server.outbox.bot, "sendPhoto", send_photo)
+    chat_id = play_telegram.ChatId(-1000)
+    chat_game = play_telegram.ChatGame(chat_id, admin=play_telegram.UserId(1))
+    server.games[chat_id] = chat_game
+    for user_id in [1, 2]:
+        play_telegram.add_player(
+            server, chat_id, play_telegram.UserId(user_id), hanabi.Player(str(user_id))
+        )
+    for text in ["/spectate", "/spectate -2000", "/spectate -3000"]:
+        play_telegram.toggle_spectator(
+            server, chat_id, play_telegram.UserId(3), "Watcher", text
+        )
+    # players can't watch, since they would see their own cards
+    play_telegram.toggle_spectator(
+        server, chat_id, play_telegram.UserId(1), "Player", "/spectate"
+    )
+    assert chat_game.spectators == [3]
+    play_telegram.toggle_spectator(
+        server, chat_id, play_telegram.UserId(1), "Admin", "/spectate -2000"
+    )
+    play_telegram.toggle_spectator(
+        server, chat_id, play_telegram.UserId(1), "Admin", "/spectate -3000"
+    )
+    chat_game.game = hanabi.Game(list(chat_game.player_to_user))
+    play_telegram.send_game_views(server.outbox, chat_game)
+    assert server.outbox.join(timeout=10)
+    # one render per player, and one for all the spectators
+    assert len(renders) == 3
+    spectated = [photo for chat, photo in photos if chat in {3, -2000, -3000}]
+    assert [type(photo) for photo in spectated] == [io.BytesIO, str, str]
+
+
+def test_bots_play_their_turns(
+    monkeypatch: pytest.MonkeyPatch, server: play_telegram.BotServer
+) -> None:
+    monkeypatch.setenv("TELEGRAM_USERNAME", "hanagram_test_bot")
+    monkeypatch.setenv("TELEGRAM_API_KEY", "DEADBEEF")
+    play_telegram.config.cache_clear()
+    message = {
+        "message_id": 1,
+        "date": 0,
+        "from": {"id": 1000, "first_name": "Admin"},
+        "chat": {"id": -1000, "type": "group"},
+    }
+    # a human and two bots, the bots play right after the human
+    play_telegram.handle_message(Message({**message, "text": "/test 3 2"}))
+    chat_game = server.games[play_telegram.ChatId(-1000)]
+    assert chat_game.bots == {"Bob", "Carol"}
+    assert chat_game.game is not None
+    play_telegram.handle_update(callback(1000, -1000, "discard"))
+    play_telegram.handle_update(callback(1000, -1000, "1"))
+    assert chat_game.game.turn == 3
+    assert chat_game.game.active_player == 0
+    # there is always a human, who gets the boards
+    play_telegram.handle_message(Message({**message, "text": "/test 5 5"}))
+    chat_game = server.games[play_telegram.ChatId(-1000)]
+    assert chat_game.bots == {"Bob", "Carol", "Dan", "Erin"}
+    assert chat_game.game is not None
+    play_telegram.handle_update(callback(1000, -1000, "discard"))
+    play_telegram.handle_update(callback(1000, -1000, "1"))
+    assert chat_game.game.turn == 5
+    assert chat_game.game.active_player == 0
+    assert server.outbox.join(timeout=30)
+    play_telegram.config.cache_clear()
+
+
+def test_failed_edits_keep_the_newest_board(
+    monkeypatch: pytest.MonkeyPatch, server: play_telegram.BotServer
+) -> None:
+    bot = server.outbox.bot
+
+    def edit_message_media(
+        msg_identifier: tuple[int, int], media: dict[str, object]
+    ) -> Message:
+        bot._record("editMessageMedia", msg_identifier[0], media["media"])
+        raise TelegramError("Bad Request: message to edit not found", 400, {})
+
+    monkeypatch.setattr(bot, "editMessageMedia", edit_message_media)
+    chat_id = play_telegram.ChatId(-1000)
+    user_id = play_telegram.UserId(1)
+    chat_game = play_telegram.ChatGame(chat_id, admin=user_id)
+    players = [hanabi.Player("Alice"), hanabi.Player("Bob")]
+    chat_game.player_to_user = dict.fromkeys(players, user_id)
+    chat_game.game = hanabi.Game(players)
+    chat_game.edit_boards = True
+    chat_game.user_to_board[user_id] = Message(
+        {"message_id": 5, "chat": {"id": user_id}}
+    )
+
+    # the edit of the first board fails while the edit of the next one waits
+    bot.release.clear()
+    play_telegram.send_game_view(players[0], user_id, server.outbox, chat_game)
+    while server.outbox.queue_depth:
+        time.sleep(0.001)
+    chat_game.game.turn += 1
+    play_telegram.send_game_view(players[0], user_id, server.outbox, chat_game)
+    bot.release.set()
+    assert server.outbox.join(timeout=10)
+
+    methods = [method for method, _args in bot.calls]
+    assert methods == ["editMessageMedia", "editMessageMedia", "sendPhoto"]
+    assert chat_game.user_to_view[user_id][0] == (chat_game.game_number, 1)
+    assert chat_game.user_to_board[user_id]["message_id"] == 3
+
+
+def test_estimates_run_after_the_update(
+    monkeypatch: pytest.MonkeyPatch, server: play_telegram.BotServer
+) -> None:
+    chat_id = play_telegram.ChatId(-1000)
+    chat_game = play_telegram.ChatGame(chat_id, admin=play_telegram.UserId(1))
+    players = [hanabi.Player("Alice"), hanabi.Player("Bob")]
+    chat_game.player_to_user = {
+        player: play_telegram.UserId(i + 1) for i, player in enumerate(players)
+    }
+    chat_game.user_to_message = dict.fromkeys(chat_game.player_to_user.values())
+    chat_game.game = hanabi.Game(players)
+    chat_game.estimator = estimator = estimate.Estimator(seed=0)
+    server.games[chat_id] = chat_game
+    # the estimate waits until the handler is done
+    handled = threading.Event()
+    estimate_game = estimator.estimate
+
+    def wait_and_estimate(game: hanabi.Game, budget: float) -> estimate.Estimate:
+        handled.wait(timeout=10)
+        return estimate_game(game, budget)
+
+    monkeypatch.setattr(estimator, "estimate", wait_and_estimate)
+
+    action = ai.play_turn(chat_game.game)
+    play_telegram.log_action(chat_game, players[0], action)
+    play_telegram.complete_processed_action(server.outbox, chat_id)
+    # the next turn is played while the estimate runs
+    ai.play_turn(chat_game.game)
+    assert not estimator.history
+    handled.set()
+    assert server.estimates.join(timeout=10)
+    assert server.outbox.join(timeout=10)
+
+    bot = server.outbox.bot
+    estimates = [
+        args
+        for method, args in bot.calls
+        if method == "sendMessage" and "Estimated final score" in str(args[1])
+    ]
+    assert [chat for chat, _text in estimates] == [chat_id]
+    # the estimate is of the turn it was asked for
+    assert [e.turn for e, _action in chat_game.estimator.history] == [1]
+
+
+def test_long_names_fit_in_the_callback_data(server: play_telegram.BotServer) -> None:
+    # telegram allows 64 bytes of callback data, and names of 64 characters
+    chat_id = play_telegram.ChatId(-1001234567890)
+    user_id = play_telegram.UserId(1)
+    chat_game = play_telegram.ChatGame(chat_id, admin=user_id)
+    players = [hanabi.Player(letter * 64) for letter in "ABC"]
+    chat_game.player_to_user = dict.fromkeys(players, user_id)
+    chat_game.user_to_message[user_id] = Message(
+        {"message_id": 1, "chat": {"id": user_id}}
+    )
+    chat_game.game = hanabi.Game(players)
+    chat_game.suggest_hints = True
+    server.games[chat_id] = chat_game
+    play_telegram.prepare_keyboards(chat_game)
+
+    suggested = hints.suggest_hints(chat_game.game, players[0])[0]
+    keyboards = [
+        play_telegram.action_keyboard(chat_game, suggested),
+        *chat_game.keyboards.values(),
+    ]
+    for keyboard in keyboards:
+        for row in json.loads(keyboard)["inline_keyboard"]:
+            for button in row:
+                assert len(button["callback_data"].encode()) <= 64
+    button = json.loads(keyboards[0])["inline_keyboard"][1][0]
+    data, _, _chat = button["callback_data"].rpartition("|")
+    play_telegram.handle_update(callback(user_id, chat_id, data))
+    assert chat_game.game.turn == 1
+    assert chat_game.game.last_action_description.startswith(players[0])
+    assert server.outbox.join(timeout=10)
+
+
+def test_slow_keyboards_dont_block_the_handler(
+    monkeypatch: pytest.MonkeyPatch, server: play_telegram.BotServer
+) -> None:
+    monkeypatch.setattr(play_telegram, "KEYBOARD_TIMEOUT", 0.01)
+    chat_id = play_telegram.ChatId(-1000)
+    user_id = play_telegram.UserId(1)
+    chat_game = play_telegram.ChatGame(chat_id, admin=user_id)
+    players = [hanabi.Player("Alice"), hanabi.Player("Bob")]
+    chat_game.player_to_user = dict.fromkeys(players, user_id)
+    chat_game.user_to_message[user_id] = None
+    chat_game.game = hanabi.Game(players)
+    server.games[chat_id] = chat_game
+
+    # like a rate limit, the keyboard is sent after the handler gave up waiting
+    bot = server.outbox.bot
+    bot.release.clear()
+    play_telegram.send_keyboard(
+        server.outbox, chat_id, play_telegram.KeyboardType.ACTION
+    )
+    assert chat_game.user_to_message[user_id] is None
+    bot.release.set()
+    assert server.outbox.join(timeout=10)
+    message = chat_game.user_to_message[user_id]
+    assert message is not None
+    assert message["message_id"] == 1
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from hanagram import play_telegram
+from hanagram.outbox import GLOBAL_RATE, Message
+from hanagram.sharding import ShardRouter, UpdateQueue, shard_of
+
+
+def record_updates(shard: int, updates: UpdateQueue) -> None:
+    while (update := updates.get()) is not None:
+        if update.get("crash"):
+            raise SystemExit(1)
+        with Path(update["out"], str(update["chat"])).open("a") as f:
+            f.write(f"{shard} {update['n']}\n")
+
+
+def test_shard_of_is_stable() -> None:
+    chat_ids = [-5, 0, 1, 2, 3, 1001]
+    assert [shard_of(chat_id, 3) for chat_id in chat_ids] == [1, 0, 1, 2, 0, 2]
+
+
+def test_chats_stay_on_their_worker(tmp_path: Path) -> None:
+    router = ShardRouter(record_updates, lambda update: update["chat"], workers=2)
+    router.start()
+    for n in range(20):
+        for chat in range(-3, 3):
+            router.submit(Message({"chat": chat, "n": n, "out": str(tmp_path)}))
+        if n == 10:
+            # a worker that dies is restarted, and its queued updates are kept
+            router.submit(Message({"chat": 0, "crash": True}))
+            router._processes[0].join()  # type: ignore[union-attr]
+            assert router.restart_dead() == 1
+    router.close(timeout=30)
+
+    assert router.restarts == 1
+    assert sum(router.routed) == 121
+    for chat in range(-3, 3):
+        lines = Path(tmp_path, str(chat)).read_text().splitlines()
+        assert lines == [f"{chat % 2} {n}" for n in range(20)]
+
+
+def test_shards_share_the_global_rate() -> None:
+    server = play_telegram.BotServer("DEADBEEF", shards=3)
+    assert server.outbox.global_bucket.rate * 3 == GLOBAL_RATE
+    server.outbox.close()
+    server.games.close()
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import time
+import tomllib
+from pathlib import Path
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+PYPROJECT = Path(__file__).parents[1] / "pyproject.toml"
+ENTRY_POINTS: dict[str, str] = tomllib.loads(PYPROJECT.read_text())["project"][
+    "scripts"
+]
+# generous, to catch regressions like heavy work at import, not small slowdowns
+STARTUP_BUDGET = 2.0  # seconds
+# modules that an entry point should not load before it runs
+HEAVY_MODULES = {
+    "play-repl": {"PIL", "telepot", "dotenv", "sqlite3"},
+    "play-telegram": {"dotenv"},
+    "load-test": {"dotenv"},
+    "screenshot": {"telepot", "dotenv"},
+    "analyze-deals": {"PIL", "telepot", "dotenv", "sqlite3"},
+    "tournament": {"PIL", "telepot", "dotenv", "sqlite3"},
+    "analytics": {"PIL", "telepot", "dotenv"},
+    "play-tcp": {"PIL", "telepot", "dotenv", "sqlite3"},
+    "stress-test": {"PIL", "telepot", "dotenv", "sqlite3"},
+}
+
+
+@pytest.mark.parametrize("name", sorted(ENTRY_POINTS))
+def test_entry_point_startup(name: str, benchmark: BenchmarkFixture) -> None:
+    module, function = ENTRY_POINTS[name].split(":")
+    code = f"import sys; from {module} import {function}; print(*sys.modules)"
+    # importing needs no configuration
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith(("TELEGRAM_", "HANAGRAM_"))
+    }
+
+    def start() -> tuple[float, set[str]]:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed = time.perf_counter() - start
+        return elapsed, {name.split(".")[0] for name in result.stdout.split()}
+
+    elapsed, modules = benchmark.pedantic(  # type: ignore[no-untyped-call]
+        start, rounds=3
+    )
+    assert elapsed < STARTUP_BUDGET
+    assert not modules & HEAVY_MODULES.get(name, set())
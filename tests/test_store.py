@@ -0,0 +1,204 @@
+import random
+import time
+from pathlib import Path
+
+from hanagram import hanabi, play_telegram, snapshot
+from hanagram.outbox import Message
+from hanagram.registry import GameRegistry
+from hanagram.store import GameStore
+
+PLAYERS = [hanabi.Player(name) for name in ["Alice", "Bob", "Carol"]]
+
+
+def played_game(seed: int) -> hanabi.Game:
+    rng = random.Random(seed)
+    game = hanabi.Game(PLAYERS)
+    actions = ["play 1", "discard 2", "hint Bob red", "hint Carol 1", "hint Alice 5"]
+    for _ in range(10):
+        player = hanabi.get_active_player_name(game)
+        hanabi.perform_action(game, player, rng.choice(actions))
+    return game
+
+
+def test_snapshot_roundtrip() -> None:
+    game = played_game(0)
+    loaded = snapshot.game_from_bytes(snapshot.game_to_bytes(game))
+    assert snapshot.dump_game(loaded) == snapshot.dump_game(game)
+    assert loaded.turn == game.turn
+    for player in PLAYERS:
+        assert loaded.hands[player].to_string(True) == game.hands[player].to_string(
+            True
+        )
+
+
+def chat_game(chat_id: int) -> play_telegram.ChatGame:
+    user_id = play_telegram.UserId(chat_id)
+    chat_game = play_telegram.ChatGame(play_telegram.ChatId(chat_id), user_id)
+    chat_game.player_to_user = dict.fromkeys(PLAYERS, user_id)
+    chat_game.user_to_message[user_id] = Message(
+        {"message_id": 5, "chat": {"id": user_id}, "text": "long message"}
+    )
+    chat_game.game = played_game(chat_id)
+    return chat_game
+
+
+def registry(store: GameStore) -> GameRegistry[play_telegram.ChatGame]:
+    return GameRegistry(
+        store, play_telegram.dump_chat_game, play_telegram.load_chat_game
+    )
+
+
+def test_games_survive_restart(tmp_path: Path) -> None:
+    store = GameStore(str(tmp_path / "games.db"))
+    games = registry(store)
+    for chat_id in range(1, 4):
+        games[chat_id] = chat_game(chat_id)
+    del games[2]
+    assert games[3].game is not None
+    hanabi.perform_action(games[3].game, PLAYERS[0], "discard 1")
+    games.save(3)
+    expected = play_telegram.dump_chat_game(games[3])
+    store.close()
+    assert store.commits <= 2
+
+    store = GameStore(str(tmp_path / "games.db"))
+    games = registry(store)
+    assert set(games) == {1, 3}
+    assert games.resident == 0
+    loaded = games[3]
+    assert games.resident == 1
+    assert play_telegram.dump_chat_game(loaded) == expected
+    store.close()
+
+
+def test_fast_startup_with_many_games(tmp_path: Path) -> None:
+    store = GameStore(str(tmp_path / "games.db"))
+    data = play_telegram.dump_chat_game(chat_game(1))
+    for chat_id in range(5000):
+        store.save(chat_id, data)
+    store.close()
+
+    start = time.perf_counter()
+    store = GameStore(str(tmp_path / "games.db"))
+    games = registry(store)
+    assert len(games) == 5000
+    assert time.perf_counter() - start < 0.5
+    store.close()
+
+
+def test_idle_games_are_evicted_and_reloaded(tmp_path: Path) -> None:
+    now = [0.0]
+    store = GameStore(str(tmp_path / "games.db"))
+    games = GameRegistry(
+        store,
+        play_telegram.dump_chat_game,
+        play_telegram.load_chat_game,
+        max_resident=3,
+        idle_timeout=60,
+        clock=lambda: now[0],
+    )
+    dumps = {}
+    for chat_id in range(1, 6):
+        with games.hold(chat_id):
+            games[chat_id] = chat_game(chat_id)
+        dumps[chat_id] = play_telegram.dump_chat_game(games[chat_id])
+    assert games.resident == 3
+    assert games.evictions == 2
+    assert len(games) == 5
+
+    with games.hold(5):
+        now[0] = 100
+        assert games.evict_idle() == 2
+        assert games.resident == 1
+
+    assert play_telegram.dump_chat_game(games[1]) == dumps[1]
+    assert games.reloads == 1
+    assert games.max_reload_time > 0
+    store.close()
+
+
+def test_evicted_games_without_store() -> None:
+    games = GameRegistry(
+        None,
+        play_telegram.dump_chat_game,
+        play_telegram.load_chat_game,
+        max_bytes=1,
+    )
+    games[1] = chat_game(1)
+    expected = play_telegram.dump_chat_game(games[1])
+    games[2] = chat_game(2)
+    assert games.resident == 1
+    assert 1 in games
+    assert play_telegram.dump_chat_game(games[1]) == expected
+    del games[1]
+    assert 1 not in games
+
+
+def test_idle_games_are_evicted_periodically(tmp_path: Path) -> None:
+    store = GameStore(str(tmp_path / "games.db"))
+    games = GameRegistry(
+        store,
+        play_telegram.dump_chat_game,
+        play_telegram.load_chat_game,
+        idle_timeout=0,
+    )
+    with games.hold(1):
+        games[1] = chat_game(1)
+    # a board that was sent after the update was handled
+    board = Message({"message_id": 7, "chat": {"id": 1}})
+    games[1].user_to_board[play_telegram.UserId(1)] = board
+    games.changed(1)
+    games.start_evicting(interval=0.01)
+    deadline = time.monotonic() + 10
+    while games.resident and time.monotonic() < deadline:
+        time.sleep(0.01)
+    games.close()
+    assert games.resident == 0
+    assert games[1].user_to_board[play_telegram.UserId(1)]["message_id"] == 7
+    store.close()
+
+
+def test_changed_games_are_saved_on_close(tmp_path: Path) -> None:
+    store = GameStore(str(tmp_path / "games.db"))
+    games = registry(store)
+    games[1] = chat_game(1)
+    games[1].user_to_board[play_telegram.UserId(1)] = Message(
+        {"message_id": 7, "chat": {"id": 1}}
+    )
+    games.changed(1)
+    games.close()
+    store.close()
+
+    store = GameStore(str(tmp_path / "games.db"))
+    board = registry(store)[1].user_to_board[play_telegram.UserId(1)]
+    assert board["message_id"] == 7
+    store.close()
+
+
+def test_only_evict_idle_evicts_idle_games() -> None:
+    now = [0.0]
+    games = GameRegistry(
+        None,
+        play_telegram.dump_chat_game,
+        play_telegram.load_chat_game,
+        idle_timeout=60,
+        clock=lambda: now[0],
+    )
+    for chat_id in range(1, 4):
+        games[chat_id] = chat_game(chat_id)
+    now[0] = 100
+    # accesses and saves evict only the games over the limits
+    games.save(1)
+    assert games[2].chat_id == 2
+    assert games.resident == 3
+    assert games.resident_bytes == sum(
+        len(play_telegram.dump_chat_game(games[chat_id])) for chat_id in range(1, 4)
+    )
+    # a pinned game stays, until it is unpinned
+    now[0] = 200
+    games.pin(3)
+    assert games.evict_idle() == 2
+    assert games.resident == 1
+    games.unpin(3)
+    assert games.evict_idle() == 1
+    assert games.resident_bytes == 0
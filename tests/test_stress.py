@@ -0,0 +1,41 @@
+import contextlib
+import io
+
+import pytest
+
+from hanagram import hanabi, snapshot, stress
+
+
+@pytest.mark.parametrize("players", sorted(hanabi.HAND_SIZE))
+def test_stress_games(players: int) -> None:
+    report = stress.stress_chunk((players, 0, 2))
+    assert report.failures == []
+    assert report.games == 2
+    assert 0 < report.illegal < report.actions
+
+
+@pytest.mark.parametrize("action", stress.ILLEGAL_ACTIONS)
+def test_illegal_actions_are_rejected(action: str) -> None:
+    game = hanabi.Game([hanabi.Player("Alice"), hanabi.Player("Bob")])
+    before = snapshot.dump_game(game)
+    text = action.format(player="Alice", other="Bob", over=6)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert not hanabi.perform_action(game, hanabi.Player("Alice"), text)
+    assert {**snapshot.dump_game(game), "last_action": ""} == {
+        **before,
+        "last_action": "",
+    }
+
+
+def test_stress_finds_shared_hands(monkeypatch: pytest.MonkeyPatch) -> None:
+    # a clone that changes the hands of the game it was cloned from
+    monkeypatch.setattr(hanabi, "own_hand", lambda game, player: game.hands[player])
+    report = stress.stress_chunk((3, 0, 5))
+    assert any("cloned from" in failure for failure in report.failures)
+
+
+def test_reference_engine_is_restored() -> None:
+    update_hand_info = hanabi.update_hand_info
+    with stress.reference_engine():
+        assert hanabi.update_hand_info is stress.recount_hand_info
+    assert hanabi.update_hand_info is update_hand_info
@@ -0,0 +1,51 @@
+import statistics
+from pathlib import Path
+
+import pytest
+
+from hanagram import ai, tournament
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tournament, "BLOCK_SIZE", 3)
+
+
+def test_strategies_play_the_same_deals() -> None:
+    results = [
+        tournament.play_unit(tournament.WorkUnit(strategy, 3, 1))[1]
+        for strategy in ai.STRATEGIES
+    ]
+    assert all(columns["seed"] == [3, 4, 5] for columns in results)
+    assert all(columns["players"] == [3, 3, 3] for columns in results)
+    unit = tournament.WorkUnit("convention", 3, 1)
+    assert tournament.play_unit(unit)[1] == results[0]
+
+
+def test_resume_after_a_cut_write(tmp_path: Path) -> None:
+    store = tournament.ResultStore(tmp_path)
+    for block in [0, 1]:
+        store.append(*tournament.play_unit(tournament.WorkUnit("risky", 2, block)))
+    # a run that stopped while writing the next unit
+    with (tmp_path / "risky" / "seed").open("ab") as f:
+        f.write(b"\0\0")
+    with (tmp_path / "risky" / tournament.SHARDS_FILE).open("a") as f:
+        f.write("2,2")
+
+    store = tournament.ResultStore(tmp_path)
+    assert store.done == {tournament.WorkUnit("risky", 2, block) for block in [0, 1]}
+    todo = tournament.work_units(["risky"], [2], 9, store.done)
+    assert todo == [tournament.WorkUnit("risky", 2, 2)]
+    store.append(*tournament.play_unit(todo[0]))
+    assert tournament.ResultStore(tmp_path).read("risky")["seed"] == list(range(9))
+
+
+def test_confidence_intervals() -> None:
+    stats = tournament.Stats()
+    scores = [25, 15, 20, 20]
+    stats.add(scores)
+    assert stats.mean == 20
+    assert stats.mean_interval() == pytest.approx(1.96 * statistics.stdev(scores) / 2)
+    low, high = stats.perfect_interval()
+    assert low < stats.perfect / stats.games < high
+    assert tournament.Stats().perfect_interval() == (0, 1)
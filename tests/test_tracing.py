@@ -0,0 +1,69 @@
+import json
+import urllib.request
+
+import pytest
+
+from hanagram import tracing
+from hanagram.outbox import Message, Outbox
+
+
+class EchoBot:
+    def sendMessage(self, chat_id: int, text: str) -> Message:
+        return Message({"message_id": 1, "chat": {"id": chat_id}, "text": text})
+
+
+@pytest.fixture
+def tracer(monkeypatch: pytest.MonkeyPatch) -> tracing.Tracer:
+    tracer = tracing.Tracer(log=True)
+    monkeypatch.setattr(tracing, "tracer", tracer)
+    # modules that imported the tracer use it by name
+    monkeypatch.setattr("hanagram.outbox.tracer", tracer)
+    return tracer
+
+
+def test_trace_includes_api_calls(
+    tracer: tracing.Tracer, capsys: pytest.CaptureFixture[str]
+) -> None:
+    outbox = Outbox(EchoBot())
+    with tracer.trace("message", 5):
+        with tracer.span("render"):
+            pass
+        outbox.send_message(5, "hello")
+    assert outbox.join(timeout=5)
+    outbox.close()
+
+    line = json.loads(capsys.readouterr().out)
+    assert line["update"] == "message"
+    assert [span["name"] for span in line["spans"]] == ["render", "api.sendMessage"]
+    assert tracer.updates == 1
+    assert {"handle", "total", "render", "api.sendMessage"} <= set(tracer.histograms)
+
+
+def test_metrics_endpoint(tracer: tracing.Tracer) -> None:
+    tracer.observe("render", 0.003)
+    tracer.observe("render", 20)
+    tracer.gauges["hanagram_games_resident"] = lambda: 7
+    server = tracing.MetricsServer(tracer, host="127.0.0.1", port=0)
+    server.start()
+    try:
+        url = f"http://127.0.0.1:{server.port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode()
+    finally:
+        server.stop()
+    assert 'hanagram_span_seconds_bucket{span="render",le="0.0025"} 0' in text
+    assert 'hanagram_span_seconds_bucket{span="render",le="0.005"} 1' in text
+    assert 'hanagram_span_seconds_bucket{span="render",le="+Inf"} 2' in text
+    assert 'hanagram_span_seconds_count{span="render"} 2' in text
+    assert "hanagram_games_resident 7" in text
+
+
+def test_disabled_tracer_is_cheap() -> None:
+    tracer = tracing.Tracer()
+    # no allocations or clock reads, just a shared no-op context manager
+    assert tracer.span("render") is tracing.NO_SPAN
+    assert tracer.current() is None
+    with tracer.trace("message", 5) as trace, tracer.span("render"):
+        assert trace is None
+    assert tracer.histograms == {}
+    assert tracer.updates == 0
@@ -0,0 +1,101 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from collections.abc import Iterator
+
+import pytest
+
+from hanagram.dispatch import ChatDispatcher
+from hanagram.outbox import Message
+from hanagram.webhook import SECRET_HEADER, WebhookServer
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 2,
+        "from": {"id": 3, "first_name": "Alice"},
+        "chat": {"id": 3, "type": "private"},
+        "date": 0,
+        "text": "/start",
+    },
+}
+
+
+@pytest.fixture
+def received() -> list[Message]:
+    return []
+
+
+@pytest.fixture
+def webhook(received: list[Message]) -> Iterator[WebhookServer]:
+    def handle(update: Message) -> None:
+        received.append(update)
+
+    server = WebhookServer(
+        handle, secret_token="s3cret", host="127.0.0.1", port=0, path="/hook"
+    )
+    server.start()
+    yield server
+    server.stop()
+
+
+def post(webhook: WebhookServer, path: str, token: str) -> int:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{webhook.port}{path}",
+        data=json.dumps(UPDATE).encode(),
+        headers={SECRET_HEADER: token, "Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return int(response.status)
+    except urllib.error.HTTPError as ex:
+        return ex.code
+
+
+def test_handles_posted_updates(
+    webhook: WebhookServer, received: list[Message]
+) -> None:
+    assert post(webhook, "/hook", "s3cret") == 200
+    webhook.updates.join()
+    assert received == [UPDATE]
+
+
+def test_rejects_bad_requests(webhook: WebhookServer, received: list[Message]) -> None:
+    assert post(webhook, "/hook", "wrong") == 403
+    assert post(webhook, "/other", "s3cret") == 404
+    webhook.updates.join()
+    assert received == []
+
+
+def test_health(webhook: WebhookServer) -> None:
+    url = f"http://127.0.0.1:{webhook.port}/healthz"
+    with urllib.request.urlopen(url, timeout=5) as response:
+        assert json.load(response)["ok"] is True
+
+
+def test_full_dispatcher_fills_the_queue() -> None:
+    release = threading.Event()
+
+    def handle(_update: Message) -> None:
+        release.wait()
+
+    dispatcher = ChatDispatcher(handle, key=lambda _update: 0, max_pending=1)
+    webhook = WebhookServer(
+        dispatcher.submit,
+        secret_token=None,
+        host="127.0.0.1",
+        port=0,
+        path="/hook",
+        queue_size=1,
+    )
+    webhook.start()
+    try:
+        statuses = [post(webhook, "/hook", "") for _ in range(5)]
+        assert statuses[0] == 200
+        assert 503 in statuses
+    finally:
+        release.set()
+        webhook.stop()
+        assert dispatcher.join(timeout=5)
+        dispatcher.close()